@@ -0,0 +1,15 @@
+from django.contrib import admin
+
+from .models import ActivityEvent, ActivityPartition
+
+
+@admin.register(ActivityEvent)
+class ActivityEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'actor', 'verb', 'course', 'object_id', 'timestamp')
+    list_filter = ('verb',)
+    raw_id_fields = ('actor', 'course')
+
+
+@admin.register(ActivityPartition)
+class ActivityPartitionAdmin(admin.ModelAdmin):
+    list_display = ('day', 'path', 'event_count', 'created_at')
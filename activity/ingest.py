@@ -0,0 +1,195 @@
+"""
+Buffered ingestion of learning-activity events.
+
+Views call `record_event()`, which puts an unsaved ActivityEvent on a bounded
+in-process queue and returns at once. A daemon thread takes whatever arrives
+within MAX_DELAY seconds (up to MAX_BATCH events) and writes it with one
+bulk_create, so a burst of page views costs a handful of INSERTs instead of
+one per request.
+
+The queue holds at most BUFFER_SIZE events. When the database falls behind
+and it fills up, `emit()` waits up to BLOCK_TIMEOUT seconds for room (0: not
+at all) and then drops the event: analytics can lose a few events, a lesson
+page must not stall on them. Drops are counted and logged, and the counters
+(emitted, dropped, written, failed, flushes) are published to the cache like
+the cache hit counters, so `activity_stats()` reports all workers together.
+"""
+import atexit
+import logging
+import queue
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import ActivityEvent
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ['emitted', 'dropped', 'written', 'failed', 'flushes']
+
+# The flusher publishes counters at least this often, even when idle
+STATS_INTERVAL = 10
+
+
+class ActivityBuffer:
+    def __init__(self, max_size=10000, max_batch=500, max_delay=1.0, block_timeout=0.0, background=True):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.block_timeout = block_timeout
+        self.background = background
+        self._queue = queue.Queue(maxsize=max_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(COUNTERS, 0)
+        self._published = dict.fromkeys(COUNTERS, 0)
+
+    def emit(self, event):
+        """Queue an unsaved ActivityEvent. Returns False if it was dropped."""
+        if self.background:
+            self._ensure_started()
+        try:
+            if self.block_timeout > 0:
+                self._queue.put(event, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(event)
+        except queue.Full:
+            dropped = self._count('dropped')
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning("Activity buffer full, %d events dropped so far", dropped)
+            return False
+        self._count('emitted')
+        return True
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+            return self._counts[name]
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='activity-buffer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=STATS_INTERVAL)]
+            except queue.Empty:
+                self.publish()
+                continue
+            # Let the batch fill up before paying for the INSERT
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get(timeout=self.max_delay))
+            except queue.Empty:
+                pass
+            self.flush(batch)
+            self.publish()
+
+    def flush(self, batch):
+        close_old_connections()
+        try:
+            ActivityEvent.objects.bulk_create(batch, batch_size=self.max_batch)
+        except Exception:
+            logger.exception("Failed to write %d activity events", len(batch))
+            self._count('failed', len(batch))
+            return 0
+        self._count('written', len(batch))
+        self._count('flushes')
+        return len(batch)
+
+    def drain(self):
+        """Write everything queued so far from the calling thread. Returns the number written."""
+        written = 0
+        while True:
+            batch = []
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not batch:
+                break
+            written += self.flush(batch)
+        self.publish()
+        return written
+
+    def stats(self):
+        """This worker's counters, plus the current queue depth."""
+        with self._lock:
+            counts = dict(self._counts)
+        counts['queued'] = self._queue.qsize()
+        return counts
+
+    def publish(self):
+        """Add the counters' growth since the last publish to the shared totals in the cache."""
+        with self._lock:
+            deltas = {name: self._counts[name] - self._published[name] for name in COUNTERS}
+            self._published = dict(self._counts)
+        for name, delta in deltas.items():
+            if not delta:
+                continue
+            key = f'activitystats:{name}'
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key, delta)
+            except ValueError:
+                # Evicted between add and incr
+                cache.set(key, delta, None)
+
+
+@lru_cache(maxsize=None)
+def get_activity_buffer():
+    options = settings.ACTIVITY
+    buffer = ActivityBuffer(
+        max_size=options['BUFFER_SIZE'],
+        max_batch=options['MAX_BATCH'],
+        max_delay=options['MAX_DELAY'],
+        block_timeout=options['BLOCK_TIMEOUT'],
+    )
+    atexit.register(_drain_on_exit, buffer)
+    return buffer
+
+
+def _drain_on_exit(buffer):
+    try:
+        buffer.drain()
+    except Exception:
+        # Best effort; the process is going away anyway
+        pass
+
+
+def record_event(actor_id, verb, course_id=None, object_id=None, timestamp=None, **context):
+    """
+    Log that `actor_id` did `verb` (one of ActivityEvent.VERB_CHOICES). Inside
+    a transaction the event is queued once it commits. A no-op unless
+    ACTIVITY is enabled.
+    """
+    if not settings.ACTIVITY['ENABLED']:
+        return
+    event = ActivityEvent(
+        actor_id=actor_id,
+        verb=verb,
+        course_id=course_id,
+        object_id=object_id,
+        context=context,
+        timestamp=timestamp or timezone.now(),
+    )
+    transaction.on_commit(lambda: get_activity_buffer().emit(event))
+
+
+def activity_stats():
+    """Counters summed over every worker that has published them."""
+    if settings.ACTIVITY['ENABLED']:
+        get_activity_buffer().publish()
+    counts = cache.get_many([f'activitystats:{name}' for name in COUNTERS])
+    return {name: counts.get(f'activitystats:{name}', 0) for name in COUNTERS}
+
+
+def reset_activity_stats():
+    cache.delete_many([f'activitystats:{name}' for name in COUNTERS])
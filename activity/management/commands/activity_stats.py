@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+
+from activity.ingest import activity_stats, reset_activity_stats
+from activity.models import ActivityEvent, ActivityPartition
+
+
+class Command(BaseCommand):
+    help = 'Shows activity ingestion counters across workers and what is stored where'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters afterwards')
+
+    def handle(self, *args, **options):
+        stats = activity_stats()
+        for name, value in stats.items():
+            self.stdout.write(f'{name:>10}: {value}')
+        if stats['emitted'] + stats['dropped']:
+            self.stdout.write(f'  drop rate: {stats["dropped"] / (stats["emitted"] + stats["dropped"]):.2%}')
+
+        archived = ActivityPartition.objects.aggregate(events=Sum('event_count'))['events'] or 0
+        self.stdout.write(f'In the database: {ActivityEvent.objects.count()} events')
+        self.stdout.write(f'In {ActivityPartition.objects.count()} partition files: {archived} events')
+        if options['reset']:
+            reset_activity_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
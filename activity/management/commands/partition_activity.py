@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from activity.partitions import day_bounds, partition_closed_days
+
+
+class Command(BaseCommand):
+    help = 'Moves activity events from finished days into compressed daily partition files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=0, help='Closed days to leave in the database as well as today')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Events read per query')
+        parser.add_argument('--delete-chunk', type=int, default=1000, help='Rows removed per DELETE statement')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be partitioned without changing anything')
+
+    def handle(self, *args, **options):
+        cutoff, _ = day_bounds(timezone.localdate() - timedelta(days=options['keep_days']))
+        done = partition_closed_days(
+            cutoff,
+            batch_size=options['batch_size'],
+            delete_chunk=options['delete_chunk'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'Would partition' if options['dry_run'] else 'Partitioned'
+        for day, count in done.items():
+            self.stdout.write(f'{day}: {verb} {count} events')
+        self.stdout.write(self.style.SUCCESS(f'Done. {sum(done.values())} events before {cutoff:%Y-%m-%d}.'))
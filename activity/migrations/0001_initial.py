@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('courses', '0009_offline_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('first_id', models.BigIntegerField()),
+                ('last_id', models.BigIntegerField()),
+                ('event_count', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['day', 'first_id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verb', models.CharField(choices=[('lesson_opened', 'Lesson opened'), ('lesson_completed', 'Lesson completed'), ('video_watched', 'Video watched'), ('quiz_started', 'Quiz started'), ('quiz_submitted', 'Quiz submitted'), ('message_posted', 'Message posted')], max_length=32)),
+                ('object_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('context', models.JSONField(blank=True, default=dict)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='activity_events', to=settings.AUTH_USER_MODEL)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='courses.course')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['timestamp'], name='activity_event_ts_idx')],
+            },
+        ),
+    ]
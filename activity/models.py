@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from courses.models import Course
+
+
+class ActivityEvent(models.Model):
+    """
+    One learning-activity statement (actor, verb, object), written in
+    batches by activity/ingest.py and moved to daily files by
+    activity/partitions.py once its day is over.
+    """
+    LESSON_OPENED = 'lesson_opened'
+    LESSON_COMPLETED = 'lesson_completed'
+    VIDEO_WATCHED = 'video_watched'
+    QUIZ_STARTED = 'quiz_started'
+    QUIZ_SUBMITTED = 'quiz_submitted'
+    MESSAGE_POSTED = 'message_posted'
+    VERB_CHOICES = [
+        (LESSON_OPENED, 'Lesson opened'),
+        (LESSON_COMPLETED, 'Lesson completed'),
+        (VIDEO_WATCHED, 'Video watched'),
+        (QUIZ_STARTED, 'Quiz started'),
+        (QUIZ_SUBMITTED, 'Quiz submitted'),
+        (MESSAGE_POSTED, 'Message posted'),
+    ]
+
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='activity_events')
+    verb = models.CharField(max_length=32, choices=VERB_CHOICES)
+    course = models.ForeignKey(Course, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # The lesson, quiz or message the verb applies to
+    object_id = models.PositiveBigIntegerField(null=True, blank=True)
+    context = models.JSONField(default=dict, blank=True)
+    # When it happened, not when the buffer got round to inserting it
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Partitioning and analytics read whole days
+            models.Index(fields=['timestamp'], name='activity_event_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.actor_id} {self.verb} {self.object_id} at {self.timestamp:%Y-%m-%d %H:%M}"
+
+
+class ActivityPartition(models.Model):
+    """One compressed JSONL file of a day's activity events."""
+    day = models.DateField()
+    path = models.CharField(max_length=255, unique=True)
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    event_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['day', 'first_id']
+
+    def __str__(self):
+        return f"{self.day} ({self.event_count} events)"
@@ -0,0 +1,135 @@
+"""
+Daily partitions of the activity log.
+
+Once a day is over its events are moved out of the hot table into one
+gzip-compressed JSONL file per day (`YYYY/MM/DD/<first id>.jsonl.gz` in the
+`activity_archive` storage), recorded as an ActivityPartition, and deleted.
+Events that arrive late for a day already written (a mobile client syncing
+days later) end up in a second file for that day on the next run.
+
+`iter_events(start, end)` streams a time range for analytics jobs: partition
+files are read line by line and the hot table with a server-side cursor, so
+memory stays flat however many events the range holds.
+"""
+import gzip
+import json
+import tempfile
+from datetime import datetime, time, timedelta
+
+from django.core.files import File
+from django.core.files.storage import storages
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ActivityEvent, ActivityPartition
+
+ARCHIVE_STORAGE = 'activity_archive'
+
+FIELDS = ['id', 'actor_id', 'verb', 'course_id', 'object_id', 'context', 'timestamp']
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def _partition_path(day, first_id):
+    return f'{day:%Y/%m/%d}/{first_id}.jsonl.gz'
+
+
+def _serialize(row):
+    return json.dumps({**row, 'timestamp': row['timestamp'].isoformat()})
+
+
+def _write_day(day, cutoff, batch_size, delete_chunk):
+    """Write one day's events (up to `cutoff`) to a partition file, then delete them. Returns the count."""
+    start, end = day_bounds(day)
+    events = ActivityEvent.objects.filter(timestamp__gte=start, timestamp__lt=min(end, cutoff))
+    storage = storages[ARCHIVE_STORAGE]
+    first_id = last_id = None
+    count = 0
+    with tempfile.TemporaryFile() as tmp:
+        with gzip.GzipFile(fileobj=tmp, mode='wb') as out:
+            for row in events.order_by('id').values(*FIELDS).iterator(chunk_size=batch_size):
+                out.write((_serialize(row) + '\n').encode())
+                first_id = first_id or row['id']
+                last_id = row['id']
+                count += 1
+        if not count:
+            return 0
+        path = _partition_path(day, first_id)
+        # A crashed run left the same path behind; this one holds a superset of it
+        if storage.exists(path):
+            storage.delete(path)
+        tmp.seek(0)
+        storage.save(path, File(tmp))
+
+    with transaction.atomic():
+        ActivityPartition.objects.update_or_create(path=path, defaults={
+            'day': day,
+            'first_id': first_id,
+            'last_id': last_id,
+            'event_count': count,
+        })
+        # Only what was written: events inserted meanwhile wait for the next run
+        written = events.filter(id__lte=last_id)
+        while True:
+            ids = list(written.values_list('id', flat=True)[:delete_chunk])
+            if not ids:
+                break
+            ActivityEvent.objects.filter(id__in=ids).delete()
+    return count
+
+
+def partition_closed_days(cutoff=None, batch_size=5000, delete_chunk=1000, dry_run=False):
+    """
+    Move events older than `cutoff` (default: the start of today) into daily
+    partition files. Returns {day: events}.
+    """
+    cutoff = cutoff or day_bounds(timezone.localdate())[0]
+    done = {}
+    since = None
+    while True:
+        pending = ActivityEvent.objects.filter(timestamp__lt=cutoff)
+        if since is not None:
+            pending = pending.filter(timestamp__gte=since)
+        oldest = pending.order_by('timestamp').values_list('timestamp', flat=True).first()
+        if oldest is None:
+            return done
+        day = timezone.localdate(oldest)
+        if dry_run:
+            start, end = day_bounds(day)
+            done[day] = ActivityEvent.objects.filter(timestamp__gte=start, timestamp__lt=min(end, cutoff)).count()
+        else:
+            done[day] = _write_day(day, cutoff, batch_size, delete_chunk)
+        since = day_bounds(day)[1]
+
+
+def _read_partition(partition, start, end):
+    with storages[ARCHIVE_STORAGE].open(partition.path, 'rb') as f:
+        with gzip.open(f, 'rt') as lines:
+            for line in lines:
+                row = json.loads(line)
+                row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+                if start <= row['timestamp'] < end:
+                    yield row
+
+
+def iter_events(start, end, verbs=None):
+    """
+    Yield events with start <= timestamp < end as dicts of FIELDS, archived
+    days first, then the hot table. Rows are ordered by day and id, not
+    strictly by timestamp.
+    """
+    partitions = ActivityPartition.objects.filter(
+        day__gte=timezone.localdate(start), day__lte=timezone.localdate(end),
+    ).order_by('day', 'first_id')
+    for partition in partitions.iterator():
+        for row in _read_partition(partition, start, end):
+            if verbs is None or row['verb'] in verbs:
+                yield row
+
+    hot = ActivityEvent.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    if verbs is not None:
+        hot = hot.filter(verb__in=verbs)
+    yield from hot.order_by('id').values(*FIELDS).iterator(chunk_size=2000)
@@ -0,0 +1,147 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from courses.models import Course, Lesson, Module, Quiz
+from users.models import User
+from . import ingest
+from .models import ActivityEvent, ActivityPartition
+from .partitions import day_bounds, iter_events, partition_closed_days
+
+ENABLED = {**settings.ACTIVITY, 'ENABLED': True}
+
+
+class ActivityBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='pw')
+
+    def setUp(self):
+        cache.clear()
+        self.buffer = ingest.ActivityBuffer(max_size=100, max_batch=40, background=False)
+
+    def event(self, **kwargs):
+        return ActivityEvent(actor=self.student, verb=ActivityEvent.LESSON_OPENED, **kwargs)
+
+    def test_queued_events_are_written_in_batches(self):
+        for n in range(90):
+            self.buffer.emit(self.event(object_id=n))
+        self.assertEqual(ActivityEvent.objects.count(), 0)
+        with self.assertNumQueries(3):
+            self.assertEqual(self.buffer.drain(), 90)
+        self.assertEqual(ActivityEvent.objects.count(), 90)
+
+    def test_full_buffer_drops_and_counts(self):
+        accepted = [self.buffer.emit(self.event()) for _ in range(130)]
+        self.assertEqual(accepted.count(False), 30)
+        self.assertEqual(self.buffer.stats()['queued'], 100)
+        self.buffer.drain()
+        self.assertEqual(ingest.activity_stats(), {
+            'emitted': 100, 'dropped': 30, 'written': 100, 'failed': 0, 'flushes': 3,
+        })
+        # Published once: a second publish adds nothing
+        self.buffer.publish()
+        self.assertEqual(ingest.activity_stats()['dropped'], 30)
+
+
+@override_settings(ACTIVITY=ENABLED)
+class RecordEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        instructor = User.objects.create_user('instructor', password='pw', role='instructor')
+        cls.student = User.objects.create_user('student', password='pw')
+        cls.course = Course.objects.create(title='Course', description='...', instructor=instructor)
+        module = Module.objects.create(course=cls.course, title='Module', order=1)
+        cls.lesson = Lesson.objects.create(module=module, title='Lesson', order=1, video_url='https://example.com/v')
+        cls.quiz = Quiz.objects.create(course=cls.course, title='Quiz')
+
+    def setUp(self):
+        self.buffer = ingest.ActivityBuffer(background=False)
+        patcher = mock.patch.object(ingest, 'get_activity_buffer', return_value=self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.student)
+
+    def recorded(self):
+        self.buffer.drain()
+        return list(ActivityEvent.objects.order_by('id').values_list('verb', 'course_id', 'object_id'))
+
+    def test_views_record_events(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('lesson_detail', args=[self.course.pk, self.lesson.pk]))
+            session = self.client.get(reverse('take_quiz', args=[self.quiz.pk])).context['session']
+            self.client.post(reverse('take_quiz', args=[self.quiz.pk]), {'session': session.pk})
+        self.assertEqual(self.recorded(), [
+            (ActivityEvent.LESSON_OPENED, self.course.pk, self.lesson.pk),
+            (ActivityEvent.QUIZ_STARTED, self.course.pk, self.quiz.pk),
+            (ActivityEvent.QUIZ_SUBMITTED, self.course.pk, self.quiz.pk),
+        ])
+
+    def test_video_beacon(self):
+        url = reverse('track_video')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'lesson': self.lesson.pk}, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.recorded(), [(ActivityEvent.VIDEO_WATCHED, self.course.pk, self.lesson.pk)])
+        self.assertEqual(self.client.post(url, {}, content_type='application/json').status_code, 400)
+
+    @override_settings(ACTIVITY={**ENABLED, 'ENABLED': False})
+    def test_disabled_is_a_no_op(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('lesson_detail', args=[self.course.pk, self.lesson.pk]))
+        self.assertEqual(self.recorded(), [])
+
+
+class PartitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='pw')
+        cls.today = timezone.localdate()
+        # Two closed days and today, created out of timestamp order like a buffered flush would
+        for days_ago, count in [(1, 3), (2, 4), (0, 2)]:
+            start, _ = day_bounds(cls.today - timedelta(days=days_ago))
+            ActivityEvent.objects.bulk_create([
+                ActivityEvent(actor=cls.student, verb=ActivityEvent.LESSON_OPENED, object_id=n,
+                              timestamp=start + timedelta(hours=n + 1))
+                for n in range(count)
+            ])
+
+    def setUp(self):
+        self.files = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.files)
+        storages = {
+            **settings.STORAGES,
+            'activity_archive': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': self.files}},
+        }
+        override = override_settings(STORAGES=storages)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_closed_days_move_to_files(self):
+        everything = list(ActivityEvent.objects.order_by('id').values_list('id', flat=True))
+        done = partition_closed_days()
+        self.assertEqual(done, {self.today - timedelta(days=2): 4, self.today - timedelta(days=1): 3})
+        self.assertEqual(ActivityEvent.objects.count(), 2)
+        self.assertEqual(ActivityPartition.objects.count(), 2)
+
+        start, _ = day_bounds(self.today - timedelta(days=2))
+        rows = list(iter_events(start, timezone.now() + timedelta(days=1)))
+        self.assertEqual(sorted(row['id'] for row in rows), everything)
+        self.assertEqual([row['timestamp'] for row in rows], sorted(row['timestamp'] for row in rows))
+
+    def test_late_events_get_their_own_file(self):
+        partition_closed_days()
+        yesterday, _ = day_bounds(self.today - timedelta(days=1))
+        ActivityEvent.objects.create(actor=self.student, verb=ActivityEvent.LESSON_COMPLETED, timestamp=yesterday)
+        self.assertEqual(partition_closed_days(dry_run=True), {self.today - timedelta(days=1): 1})
+        partition_closed_days()
+        self.assertEqual(ActivityPartition.objects.filter(day=self.today - timedelta(days=1)).count(), 2)
+        rows = list(iter_events(yesterday, yesterday + timedelta(days=1), verbs=[ActivityEvent.LESSON_COMPLETED]))
+        self.assertEqual(len(rows), 1)
@@ -0,0 +1,27 @@
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_POST
+
+from config.ratelimit import rate_limit
+from courses.models import Lesson
+
+from .ingest import record_event
+from .models import ActivityEvent
+
+
+@login_required
+@require_POST
+@rate_limit(('activity_track', lambda request: request.user.pk))
+def track_video(request):
+    """Beacon from the lesson page when the learner starts its video."""
+    try:
+        data = json.loads(request.body)
+        lesson_pk = int(data['lesson'])
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected {"lesson": <id>}'}, status=400)
+    course_id = get_object_or_404(Lesson.objects.values_list('module__course_id', flat=True), pk=lesson_pk)
+    record_event(request.user.pk, ActivityEvent.VIDEO_WATCHED, course_id=course_id, object_id=lesson_pk)
+    return JsonResponse({'status': 'ok'}, status=202)
@@ -0,0 +1,15 @@
+from rest_framework import pagination
+
+
+class CursorPagination(pagination.CursorPagination):
+    """
+    Cursor pagination ordered by the view's `ordering` attribute, so each
+    endpoint pages along one of its indexes and a page stays stable while
+    rows are added in front of it.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'ordering', None) or self.ordering
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
@@ -0,0 +1,199 @@
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+
+from community.models import Channel, Message
+from community.views import MAX_MESSAGE_LENGTH
+from courses import sync
+from courses.models import Certificate, Course, Enrollment, Lesson, Module, Question, Quiz, UserQuizAttempt
+
+User = get_user_model()
+
+
+class SparseFieldsMixin:
+    """
+    Drops the top-level fields not named in the view's `?fields=` list
+    (passed in as context['fields']). Nested serializers are left whole.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('fields')
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if requested is not None and parent is None:
+            fields = {name: field for name, field in fields.items() if name in requested}
+        return fields
+
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'username']
+
+
+class CourseSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Course
+        fields = ['id', 'title']
+
+
+class LessonOutlineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Lesson
+        fields = ['id', 'title', 'order', 'video_url']
+
+
+class ModuleOutlineSerializer(serializers.ModelSerializer):
+    lessons = LessonOutlineSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Module
+        fields = ['id', 'title', 'order', 'lessons']
+
+
+class CourseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    instructor = UserSummarySerializer(read_only=True)
+    modules_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Course
+        fields = ['id', 'title', 'description', 'price', 'thumbnail', 'instructor', 'modules_count',
+                  'created_at', 'updated_at']
+        read_only_fields = ['thumbnail', 'created_at', 'updated_at']
+
+
+class CourseDetailSerializer(CourseSerializer):
+    outline = ModuleOutlineSerializer(source='modules', many=True, read_only=True)
+
+    class Meta(CourseSerializer.Meta):
+        fields = CourseSerializer.Meta.fields + ['outline']
+
+
+class EnrollmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    course = CourseSummarySerializer(read_only=True)
+    course_id = serializers.PrimaryKeyRelatedField(source='course', queryset=Course.objects.all(), write_only=True)
+
+    class Meta:
+        model = Enrollment
+        fields = ['id', 'course', 'course_id', 'progress', 'completed', 'date_enrolled', 'last_accessed']
+        # Progress comes from completed lessons (courses/sync.py), never from the client
+        read_only_fields = ['progress', 'completed', 'date_enrolled', 'last_accessed']
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is not None and 'course_id' in fields:
+            # The course of an existing enrollment can't be changed
+            fields['course_id'].read_only = True
+        return fields
+
+
+class QuestionSerializer(serializers.ModelSerializer):
+    # correct_option is deliberately left out
+    class Meta:
+        model = Question
+        fields = ['id', 'text', 'option_a', 'option_b', 'option_c', 'option_d']
+
+
+class QuizSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    questions_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Quiz
+        fields = ['id', 'course', 'title', 'pass_score', 'questions_per_attempt', 'time_limit_minutes', 'questions_count']
+
+
+class QuizDetailSerializer(QuizSerializer):
+    # A bank's questions are only handed out a sample at a time, and a timed
+    # quiz's once its clock starts (QuizViewSet.draw)
+    questions = serializers.SerializerMethodField()
+
+    def get_questions(self, quiz):
+        if quiz.questions_per_attempt or quiz.time_limit_minutes:
+            return []
+        return QuestionSerializer(quiz.questions.all(), many=True).data
+
+    class Meta(QuizSerializer.Meta):
+        fields = QuizSerializer.Meta.fields + ['questions']
+
+
+def answers_field(**kwargs):
+    return serializers.DictField(child=serializers.ChoiceField(choices=['A', 'B', 'C', 'D']), **kwargs)
+
+
+def question_keys(answers):
+    """JSON object keys are strings; grading wants question ids."""
+    try:
+        return {int(question_id): option for question_id, option in answers.items()}
+    except ValueError:
+        raise serializers.ValidationError('Keys must be question ids.')
+
+
+class QuizSubmissionSerializer(serializers.Serializer):
+    answers = answers_field()
+    # Required for question banks: the token returned by the draw
+    sample = serializers.CharField(required=False)
+    # Required for timed quizzes: the session returned by the draw
+    session = serializers.IntegerField(required=False)
+
+    def validate_answers(self, answers):
+        return question_keys(answers)
+
+
+class AttemptSerializer(serializers.ModelSerializer):
+    correct = serializers.IntegerField(read_only=True)
+    total = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = UserQuizAttempt
+        fields = ['id', 'quiz', 'score', 'passed', 'correct', 'total', 'timestamp']
+
+
+class CertificateSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    course = CourseSummarySerializer(read_only=True)
+
+    class Meta:
+        model = Certificate
+        fields = ['certificate_id', 'course', 'issued_at']
+
+
+class ChannelSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Channel
+        fields = ['id', 'name', 'slug', 'description']
+
+
+class MessageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    author = UserSummarySerializer(read_only=True)
+    content = serializers.CharField(max_length=MAX_MESSAGE_LENGTH)
+
+    class Meta:
+        model = Message
+        fields = ['id', 'author', 'content', 'timestamp']
+        read_only_fields = ['timestamp']
+
+
+class SyncEventSerializer(serializers.Serializer):
+    id = serializers.CharField(max_length=64)
+    type = serializers.ChoiceField(choices=sync.EVENT_TYPES)
+    at = serializers.DateTimeField()
+    lesson = serializers.IntegerField(required=False)
+    quiz = serializers.IntegerField(required=False)
+    answers = answers_field(required=False)
+    # Required when submitting a question bank: the token returned by the draw
+    sample = serializers.CharField(required=False)
+
+    def validate(self, data):
+        needs = ['quiz', 'answers'] if data['type'] == sync.QUIZ_SUBMITTED else ['lesson']
+        missing = [name for name in needs if name not in data]
+        if missing:
+            raise serializers.ValidationError({name: 'Required for this event type.' for name in missing})
+        return data
+
+    def validate_answers(self, answers):
+        return question_keys(answers)
+
+
+class SyncSerializer(serializers.Serializer):
+    token = serializers.CharField(required=False, allow_blank=True)
+    events = SyncEventSerializer(many=True, max_length=sync.MAX_EVENTS)
@@ -0,0 +1,297 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from community.models import Channel, Message
+from config.testing import QueryBudgetMixin
+from courses import banks
+from courses.models import (
+    Certificate, Course, Enrollment, Lesson, LessonCompletion, Module, Question, Quiz, QuizSession,
+    UserQuizAttempt,
+)
+from users.models import User
+
+
+def api(name, **kwargs):
+    return reverse(f'api:{name}', kwargs={'version': 'v1', **kwargs})
+
+
+class APITests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pw', role='instructor')
+        cls.student = User.objects.create_user('student', password='pw')
+        cls.courses = []
+        for c in range(5):
+            course = Course.objects.create(title=f'Course {c}', description='...', instructor=cls.instructor)
+            for m in range(3):
+                module = Module.objects.create(course=course, title=f'Module {m}', order=m)
+                for l in range(4):
+                    Lesson.objects.create(module=module, title=f'Lesson {l}', order=l)
+            for q in range(2):
+                quiz = Quiz.objects.create(course=course, title=f'Quiz {q}')
+                for n in range(3):
+                    Question.objects.create(quiz=quiz, text=f'Q{n}', option_a='a', option_b='b', option_c='c',
+                                            option_d='d', correct_option='B')
+            Enrollment.objects.create(student=cls.student, course=course, progress=100, completed=True)
+            Certificate.objects.create(user=cls.student, course=course)
+            cls.courses.append(course)
+        cls.channel = Channel.objects.create(name='General', slug='general')
+        for n in range(5):
+            author = cls.student if n % 2 else cls.instructor
+            Message.objects.create(channel=cls.channel, author=author, content=f'Message {n}')
+
+    def setUp(self):
+        self.client.force_login(self.student)
+
+    def test_query_budgets(self):
+        # Two of each budget are the session and user lookups; the rest must
+        # not grow with the number of rows on the page
+        quiz = Quiz.objects.first()
+        for url, budget in [
+            (api('course-list'), 3),
+            (api('course-detail', pk=self.courses[0].pk), 5),
+            (api('enrollment-list'), 3),
+            (api('quiz-list'), 3),
+            (api('quiz-detail', pk=quiz.pk), 4),
+            (api('certificate-list'), 3),
+            (api('channel-message-list', channel_slug='general'), 4),
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(self.assertQueryBudget(url, budget).status_code, 200)
+
+    def test_course_outline(self):
+        data = self.client.get(api('course-detail', pk=self.courses[0].pk)).json()
+        self.assertEqual(data['modules_count'], 3)
+        self.assertEqual([len(module['lessons']) for module in data['outline']], [4, 4, 4])
+        self.assertEqual(data['instructor']['username'], 'instructor')
+
+    def test_cursor_pagination(self):
+        first = self.client.get(api('course-list'), {'page_size': 3}).json()
+        self.assertEqual(len(first['results']), 3)
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 2)
+        self.assertIsNone(second['next'])
+        titles = [c['title'] for c in first['results'] + second['results']]
+        self.assertEqual(titles, [f'Course {c}' for c in reversed(range(5))])
+
+    def test_sparse_fields(self):
+        with self.assertNumQueries(3):
+            data = self.client.get(api('course-list'), {'fields': 'id,title'}).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'title'})
+
+    def test_etag(self):
+        url = api('course-detail', pk=self.courses[0].pk)
+        response = self.client.get(url)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        Lesson.objects.filter(module__course=self.courses[0]).update(title='Renamed')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_quiz_hides_answers_and_grades(self):
+        quiz = Quiz.objects.first()
+        data = self.client.get(api('quiz-detail', pk=quiz.pk)).json()
+        self.assertEqual(len(data['questions']), 3)
+        self.assertNotIn('correct_option', data['questions'][0])
+
+        answers = {str(question['id']): 'B' for question in data['questions'][:2]}
+        response = self.client.post(api('quiz-submit', pk=quiz.pk), {'answers': answers}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['correct'], response.json()['score']), (2, 66))
+        self.assertFalse(UserQuizAttempt.objects.get().passed)
+
+    def test_question_bank_is_drawn_then_submitted(self):
+        quiz = Quiz.objects.first()
+        quiz.questions_per_attempt = 2
+        quiz.save()
+        self.assertEqual(self.client.get(api('quiz-detail', pk=quiz.pk)).json()['questions'], [])
+        answers = {str(question.pk): 'B' for question in quiz.questions.all()}
+        response = self.client.post(api('quiz-submit', pk=quiz.pk), {'answers': answers}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        draw = self.client.post(api('quiz-draw', pk=quiz.pk)).json()
+        self.assertEqual(len(draw['questions']), 2)
+        response = self.client.post(api('quiz-submit', pk=quiz.pk), {'answers': answers, 'sample': draw['sample']},
+                                    content_type='application/json')
+        self.assertEqual((response.json()['correct'], response.json()['total']), (2, 2))
+        self.assertEqual(UserQuizAttempt.objects.get().question_ids, [question['id'] for question in draw['questions']])
+
+    def test_timed_quiz_goes_through_its_session(self):
+        quiz = Quiz.objects.first()
+        quiz.time_limit_minutes = 10
+        quiz.save()
+        # Nothing to read before the clock starts, signed in or not
+        self.assertEqual(self.client.get(api('quiz-detail', pk=quiz.pk)).json()['questions'], [])
+        self.client.logout()
+        self.assertEqual(self.client.get(api('quiz-detail', pk=quiz.pk)).json()['questions'], [])
+        self.assertFalse(QuizSession.objects.exists())
+        self.client.force_login(self.student)
+        answers = {str(question.pk): 'B' for question in quiz.questions.all()}
+        response = self.client.post(api('quiz-submit', pk=quiz.pk), {'answers': answers}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        draw = self.client.post(api('quiz-draw', pk=quiz.pk)).json()
+        self.assertEqual(len(draw['questions']), 3)
+        QuizSession.objects.filter(pk=draw['session']).update(deadline=timezone.now() - timedelta(minutes=5))
+        # Past the deadline the posted answers don't count
+        response = self.client.post(api('quiz-submit', pk=quiz.pk), {'answers': answers, 'session': draw['session']},
+                                    content_type='application/json')
+        self.assertEqual((response.status_code, response.json()['score']), (201, 0))
+        response = self.client.post(api('quiz-submit', pk=quiz.pk), {'answers': answers, 'session': draw['session']},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(UserQuizAttempt.objects.count(), 1)
+
+    def test_enrollments_are_own_only(self):
+        other = User.objects.create_user('other', password='pw')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(api('enrollment-list')).json()['results'], [])
+        response = self.client.post(api('enrollment-list'), {'course_id': self.courses[0].pk})
+        self.assertEqual(response.status_code, 201)
+        again = self.client.post(api('enrollment-list'), {'course_id': self.courses[0].pk})
+        self.assertEqual((again.status_code, again.json()['id']), (200, response.json()['id']))
+
+        # Progress can't be reported by the client: that would hand out certificates
+        enrollment_url = api('enrollment-detail', pk=response.json()['id'])
+        for method in (self.client.patch, self.client.put):
+            response = method(enrollment_url, {'progress': 100, 'completed': True}, content_type='application/json')
+            self.assertEqual(response.status_code, 403)
+        enrollment = Enrollment.objects.get(student=other, course=self.courses[0])
+        self.assertEqual((enrollment.progress, enrollment.completed), (0, False))
+        certificate = self.client.get(reverse('generate_certificate', args=[self.courses[0].pk]))
+        self.assertRedirects(certificate, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertFalse(Certificate.objects.filter(user=other).exists())
+
+    def test_course_writes_need_instructor(self):
+        payload = {'title': 'New', 'description': '...', 'price': '0.00'}
+        self.assertEqual(self.client.post(api('course-list'), payload).status_code, 403)
+        self.client.force_login(self.instructor)
+        response = self.client.post(api('course-list'), payload)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Course.objects.get(pk=response.json()['id']).instructor, self.instructor)
+
+    def test_post_message(self):
+        url = api('channel-message-list', channel_slug='general')
+        response = self.client.post(url, {'content': 'Hello'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.get(url).json()['results'][0]['content'], 'Hello')
+        self.client.logout()
+        self.assertEqual(self.client.post(url, {'content': 'Hi'}).status_code, 403)
+
+    def test_community_requires_login(self):
+        self.client.logout()
+        for url in (api('channel-list'), api('channel-detail', slug='general'),
+                    api('channel-message-list', channel_slug='general')):
+            self.assertEqual(self.client.get(url).status_code, 403, url)
+
+
+class SyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='pw')
+        instructor = User.objects.create_user('instructor', password='pw', role='instructor')
+        cls.course = Course.objects.create(title='Course', description='...', instructor=instructor)
+        cls.other_course = Course.objects.create(title='Other', description='...', instructor=instructor)
+        module = Module.objects.create(course=cls.course, title='Module', order=0)
+        cls.lessons = [Lesson.objects.create(module=module, title=f'Lesson {n}', order=n) for n in range(4)]
+        other_module = Module.objects.create(course=cls.other_course, title='Module', order=0)
+        cls.other_lesson = Lesson.objects.create(module=other_module, title='Elsewhere', order=0)
+        cls.quiz = Quiz.objects.create(course=cls.course, title='Quiz', pass_score=50)
+        cls.questions = [
+            Question.objects.create(quiz=cls.quiz, text=f'Q{n}', option_a='a', option_b='b', option_c='c',
+                                    option_d='d', correct_option='A')
+            for n in range(2)
+        ]
+        cls.enrollment = Enrollment.objects.create(student=cls.student, course=cls.course)
+
+    def setUp(self):
+        self.client.force_login(self.student)
+
+    def sync(self, events, token=''):
+        response = self.client.post(api('api_sync'), {'token': token, 'events': events}, content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def completed(self, key, lesson, at='2026-01-01T10:00:00Z'):
+        return {'id': key, 'type': 'lesson_completed', 'lesson': lesson.pk, 'at': at}
+
+    def test_applies_batch_once(self):
+        events = [
+            self.completed('c1', self.lessons[0]),
+            self.completed('c1', self.lessons[0]),
+            self.completed('c2', self.lessons[1]),
+            self.completed('c3', self.other_lesson),
+            {'id': 'q1', 'type': 'quiz_submitted', 'quiz': self.quiz.pk, 'at': '2026-01-01T10:05:00Z',
+             'answers': {str(self.questions[0].pk): 'A', str(self.questions[1].pk): 'C'}},
+            {'id': 'v1', 'type': 'lesson_viewed', 'lesson': self.lessons[2].pk, 'at': '2026-01-01T10:09:00Z'},
+            {'id': 'v2', 'type': 'lesson_viewed', 'lesson': self.lessons[1].pk, 'at': '2026-01-01T10:01:00Z'},
+        ]
+        data = self.sync(events)
+        self.assertEqual(data['results'], {
+            'c1': 'applied', 'c2': 'applied', 'c3': 'rejected', 'q1': 'applied', 'v1': 'applied', 'v2': 'applied',
+        })
+        self.enrollment.refresh_from_db()
+        self.assertEqual((self.enrollment.progress, self.enrollment.last_lesson), (50, self.lessons[2]))
+        attempt = UserQuizAttempt.objects.get()
+        self.assertEqual((attempt.score, attempt.passed), (50, True))
+        self.assertEqual(sorted(data['changes']['completed_lessons']), [self.lessons[0].pk, self.lessons[1].pk])
+
+        # Replaying the batch after a lost response changes nothing
+        again = self.sync(events, token=data['token'])
+        self.assertEqual(set(again['results'].values()), {'duplicate', 'rejected'})
+        self.assertEqual(UserQuizAttempt.objects.count(), 1)
+        self.assertEqual(LessonCompletion.objects.count(), 2)
+
+    def test_timed_quiz_is_not_synced(self):
+        self.quiz.time_limit_minutes = 10
+        self.quiz.save()
+        data = self.sync([{'id': 'q1', 'type': 'quiz_submitted', 'quiz': self.quiz.pk, 'at': '2026-01-01T10:05:00Z',
+                           'answers': {str(self.questions[0].pk): 'A'}}])
+        self.assertEqual(data['results'], {'q1': 'rejected'})
+        self.assertFalse(UserQuizAttempt.objects.exists())
+
+    def test_bank_submission_needs_its_sample(self):
+        self.quiz.questions_per_attempt = 1
+        self.quiz.save()
+        other = Quiz.objects.create(course=self.course, title='Other', pass_score=50, questions_per_attempt=1)
+        drawn = [self.questions[1].pk]
+        answers = {str(question.pk): 'A' for question in self.questions}
+        event = {'type': 'quiz_submitted', 'quiz': self.quiz.pk, 'at': '2026-01-01T10:05:00Z', 'answers': answers}
+        data = self.sync([
+            {**event, 'id': 'q1'},
+            {**event, 'id': 'q2', 'sample': 'forged'},
+            {**event, 'id': 'q3', 'sample': banks.make_sample_token(self.student, other, drawn)},
+            {**event, 'id': 'q4', 'sample': banks.make_sample_token(self.student, self.quiz, drawn)},
+        ])
+        self.assertEqual(data['results'], {'q1': 'rejected', 'q2': 'rejected', 'q3': 'rejected', 'q4': 'applied'})
+        # Graded on the drawn question alone, and kept with the attempt
+        attempt = UserQuizAttempt.objects.get()
+        self.assertEqual((attempt.score, attempt.question_ids), (100, drawn))
+
+    def test_delta_since_token(self):
+        token = self.sync([])['token']
+        Enrollment.objects.create(student=self.student, course=self.other_course)
+        changes = self.sync([self.completed('c1', self.lessons[0])], token=token)['changes']
+        self.assertEqual(sorted(e['course_id'] for e in changes['enrollments']), [self.course.pk, self.other_course.pk])
+        self.assertEqual(changes['completed_lessons'], [self.lessons[0].pk])
+
+        response = self.client.post(api('api_sync'), {'token': 'forged', 'events': []}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count_independent_of_batch_size(self):
+        def queries(events):
+            with CaptureQueriesContext(connection) as ctx:
+                self.sync(events)
+            return len(ctx)
+
+        small = queries([self.completed('a0', self.lessons[0])])
+        large = queries([self.completed(f'b{n}', lesson) for n, lesson in enumerate(self.lessons)] + [
+            {'id': f'v{n}', 'type': 'lesson_viewed', 'lesson': lesson.pk, 'at': '2026-01-01T11:00:00Z'}
+            for n, lesson in enumerate(self.lessons)
+        ])
+        self.assertEqual(small, large)
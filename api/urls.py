@@ -0,0 +1,18 @@
+from django.urls import path
+from rest_framework.authtoken.views import obtain_auth_token
+from rest_framework.routers import DefaultRouter
+
+from . import views
+
+router = DefaultRouter()
+router.register('courses', views.CourseViewSet, basename='course')
+router.register('enrollments', views.EnrollmentViewSet, basename='enrollment')
+router.register('quizzes', views.QuizViewSet, basename='quiz')
+router.register('certificates', views.CertificateViewSet, basename='certificate')
+router.register('channels', views.ChannelViewSet, basename='channel')
+router.register(r'channels/(?P<channel_slug>[-\w]+)/messages', views.MessageViewSet, basename='channel-message')
+
+urlpatterns = [
+    path('token/', obtain_auth_token, name='api_token'),
+    path('sync/', views.SyncView.as_view(), name='api_sync'),
+] + router.urls
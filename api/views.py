@@ -0,0 +1,297 @@
+import hashlib
+
+from django.db.models import Count, Prefetch
+from django.core import signing
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from community.models import Channel, Message
+from community.views import announce_message
+from community.write_buffer import MessagePending, save_message
+from config.ratelimit import check_rates
+from courses import banks, quiz_sessions, sync
+from courses.logic import grade_quiz
+from courses.models import Certificate, Course, Enrollment, Lesson, Question, Quiz, QuizSession
+
+from . import serializers
+
+
+def _is_staff(user):
+    return user.role == 'admin' or user.is_superuser
+
+
+class IsInstructorOrReadOnly(permissions.BasePermission):
+    """Instructors and admins create courses; only the owner (or an admin) edits one."""
+
+    def has_permission(self, request, view):
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        user = request.user
+        return user.is_authenticated and (user.role == 'instructor' or _is_staff(user))
+
+    def has_object_permission(self, request, view, obj):
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        return obj.instructor_id == request.user.pk or _is_staff(request.user)
+
+
+class APIViewMixin:
+    """
+    Shared behaviour of the v1 endpoints:
+
+    - `?fields=a,b` limits the top-level fields in the response;
+    - `query_plan` maps a field to a function preparing the queryset for it
+      (select_related, prefetch, annotate). Only the plans of the fields
+      being returned are applied, so a sparse request also runs fewer joins;
+    - GET responses carry an ETag over the rendered body and answer a
+      matching If-None-Match with 304.
+    """
+    query_plan = {}
+
+    def requested_fields(self):
+        if not hasattr(self, '_requested_fields'):
+            raw = self.request.query_params.get('fields')
+            self._requested_fields = {name.strip() for name in raw.split(',') if name.strip()} if raw else None
+        return self._requested_fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.requested_fields()
+        return context
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_fields = self.get_serializer_class().Meta.fields
+        requested = self.requested_fields()
+        for name, plan in self.query_plan.items():
+            if name in serializer_fields and (requested is None or name in requested):
+                queryset = plan(queryset)
+        return queryset
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+            return response
+        response.render()
+        response['ETag'] = '"%s"' % hashlib.md5(response.content).hexdigest()
+        patch_vary_headers(response, ['Cookie', 'Authorization'])
+        patch_cache_control(response, private=True, no_cache=True)
+        return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+class CourseViewSet(APIViewMixin, viewsets.ModelViewSet):
+    queryset = Course.objects.all()
+    permission_classes = [IsInstructorOrReadOnly]
+    ordering = '-created_at'
+    query_plan = {
+        'instructor': lambda qs: qs.select_related('instructor'),
+        'modules_count': lambda qs: qs.annotate(modules_count=Count('modules')),
+        'outline': lambda qs: qs.prefetch_related(
+            'modules', Prefetch('modules__lessons', queryset=Lesson.objects.defer('content')),
+        ),
+    }
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return serializers.CourseSerializer
+        return serializers.CourseDetailSerializer
+
+    def perform_create(self, serializer):
+        serializer.save(instructor=self.request.user)
+
+
+class EnrollmentViewSet(APIViewMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.CreateModelMixin,
+                        viewsets.GenericViewSet):
+    serializer_class = serializers.EnrollmentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    ordering = '-id'
+    query_plan = {
+        'course': lambda qs: qs.select_related('course'),
+    }
+
+    def get_queryset(self):
+        self.queryset = Enrollment.objects.filter(student=self.request.user)
+        return super().get_queryset()
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        course = serializer.validated_data['course']
+        enrollment, created = Enrollment.objects.get_or_create(student=request.user, course=course)
+        enrollment.course = course
+        return Response(
+            self.get_serializer(enrollment).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+    def update(self, request, *args, **kwargs):
+        # Progress (and with it completion and the certificate) only moves with completed lessons
+        raise PermissionDenied('Enrollments are read-only; progress is recorded from completed lessons.')
+
+    partial_update = update
+
+
+class QuizViewSet(APIViewMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Quiz.objects.all()
+    ordering = 'id'
+    query_plan = {
+        'questions_count': lambda qs: qs.annotate(questions_count=Count('questions')),
+        'questions': lambda qs: qs.prefetch_related(
+            Prefetch('questions', queryset=Question.objects.defer('correct_option').order_by('id')),
+        ),
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        course = self.request.query_params.get('course')
+        if course and course.isdigit():
+            queryset = queryset.filter(course_id=course)
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return serializers.QuizSerializer
+        return serializers.QuizDetailSerializer
+
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def draw(self, request, pk=None, **kwargs):
+        """
+        A fresh sample of a question bank, with the token to submit it with.
+        A timed quiz opens (or resumes) its server-side session instead, the
+        same one the site uses, and is submitted with that session's id.
+        """
+        quiz = get_object_or_404(Quiz, pk=pk)
+        if quiz.time_limit_minutes:
+            session, _ = quiz_sessions.open_session(request.user, quiz)
+            return Response({
+                'session': session.pk,
+                'deadline': session.deadline,
+                'questions': serializers.QuestionSerializer(quiz_sessions.session_questions(session), many=True).data,
+            }, status=status.HTTP_201_CREATED)
+        question_ids = banks.sample_questions(quiz)
+        return Response({
+            'sample': banks.make_sample_token(request.user, quiz, question_ids),
+            'questions': serializers.QuestionSerializer(banks.questions_in_order(quiz, question_ids), many=True).data,
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def submit(self, request, pk=None, **kwargs):
+        quiz = get_object_or_404(Quiz.objects.prefetch_related('questions'), pk=pk)
+        submission = serializers.QuizSubmissionSerializer(data=request.data)
+        submission.is_valid(raise_exception=True)
+        if quiz.time_limit_minutes:
+            return self.submit_session(request, quiz, submission.validated_data)
+        question_ids = None
+        if quiz.questions_per_attempt:
+            try:
+                question_ids = banks.read_sample_token(submission.validated_data.get('sample', ''), request.user, quiz)
+            except signing.BadSignature:
+                return Response({'sample': ['Draw the questions first, and submit within a day.']},
+                                status=status.HTTP_400_BAD_REQUEST)
+        attempt, correct, total = grade_quiz(request.user, quiz, submission.validated_data['answers'], question_ids)
+        attempt.correct, attempt.total = correct, total
+        return Response(serializers.AttemptSerializer(attempt).data, status=status.HTTP_201_CREATED)
+
+    def submit_session(self, request, quiz, data):
+        """Submit a timed quiz through its session, so the deadline holds here as on the site."""
+        session = QuizSession.objects.filter(pk=data.get('session'), user=request.user, quiz=quiz).first()
+        if session is None:
+            return Response({'session': ['Timed quizzes are started with draw and submitted with its session.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        graded = quiz_sessions.submit(session, data['answers'])
+        if graded is None:
+            return Response({'detail': 'This attempt has already been submitted.'}, status=status.HTTP_409_CONFLICT)
+        attempt, correct, total = graded
+        attempt.correct, attempt.total = correct, total
+        return Response(serializers.AttemptSerializer(attempt).data, status=status.HTTP_201_CREATED)
+
+
+class CertificateViewSet(APIViewMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = serializers.CertificateSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_field = 'certificate_id'
+    ordering = '-issued_at'
+    query_plan = {
+        'course': lambda qs: qs.select_related('course'),
+    }
+
+    def get_queryset(self):
+        self.queryset = Certificate.objects.filter(user=self.request.user)
+        return super().get_queryset()
+
+
+class ChannelViewSet(APIViewMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Channel.objects.all()
+    serializer_class = serializers.ChannelSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_field = 'slug'
+    ordering = 'name'
+
+
+class MessageViewSet(APIViewMixin, mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet):
+    """Messages of one channel, newest first. Posting goes through the chat's write path."""
+    serializer_class = serializers.MessageSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    ordering = '-id'
+    query_plan = {
+        'author': lambda qs: qs.select_related('author'),
+    }
+
+    def get_channel(self):
+        if not hasattr(self, '_channel'):
+            self._channel = get_object_or_404(Channel, slug=self.kwargs['channel_slug'])
+        return self._channel
+
+    def get_queryset(self):
+        self.queryset = Message.objects.filter(channel=self.get_channel())
+        return super().get_queryset()
+
+    def create(self, request, *args, **kwargs):
+        allowed, retry_after = check_rates(('chat_user', request.user.pk), ('chat_channel', self.get_channel().pk))
+        if not allowed:
+            return Response(
+                {'detail': 'Too many messages, slow down.'},
+                status=status.HTTP_429_TOO_MANY_REQUESTS, headers={'Retry-After': str(int(retry_after) + 1)},
+            )
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            message = save_message(Message(
+                channel=self.get_channel(), author=request.user, content=serializer.validated_data['content'],
+            ), on_saved=announce_message)
+        except MessagePending:
+            return Response({'detail': 'The message is being saved and will appear shortly.'},
+                            status=status.HTTP_202_ACCEPTED)
+        return Response(self.get_serializer(message).data, status=status.HTTP_201_CREATED)
+
+
+class SyncView(APIView):
+    """
+    Offline batch sync (see courses/sync.py). POST {"token": ..., "events": [...]}
+    and get back each event's status, the server state changed since the
+    token, and the token for the next sync.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        payload = serializers.SyncSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        try:
+            since = sync.read_token(payload.validated_data.get('token'))
+        except signing.BadSignature:
+            return Response({'token': ['Invalid sync token.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Taken before applying, so the delta includes this batch's effects
+        now = timezone.now()
+        results = sync.apply_events(request.user, payload.validated_data['events'])
+        return Response({
+            'token': sync.make_token(now),
+            'results': results,
+            'changes': sync.changes_since(request.user, since),
+        })
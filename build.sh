@@ -7,3 +7,6 @@ pip install -r requirements.txt
 python manage.py collectstatic --no-input
 
 python manage.py migrate
+
+# No-op unless CACHE_BACKEND=db
+python manage.py createcachetable
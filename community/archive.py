@@ -0,0 +1,145 @@
+import gzip
+import json
+from datetime import datetime, time, timedelta
+from itertools import groupby
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db import transaction
+from django.utils import timezone
+
+from config.cache import cached_query
+
+from .models import ArchivedPartition, Message
+
+User = get_user_model()
+
+ARCHIVE_STORAGE = 'community_archive'
+
+
+def retention_cutoff(channel, now=None):
+    """Start of the oldest day that stays hot; whole days are archived at a time."""
+    today = timezone.localdate(now or timezone.now())
+    first_kept = today - timedelta(days=channel.retention_days)
+    return timezone.make_aware(datetime.combine(first_kept, time.min))
+
+
+def _partition_path(channel, day, first_id):
+    return f'{channel.slug}/{day:%Y/%m/%d}/{first_id}.jsonl.gz'
+
+
+def _serialize(message):
+    return json.dumps({
+        'id': message.id,
+        'author_id': message.author_id,
+        'author': message.author.username,
+        'content': message.content,
+        'timestamp': message.timestamp.isoformat(),
+    })
+
+
+def archive_channel(channel, cutoff, batch_size=5000, delete_chunk=1000, dry_run=False):
+    """
+    Move messages older than `cutoff` into compressed per-day JSONL files,
+    then delete them from the database in chunks of `delete_chunk` rows.
+    Each partition is written before its rows are deleted, and paths are
+    deterministic, so a crashed run is simply redone by the next one.
+    Returns the number of messages archived.
+    """
+    storage = storages[ARCHIVE_STORAGE]
+    archived = 0
+    last_id = 0
+    while True:
+        batch = list(
+            Message.objects.filter(channel=channel, timestamp__lt=cutoff, id__gt=last_id)
+            .select_related('author').order_by('id')[:batch_size]
+        )
+        if not batch:
+            return archived
+        last_id = batch[-1].id
+
+        for day, group in groupby(batch, key=lambda m: timezone.localdate(m.timestamp)):
+            group = list(group)
+            archived += len(group)
+            if dry_run:
+                continue
+            path = _partition_path(channel, day, group[0].id)
+            body = gzip.compress(('\n'.join(_serialize(m) for m in group) + '\n').encode())
+            if storage.exists(path):
+                storage.delete(path)
+            storage.save(path, ContentFile(body))
+
+            ids = [m.id for m in group]
+            with transaction.atomic():
+                ArchivedPartition.objects.update_or_create(path=path, defaults={
+                    'channel': channel,
+                    'day': day,
+                    'first_id': ids[0],
+                    'last_id': ids[-1],
+                    'message_count': len(ids),
+                })
+                for start in range(0, len(ids), delete_chunk):
+                    Message.objects.filter(id__in=ids[start:start + delete_chunk]).delete()
+
+
+# Partitions are written once, so their contents can stay cached; the newest
+# ones are what every reader scrolling back past the hot rows opens
+PARTITION_CACHE_TIMEOUT = 60 * 60
+
+
+@cached_query('archive', timeout=PARTITION_CACHE_TIMEOUT,
+              key=lambda partition: f'{partition.pk}-{partition.last_id}-{partition.message_count}')
+def _load_partition(partition):
+    with storages[ARCHIVE_STORAGE].open(partition.path, 'rb') as f:
+        lines = gzip.decompress(f.read()).decode().splitlines()
+    messages = []
+    for line in lines:
+        row = json.loads(line)
+        # Unsaved stand-ins, so templates and message_payload() work unchanged
+        message = Message(
+            id=row['id'], channel_id=partition.channel_id, author_id=row['author_id'],
+            content=row['content'], timestamp=datetime.fromisoformat(row['timestamp']),
+        )
+        message.author = User(id=row['author_id'], username=row['author'])
+        messages.append(message)
+    return messages
+
+
+def archived_page(channel, before_id=None, limit=50):
+    """
+    Archived messages with id < before_id, newest first, at most `limit`
+    (plus one extra if more exist, so callers can tell whether to keep paging).
+    """
+    partitions = channel.archived_partitions.order_by('-last_id')
+    if before_id is not None:
+        partitions = partitions.filter(first_id__lt=before_id)
+    messages = []
+    for partition in partitions.iterator():
+        rows = [m for m in reversed(_load_partition(partition)) if before_id is None or m.id < before_id]
+        messages.extend(rows)
+        if len(messages) > limit:
+            break
+    return messages[:limit + 1]
+
+
+def archived_after(channel, after_id, limit=50):
+    """
+    Archived messages with id > after_id, oldest first, at most `limit`
+    (plus one extra if more exist).
+    """
+    partitions = channel.archived_partitions.filter(last_id__gt=after_id).order_by('first_id')
+    messages = []
+    for partition in partitions.iterator():
+        messages.extend(m for m in _load_partition(partition) if m.id > after_id)
+        if len(messages) > limit:
+            break
+    return messages[:limit + 1]
+
+
+def has_archived_before(channel, before_id=None):
+    """Whether the archive holds anything older than `before_id`, without opening a file."""
+    partitions = channel.archived_partitions.all()
+    if before_id is not None:
+        partitions = partitions.filter(first_id__lt=before_id)
+    return partitions.exists()
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class InProcessBroadcaster:
+    """
+    Fan-out of new chat messages to every stream open in this process.
+
+    Subscribers are asyncio queues bound to the event loop that created them,
+    so `publish` is safe to call from sync views running in worker threads.
+    Only reaches streams served by the same process; swap in a shared backend
+    (Redis pub/sub, Postgres LISTEN/NOTIFY) via COMMUNITY_BROADCAST_BACKEND
+    when running more than one ASGI worker.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel_slug, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel_slug, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, payload)
+            except RuntimeError:
+                # Loop already closed, the stream is gone
+                self._discard(channel_slug, (loop, queue))
+
+    @staticmethod
+    def _deliver(queue, payload):
+        if queue.full():
+            # Slow consumer: drop the oldest message rather than block publishers
+            queue.get_nowait()
+        queue.put_nowait(payload)
+
+    def _discard(self, channel_slug, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(channel_slug)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[channel_slug]
+
+    def subscriber_count(self, channel_slug):
+        with self._lock:
+            return len(self._subscribers.get(channel_slug, ()))
+
+    def subscribe(self, channel_slug, timeout=None):
+        """
+        Register a listener on `channel_slug` and return it as an async
+        iterator. Must be called from inside the consuming event loop.
+        """
+        subscription = Subscription(self, channel_slug, self.queue_size, timeout)
+        with self._lock:
+            self._subscribers[channel_slug].add(subscription.key)
+        return subscription
+
+
+class Subscription:
+    """
+    Async iterator over payloads published to one channel. Yields None after
+    `timeout` seconds of silence so callers can send keep-alives.
+    """
+
+    def __init__(self, broadcaster, channel_slug, queue_size, timeout=None):
+        self.broadcaster = broadcaster
+        self.channel_slug = channel_slug
+        self.timeout = timeout
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.key = (asyncio.get_running_loop(), self.queue)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await asyncio.wait_for(self.queue.get(), self.timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broadcaster._discard(self.channel_slug, self.key)
+
+
+@lru_cache(maxsize=None)
+def get_broadcaster():
+    backend = getattr(settings, 'COMMUNITY_BROADCAST_BACKEND', 'community.broadcast.InProcessBroadcaster')
+    return import_string(backend)()
@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Max
+
+from config.cache import make_key, stats
+from .models import Channel
+
+# Out-of-band writes (admin, shell) surface in polls within this many seconds
+LATEST_ID_TTL = 60
+# Long-poll waiters re-check the shared cache at this interval, so sends
+# handled by other worker processes are picked up too
+WAIT_SLICE = 1.0
+# A waiting long-poll holds its worker thread (a whole worker under sync
+# WSGI), so only this many wait at once per process; the rest are turned
+# away (WaitersBusy) and told when to come back
+MAX_WAITERS = 8
+# How long a bump waits for another bump of the same channel to finish
+BUMP_LOCK_TIMEOUT = 2
+BUMP_TRIES = 20
+
+_conditions = defaultdict(threading.Condition)
+_waiters = threading.BoundedSemaphore(MAX_WAITERS)
+
+
+class WaitersBusy(Exception):
+    """MAX_WAITERS long-polls are already waiting in this process."""
+
+
+def _latest_key(channel_slug):
+    return make_key('community', 'latest', channel_slug)
+
+
+def get_latest_message_id(channel_slug):
+    """
+    Id of the newest message in a channel, or None if the channel does not exist.
+    Served from cache; only a miss touches the database.
+    """
+    latest = cache.get(_latest_key(channel_slug))
+    stats.record('community', 'misses' if latest is None else 'hits')
+    if latest is None:
+        channel = Channel.objects.filter(slug=channel_slug).annotate(latest=Max('messages__id')).first()
+        if channel is None:
+            return None
+        latest = channel.latest or 0
+        # add, not set: a message bumped in since the query must not be undone
+        cache.add(_latest_key(channel_slug), latest, LATEST_ID_TTL)
+    return latest
+
+
+def get_latest_message_ids(channels):
+    """
+    {channel_id: newest message id} for several channels: one cache round-trip,
+    plus one grouped query for any misses.
+    """
+    keys = {_latest_key(channel.slug): channel for channel in channels}
+    cached = cache.get_many(keys)
+    latest = {keys[key].id: value for key, value in cached.items()}
+    missing = [channel for key, channel in keys.items() if key not in cached]
+    stats.record('community', 'hits', len(cached))
+    stats.record('community', 'misses', len(missing))
+    if missing:
+        found = dict(
+            Channel.objects.filter(id__in=[channel.id for channel in missing])
+            .annotate(latest=Max('messages__id')).values_list('id', 'latest')
+        )
+        for channel in missing:
+            latest[channel.id] = found.get(channel.id) or 0
+            cache.add(_latest_key(channel.slug), latest[channel.id], LATEST_ID_TTL)
+    return latest
+
+
+def bump_latest_message_id(channel_slug, message_id):
+    """
+    Record `message_id` as the channel's newest, unless a newer one already
+    is: bumps from concurrent sends can arrive in any order. The cache has no
+    compare-and-set, so a short per-channel lock (cache.add) makes the read
+    and the raise one step.
+    """
+    key = _latest_key(channel_slug)
+    if not cache.add(key, message_id, LATEST_ID_TTL):
+        lock = f'{key}:lock'
+        for _ in range(BUMP_TRIES):
+            if cache.add(lock, 1, BUMP_LOCK_TIMEOUT):
+                try:
+                    current = cache.get(key)
+                    if current is None or current < message_id:
+                        cache.set(key, message_id, LATEST_ID_TTL)
+                finally:
+                    cache.delete(lock)
+                break
+            time.sleep(BUMP_LOCK_TIMEOUT / BUMP_TRIES)
+        else:
+            # Couldn't get the lock: drop the entry so the next read asks the database
+            cache.delete(key)
+    condition = _conditions[channel_slug]
+    with condition:
+        condition.notify_all()
+
+
+def wait_for_message(channel_slug, after_id, timeout):
+    """
+    Block up to `timeout` seconds until the channel has a message newer than
+    `after_id`. Returns the latest id seen. Raises WaitersBusy instead of
+    waiting when MAX_WAITERS requests of this process are already waiting.
+    """
+    latest = get_latest_message_id(channel_slug)
+    if latest is None or latest > after_id:
+        return latest
+    if not _waiters.acquire(blocking=False):
+        raise WaitersBusy
+    try:
+        deadline = time.monotonic() + timeout
+        condition = _conditions[channel_slug]
+        while latest is not None and latest <= after_id:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with condition:
+                condition.wait(min(remaining, WAIT_SLICE))
+            latest = get_latest_message_id(channel_slug)
+    finally:
+        _waiters.release()
+    return latest
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from community.models import Channel
+from community.archive import archive_channel, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Moves messages older than each channel\'s retention window into the cold archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--channel', help='Only archive this channel slug')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Messages read per batch')
+        parser.add_argument('--delete-chunk', type=int, default=1000, help='Rows removed per DELETE statement')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be archived without changing anything')
+
+    def handle(self, *args, **options):
+        channels = Channel.objects.filter(retention_days__isnull=False)
+        if options['channel']:
+            channels = channels.filter(slug=options['channel'])
+
+        total = 0
+        for channel in channels:
+            cutoff = retention_cutoff(channel)
+            count = archive_channel(
+                channel, cutoff,
+                batch_size=options['batch_size'],
+                delete_chunk=options['delete_chunk'],
+                dry_run=options['dry_run'],
+            )
+            total += count
+            verb = 'Would archive' if options['dry_run'] else 'Archived'
+            self.stdout.write(f'#{channel.slug}: {verb} {count} messages older than {cutoff:%Y-%m-%d}')
+
+        self.stdout.write(self.style.SUCCESS(f'Done. {total} messages in total.'))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from community.models import Channel, Message
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Reports DB queries per N get_messages polls with and without the latest-id cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--polls', type=int, default=1000)
+        parser.add_argument('--new-every', type=int, default=50,
+                            help='Post a new message every N polls (0 = never)')
+
+    def handle(self, *args, **options):
+        # Everything runs in a transaction that is rolled back, so no test data is left behind
+        with transaction.atomic():
+            user = User.objects.create_user(username='loadtest-poller', password='loadtest-poller')
+            channel = Channel.objects.create(name='loadtest', slug='loadtest-polling')
+            Message.objects.create(channel=channel, author=user, content='hello')
+
+            client = Client()
+            client.force_login(user)
+
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+                before = self.run_polls(client, channel, options)
+            cache.clear()
+            after = self.run_polls(client, channel, options)
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Polls: {options['polls']} (new message every {options['new_every']})")
+        # Session and user lookups by the auth middleware are included in both runs
+        self.stdout.write(f"  without cache: {before} queries")
+        self.stdout.write(self.style.SUCCESS(f"  with cache:    {after} queries"))
+
+    def run_polls(self, client, channel, options):
+        """Return the number of queries issued by the polls alone (sends are excluded)."""
+        url = f'/dashboard/community/{channel.slug}/messages/'
+        send_url = f'/dashboard/community/{channel.slug}/send/'
+        last_id = channel.messages.order_by('-id').values_list('id', flat=True).first()
+        queries = 0
+        for i in range(options['polls']):
+            if options['new_every'] and i % options['new_every'] == 0:
+                client.post(send_url, {'content': f'msg {i}'}, content_type='application/json')
+            with CaptureQueriesContext(connection) as ctx:
+                data = client.get(url, {'after_id': last_id}).json()
+            queries += len(ctx)
+            if data['messages']:
+                last_id = data['messages'][-1]['id']
+        return queries
@@ -0,0 +1,67 @@
+from django.db import migrations
+
+# Full-text index over Message.content, maintained by the database itself so
+# every insert/update/delete path (views, admin, bulk_create, archival) stays in sync.
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS community_message_fts
+    USING fts5(content, content='community_message', content_rowid='id', tokenize='unicode61')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS community_message_fts_ai AFTER INSERT ON community_message BEGIN
+        INSERT INTO community_message_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS community_message_fts_ad AFTER DELETE ON community_message BEGIN
+        INSERT INTO community_message_fts(community_message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS community_message_fts_au AFTER UPDATE OF content ON community_message BEGIN
+        INSERT INTO community_message_fts(community_message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO community_message_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    "INSERT INTO community_message_fts(community_message_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS community_message_fts_au",
+    "DROP TRIGGER IF EXISTS community_message_fts_ad",
+    "DROP TRIGGER IF EXISTS community_message_fts_ai",
+    "DROP TABLE IF EXISTS community_message_fts",
+]
+
+POSTGRES_FORWARD = [
+    """
+    CREATE INDEX IF NOT EXISTS community_message_content_fts
+    ON community_message USING GIN (to_tsvector('english', content))
+    """,
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS community_message_content_fts",
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0002_message_channel_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run_for_vendor({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}),
+        ),
+    ]
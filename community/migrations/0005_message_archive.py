@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0004_channelreadstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='retention_days',
+            field=models.PositiveIntegerField(blank=True, help_text='Keep this many days of messages in the database; older ones are moved to the archive. Empty keeps everything.', null=True),
+        ),
+        migrations.CreateModel(
+            name='ArchivedPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('first_id', models.BigIntegerField()),
+                ('last_id', models.BigIntegerField()),
+                ('message_count', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_partitions', to='community.channel')),
+            ],
+            options={
+                'ordering': ['channel', 'first_id'],
+                'indexes': [models.Index(fields=['channel', 'last_id'], name='community_archive_range_idx')],
+            },
+        ),
+    ]
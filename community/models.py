@@ -5,6 +5,7 @@ class Channel(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     slug = models.SlugField(unique=True)
+    retention_days = models.PositiveIntegerField(null=True, blank=True, help_text="Keep this many days of messages in the database; older ones are moved to the archive. Empty keeps everything.")
 
     def __str__(self):
         return self.name
@@ -17,6 +18,43 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Keyset pagination of a channel's history: WHERE channel_id = %s AND id < %s ORDER BY id DESC
+            models.Index(fields=['channel', 'id'], name='community_msg_channel_id_idx'),
+            # Time-ordered reads of one channel (default ordering, retention cutoffs)
+            models.Index(fields=['channel', 'timestamp'], name='community_msg_channel_ts_idx'),
+        ]
 
     def __str__(self):
         return f"{self.author}: {self.content[:20]}"
+
+class ChannelReadState(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='channel_read_states')
+    channel = models.ForeignKey(Channel, on_delete=models.CASCADE, related_name='read_states')
+    # Plain id rather than a FK so archiving old messages never touches read markers
+    last_read_message_id = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'channel')
+
+    def __str__(self):
+        return f"{self.user} read #{self.channel} up to {self.last_read_message_id}"
+
+class ArchivedPartition(models.Model):
+    """One compressed JSONL file of a channel's archived messages."""
+    channel = models.ForeignKey(Channel, on_delete=models.CASCADE, related_name='archived_partitions')
+    day = models.DateField()
+    path = models.CharField(max_length=255, unique=True)
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    message_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['channel', 'first_id']
+        indexes = [
+            models.Index(fields=['channel', 'last_id'], name='community_archive_range_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.channel} {self.day} ({self.message_count} messages)"
@@ -0,0 +1,74 @@
+from functools import reduce
+from operator import or_
+
+from django.db.models import Count, Q
+
+from .cache import get_latest_message_ids
+from .models import ChannelReadState, Message
+
+# Unread counts stop here; the sidebar shows anything above 99 as "99+"
+UNREAD_CAP = 100
+
+
+def mark_read(user, channel_id, message_id):
+    """
+    Advance the user's read marker for a channel; never moves it backwards.
+    One UPDATE in the common case, plus an INSERT the first time.
+    """
+    updated = ChannelReadState.objects.filter(
+        user=user, channel_id=channel_id, last_read_message_id__lt=message_id
+    ).update(last_read_message_id=message_id)
+    if not updated:
+        # Either no marker yet, or it's already at/after message_id
+        ChannelReadState.objects.bulk_create(
+            [ChannelReadState(user=user, channel_id=channel_id, last_read_message_id=message_id)],
+            ignore_conflicts=True,
+        )
+
+
+def unread_counts(user, channels, read_up_to=None):
+    """
+    {channel_id: unread message count} for the given channels.
+
+    `read_up_to` is an optional (channel_id, message_id) the user has just seen;
+    its marker is advanced first, and only written if it actually moves.
+
+    Channels whose cached high-water mark is at or behind the user's marker are
+    skipped without touching Message; the rest are counted in a single grouped
+    query where each channel's branch is a (channel, id) index range scan cut
+    off by a LIMIT subquery, so a channel is counted up to UNREAD_CAP however
+    far behind the user is.
+    """
+    channels = list(channels)
+    markers = dict(
+        ChannelReadState.objects.filter(user=user).values_list('channel_id', 'last_read_message_id')
+    )
+    if read_up_to is not None:
+        channel_id, message_id = read_up_to
+        if markers.get(channel_id, -1) < message_id:
+            mark_read(user, channel_id, message_id)
+            markers[channel_id] = message_id
+    latest = get_latest_message_ids(channels)
+
+    # First visit to a channel starts the user at "caught up" instead of
+    # counting its whole history as unread
+    new = [
+        ChannelReadState(user=user, channel_id=channel.id, last_read_message_id=latest[channel.id])
+        for channel in channels if channel.id not in markers
+    ]
+    if new:
+        ChannelReadState.objects.bulk_create(new, ignore_conflicts=True)
+        markers.update({state.channel_id: state.last_read_message_id for state in new})
+
+    behind = [channel.id for channel in channels if latest[channel.id] > markers[channel.id]]
+    if not behind:
+        return {}
+    ranges = reduce(or_, (
+        Q(id__in=Message.objects.filter(channel_id=channel_id, id__gt=markers[channel_id])
+          .order_by('id').values('id')[:UNREAD_CAP])
+        for channel_id in behind
+    ))
+    return dict(
+        Message.objects.filter(ranges).order_by().values('channel_id')
+        .annotate(unread=Count('id')).values_list('channel_id', 'unread')
+    )
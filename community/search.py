@@ -0,0 +1,109 @@
+import re
+
+from django.db import connection
+from django.utils.html import escape
+
+from .models import Message
+
+# Highlight markers: chosen so they never appear in user text and survive HTML escaping
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def _fts5_query(text):
+    # Quote every term so user input can't inject FTS5 operators; terms are ANDed
+    return ' '.join(f'"{word}"' for word in _WORD.findall(text))
+
+
+def _filters(channel, author, since, until, column='m'):
+    clauses, params = [], []
+    if channel is not None:
+        clauses.append(f'{column}.channel_id = %s')
+        params.append(channel.id)
+    if author is not None:
+        clauses.append(f'{column}.author_id = %s')
+        params.append(author.id)
+    if since is not None:
+        clauses.append(f'{column}.timestamp >= %s')
+        params.append(connection.ops.adapt_datetimefield_value(since))
+    if until is not None:
+        clauses.append(f'{column}.timestamp < %s')
+        params.append(connection.ops.adapt_datetimefield_value(until))
+    return clauses, params
+
+
+def _search_sqlite(text, channel, author, since, until, limit):
+    match = _fts5_query(text)
+    if not match:
+        return []
+    clauses, params = _filters(channel, author, since, until)
+    where = ''.join(f' AND {clause}' for clause in clauses)
+    sql = (
+        "SELECT m.id, snippet(community_message_fts, 0, %s, %s, '…', 16) "
+        "FROM community_message_fts "
+        "JOIN community_message m ON m.id = community_message_fts.rowid "
+        f"WHERE community_message_fts MATCH %s{where} "
+        "ORDER BY community_message_fts.rank LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [MARK_START, MARK_END, match, *params, limit])
+        return cursor.fetchall()
+
+
+def _search_postgresql(text, channel, author, since, until, limit):
+    clauses, params = _filters(channel, author, since, until)
+    where = ''.join(f' AND {clause}' for clause in clauses)
+    options = f'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords=24, MinWords=8'
+    # The to_tsvector expression must match the GIN index in migration 0003
+    sql = (
+        "SELECT m.id, ts_headline('english', m.content, q, %s) "
+        "FROM community_message m, websearch_to_tsquery('english', %s) q "
+        f"WHERE to_tsvector('english', m.content) @@ q{where} "
+        "ORDER BY ts_rank(to_tsvector('english', m.content), q) DESC, m.id DESC LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [options, text, *params, limit])
+        return cursor.fetchall()
+
+
+def _search_fallback(text, channel, author, since, until, limit):
+    # No full-text index on this backend: a (slow) substring scan
+    query = Message.objects.filter(content__icontains=text)
+    if channel is not None:
+        query = query.filter(channel=channel)
+    if author is not None:
+        query = query.filter(author=author)
+    if since is not None:
+        query = query.filter(timestamp__gte=since)
+    if until is not None:
+        query = query.filter(timestamp__lt=until)
+    pattern = re.compile(re.escape(text), re.IGNORECASE)
+    return [
+        (pk, pattern.sub(lambda m: f'{MARK_START}{m.group(0)}{MARK_END}', content))
+        for pk, content in query.order_by('-id').values_list('id', 'content')[:limit]
+    ]
+
+
+def highlight(snippet):
+    """Escape a raw snippet and turn the highlight markers into <mark> tags."""
+    return escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def search_messages(text, channel=None, author=None, since=None, until=None, limit=20):
+    """
+    Full-text search over community messages, best matches first.
+    Returns (message, snippet_html) pairs; the snippet is already escaped.
+    """
+    text = text.strip()
+    if not text:
+        return []
+    search = {
+        'sqlite': _search_sqlite,
+        'postgresql': _search_postgresql,
+    }.get(connection.vendor, _search_fallback)
+    rows = search(text, channel, author, since, until, limit)
+
+    messages = Message.objects.select_related('author', 'channel').in_bulk([pk for pk, _ in rows])
+    return [(messages[pk], highlight(snippet)) for pk, snippet in rows if pk in messages]
@@ -1,3 +1,436 @@
-from django.test import TestCase
+import asyncio
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from config.ratelimit import InProcessBackend, check_rate, get_backend
+from users.models import User
+
+from . import archive
+from . import cache as latest_ids
+from . import write_buffer
+from .broadcast import InProcessBroadcaster, get_broadcaster
+from .models import Channel, ChannelReadState, Message
+from .read_state import UNREAD_CAP, unread_counts
+from .search import MARK_END, MARK_START, _fts5_query, highlight, search_messages
+from .views import context_page, history_page, message_payload
+
+
+class BroadcasterTests(TestCase):
+    def test_publish_reaches_subscribers_of_the_channel(self):
+        broadcaster = InProcessBroadcaster()
+
+        async def listen():
+            general = broadcaster.subscribe('general', timeout=1)
+            other = broadcaster.subscribe('other', timeout=0.05)
+            # Published from a worker thread, as the sync views do
+            thread = threading.Thread(target=broadcaster.publish, args=('general', {'id': 1}))
+            thread.start()
+            thread.join()
+            try:
+                return await general.__anext__(), await other.__anext__()
+            finally:
+                general.close()
+                other.close()
+
+        self.assertEqual(asyncio.run(listen()), ({'id': 1}, None))
+        self.assertEqual(broadcaster.subscriber_count('general'), 0)
+
+    def test_slow_subscriber_drops_the_oldest(self):
+        broadcaster = InProcessBroadcaster(queue_size=2)
+
+        async def listen():
+            subscription = broadcaster.subscribe('general', timeout=0.05)
+            for n in range(1, 4):
+                broadcaster.publish('general', {'id': n})
+            # Deliveries are scheduled on the loop; let them run
+            await asyncio.sleep(0)
+            received = [await subscription.__anext__() for _ in range(3)]
+            subscription.close()
+            return received
+
+        self.assertEqual(asyncio.run(listen()), [{'id': 2}, {'id': 3}, None])
+
+    def test_publish_skips_closed_loops(self):
+        broadcaster = InProcessBroadcaster()
+
+        async def subscribe():
+            broadcaster.subscribe('general')
+
+        asyncio.run(subscribe())
+        broadcaster.publish('general', {'id': 1})
+        self.assertEqual(broadcaster.subscriber_count('general'), 0)
+
+
+class StreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ada', password='pw')
+        cls.channel = Channel.objects.create(name='General', slug='general')
+        cls.messages = [Message.objects.create(channel=cls.channel, author=cls.user, content=f'm{n}') for n in range(3)]
+
+    def setUp(self):
+        self.url = reverse('stream_messages', args=['general'])
+
+    def test_wsgi_gets_no_stream(self):
+        # The test client is a WSGI request: the page should fall back to polling
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 204)
+
+    async def test_catches_up_then_streams(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url, {'after_id': self.messages[0].id})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        missed = [(await anext(chunks)).decode() for _ in range(2)]
+        self.assertEqual([json.loads(chunk.split('data: ')[1])['content'] for chunk in missed], ['m1', 'm2'])
+        self.assertIn(b': connected', await anext(chunks))
+
+        message = Message(id=self.messages[-1].id + 1, channel=self.channel, author=self.user, content='live',
+                          timestamp=timezone.now())
+        # An id already sent is not repeated
+        get_broadcaster().publish('general', message_payload(self.messages[-1]))
+        get_broadcaster().publish('general', message_payload(message))
+        self.assertEqual((await anext(chunks)).decode(), f'id: {message.id}\ndata: {json.dumps(message_payload(message))}\n\n')
+        await chunks.aclose()
+
+    async def test_requires_login(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+    async def test_delivered_messages_are_read(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url, {'after_id': 0})
+        chunks = aiter(response.streaming_content)
+        for _ in range(4):
+            await anext(chunks)
+        state = await ChannelReadState.objects.aget(user=self.user, channel=self.channel)
+        self.assertEqual(state.last_read_message_id, self.messages[-1].id)
+
+        # Live messages inside the interval are marked when the client goes away
+        message = Message(id=self.messages[-1].id + 1, channel=self.channel, author=self.user, content='live',
+                          timestamp=timezone.now())
+        get_broadcaster().publish('general', message_payload(message))
+        await anext(chunks)
+        waiting = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0.05)
+        # What the ASGI handler does on disconnect
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        await state.arefresh_from_db()
+        self.assertEqual(state.last_read_message_id, message.id)
+
+
+class UnreadCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ada', password='pw')
+        cls.busy = Channel.objects.create(name='General', slug='general')
+        cls.quiet = Channel.objects.create(name='Help', slug='help')
+        Message.objects.bulk_create(
+            [Message(channel=cls.busy, author=cls.user, content=f'm{n}') for n in range(UNREAD_CAP + 20)]
+            + [Message(channel=cls.quiet, author=cls.user, content=f'q{n}') for n in range(3)]
+        )
+        for channel in (cls.busy, cls.quiet):
+            ChannelReadState.objects.create(user=cls.user, channel=channel, last_read_message_id=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counts_stop_at_the_cap(self):
+        with self.assertNumQueries(3):
+            counts = unread_counts(self.user, [self.busy, self.quiet])
+        self.assertEqual(counts, {self.busy.id: UNREAD_CAP, self.quiet.id: 3})
+
+    def test_counts_start_after_the_marker(self):
+        marker = Message.objects.filter(channel=self.busy).order_by('-id').values_list('id', flat=True)[4]
+        counts = unread_counts(self.user, [self.busy, self.quiet], read_up_to=(self.busy.id, marker))
+        self.assertEqual(counts, {self.busy.id: 4, self.quiet.id: 3})
+
+
+class LatestMessageIdTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ada', password='pw')
+        cls.channel = Channel.objects.create(name='General', slug='general')
+        cls.message = Message.objects.create(channel=cls.channel, author=cls.user, content='hi')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bumps_only_raise(self):
+        latest_ids.bump_latest_message_id('general', 10)
+        # A slower send of an older message reports in late
+        latest_ids.bump_latest_message_id('general', 7)
+        self.assertEqual(latest_ids.get_latest_message_id('general'), 10)
+
+    def test_concurrent_bumps_end_at_the_newest(self):
+        threads = [threading.Thread(target=latest_ids.bump_latest_message_id, args=('general', n)) for n in range(1, 41)]
+        for thread in reversed(threads):
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(latest_ids.get_latest_message_id('general'), 40)
+
+    def test_a_miss_does_not_undo_a_bump(self):
+        bumped = self.message.id + 5
+        original_add = cache.add
+
+        def bump_first(key, *args, **kwargs):
+            # A send lands between the miss's query and its write
+            cache.set(key, bumped)
+            return original_add(key, *args, **kwargs)
+
+        with mock.patch.object(cache, 'add', side_effect=bump_first):
+            self.assertEqual(latest_ids.get_latest_message_id('general'), self.message.id)
+        self.assertEqual(latest_ids.get_latest_message_id('general'), bumped)
+
+    def test_stuck_lock_falls_back_to_the_database(self):
+        latest_ids.bump_latest_message_id('general', self.message.id + 1)
+        cache.add(f"{latest_ids._latest_key('general')}:lock", 1)
+        with mock.patch.object(latest_ids, 'BUMP_LOCK_TIMEOUT', 0.01):
+            latest_ids.bump_latest_message_id('general', self.message.id + 2)
+        self.assertEqual(latest_ids.get_latest_message_id('general'), self.message.id)
+
+    def test_long_polls_beyond_the_cap_are_told_to_come_back(self):
+        self.client.force_login(self.user)
+        url = reverse('get_messages', args=['general'])
+        with mock.patch.object(latest_ids, '_waiters', threading.BoundedSemaphore(1)):
+            latest_ids._waiters.acquire()
+            start = time.monotonic()
+            with self.assertRaises(latest_ids.WaitersBusy):
+                latest_ids.wait_for_message('general', self.message.id, 5)
+            response = self.client.get(url, {'after_id': self.message.id, 'wait': 5})
+            self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(response.json(), {'messages': []})
+        self.assertEqual(response['Retry-After'], '5')
+        # A poll that did wait has no Retry-After
+        response = self.client.get(url, {'after_id': self.message.id, 'wait': 1})
+        self.assertNotIn('Retry-After', response)
+
+
+@override_settings(RATE_LIMITS={'chat_user': '2/m', 'chat_channel': '1/m'})
+class SendMessageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ada', password='pw')
+        cls.channel = Channel.objects.create(name='General', slug='general')
+
+    def setUp(self):
+        get_backend.cache_clear()
+        cache.clear()
+        self.client.force_login(self.user)
+        self.url = reverse('send_message', args=['general'])
+
+    def send(self, content='hi'):
+        return self.client.post(self.url, {'content': content}, content_type='application/json')
+
+    def test_a_full_channel_does_not_spend_the_senders_tokens(self):
+        self.assertEqual(self.send().status_code, 200)
+        self.assertEqual(self.send().status_code, 429)
+        # Only the first message was charged to the user
+        self.assertTrue(check_rate('chat_user', self.user.pk)[0])
+        self.assertFalse(check_rate('chat_user', self.user.pk)[0])
+
+    def test_unknown_channels_get_no_bucket(self):
+        for n in range(3):
+            response = self.client.post(reverse('send_message', args=[f'made-up-{n}']), {'content': 'hi'},
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 404)
+        self.assertEqual(list(get_backend()._buckets), [])
+
+    def test_in_process_buckets_stay_bounded(self):
+        with mock.patch('config.ratelimit.time.monotonic', return_value=100.0):
+            backend = InProcessBackend(max_buckets=3, sweep_interval=0)
+            for n in range(5):
+                backend.consume(f'chat_user:{n}', 2, 1.0)
+            # Peeking never stores a bucket
+            backend.consume('chat_user:peek', 2, 1.0, peek=True)
+        self.assertEqual(list(backend._buckets), ['chat_user:2', 'chat_user:3', 'chat_user:4'])
+        with mock.patch('config.ratelimit.time.monotonic', return_value=101.0):
+            # Refilled buckets are dropped; a spent one is kept
+            self.assertEqual(backend.consume('chat_user:4', 2, 1.0), (True, 0))
+        self.assertEqual(list(backend._buckets), ['chat_user:4'])
+
+    @override_settings(COMMUNITY_WRITE_BUFFER={'ENABLED': True, 'MAX_BATCH': 100, 'MAX_DELAY': 0.05, 'TIMEOUT': 0.01})
+    def test_slow_buffer_answers_pending_and_announces_later(self):
+        future = Future()
+        buffer = mock.Mock(**{'submit.return_value': future})
+        with mock.patch.object(write_buffer, 'get_write_buffer', return_value=buffer):
+            response = self.send('late')
+        self.assertEqual((response.status_code, response.json()), (202, {'status': 'pending'}))
+
+        # The flusher gets to it after all
+        message = buffer.submit.call_args.args[0]
+        message.save()
+        future.set_result(message)
+        self.assertEqual(latest_ids.get_latest_message_id('general'), message.id)
+
+
+class HistoryPagingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ada', password='pw')
+        cls.channel = Channel.objects.create(name='General', slug='general')
+        other = Channel.objects.create(name='Help', slug='help')
+        # Interleaved with another channel's messages, which must not leak into a page
+        Message.objects.bulk_create([
+            Message(channel=channel, author=cls.user, content=f'm{n}')
+            for n in range(5) for channel in (cls.channel, other)
+        ])
+        cls.ids = list(Message.objects.filter(channel=cls.channel).order_by('id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse('get_history', args=['general'])
+
+    def page(self, **params):
+        return self.client.get(self.url, params).json()
+
+    def test_pages_back_without_gaps_or_repeats(self):
+        seen, before_id, has_more = [], None, True
+        while has_more:
+            page = self.page(limit=2, **({'before_id': before_id} if before_id else {}))
+            seen = [message['id'] for message in page['messages']] + seen
+            before_id, has_more = page['before_id'], page['has_more']
+        self.assertEqual(seen, self.ids)
+
+    def test_page_boundaries(self):
+        # Exactly a page left: no phantom "load older"
+        page = self.page(limit=2, before_id=self.ids[2])
+        self.assertEqual(([m['id'] for m in page['messages']], page['has_more']), (self.ids[:2], False))
+        # Before the very first message
+        page = self.page(before_id=self.ids[0])
+        self.assertEqual((page['messages'], page['has_more'], page['before_id']), ([], False, None))
+        # A whole channel that fits in one page
+        page = self.page(limit=5)
+        self.assertEqual(([m['id'] for m in page['messages']], page['has_more']), (self.ids, False))
+
+    def test_limit_is_capped(self):
+        with mock.patch('community.views.HISTORY_PAGE_MAX', 3):
+            page = self.page(limit=1000)
+        self.assertEqual([m['id'] for m in page['messages']], self.ids[-3:])
+
+    def test_forward_paging_from_the_middle(self):
+        page = self.page(after_id=self.ids[1], limit=2)
+        self.assertEqual(([m['id'] for m in page['messages']], page['has_newer']), (self.ids[2:4], True))
+        page = self.page(after_id=page['after_id'], limit=2)
+        self.assertEqual(([m['id'] for m in page['messages']], page['has_newer']), (self.ids[4:], False))
+
+    def test_history_page_is_one_query(self):
+        with self.assertNumQueries(1):
+            history_page(self.channel, self.ids[3], limit=2)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ada = User.objects.create_user('ada', password='pw')
+        cls.bob = User.objects.create_user('bob', password='pw')
+        cls.general = Channel.objects.create(name='General', slug='general')
+        cls.help = Channel.objects.create(name='Help', slug='help')
+        cls.deploy = Message.objects.create(channel=cls.general, author=cls.ada, content='How do I deploy <b>Django</b>?')
+        cls.other = Message.objects.create(channel=cls.help, author=cls.bob, content='Deploy went fine, thanks')
+        Message.objects.create(channel=cls.general, author=cls.bob, content='Lunch anyone?')
+
+    def found(self, text, **filters):
+        return [message for message, _ in search_messages(text, **filters)]
+
+    def test_query_terms_are_quoted(self):
+        self.assertEqual(_fts5_query('deploy OR "x" NEAR(a b) -c*'), '"deploy" "OR" "x" "NEAR" "a" "b" "c"')
+        self.assertEqual(_fts5_query('"*()'), '')
+
+    def test_operator_syntax_is_searched_as_text(self):
+        # Would be a syntax error (or a different query) if passed to MATCH as-is
+        for text in ('deploy"', 'NEAR(deploy', 'deploy AND', '*', 'deploy -django'):
+            self.found(text)
+        self.assertEqual(self.found('"*()'), [])
+        self.assertEqual(self.found('   '), [])
+
+    def test_filters(self):
+        self.assertEqual(set(self.found('deploy')), {self.deploy, self.other})
+        self.assertEqual(self.found('deploy', channel=self.help), [self.other])
+        self.assertEqual(self.found('deploy', author=self.ada), [self.deploy])
+        self.assertEqual(self.found('deploy', since=timezone.now() + timedelta(days=1)), [])
+
+    def test_snippets_are_escaped_and_highlighted(self):
+        [(message, snippet)] = search_messages('django')
+        self.assertEqual(message, self.deploy)
+        self.assertIn('&lt;b&gt;<mark>Django</mark>&lt;/b&gt;', snippet)
+        self.assertNotIn('<b>', snippet)
+
+    def test_highlight(self):
+        self.assertEqual(highlight(f'a {MARK_START}<i>{MARK_END} b'), 'a <mark>&lt;i&gt;</mark> b')
+
+    def test_search_view(self):
+        self.client.force_login(self.ada)
+        response = self.client.get(reverse('community_search'), {'q': 'deploy', 'channel': 'help'})
+        [result] = response.json()['results']
+        self.assertEqual((result['id'], result['channel']), (self.other.id, 'help'))
+        self.assertEqual(result['url'], reverse('community_channel', args=['help']) + f'?around={self.other.id}')
+        response = self.client.get(reverse('community_search'), {'q': 'deploy', 'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ArchiveReadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ada', password='pw')
+        cls.channel = Channel.objects.create(name='General', slug='general', retention_days=1)
+        cls.old = [Message.objects.create(channel=cls.channel, author=cls.user, content=f'old{n}') for n in range(6)]
+        Message.objects.filter(pk__in=[m.pk for m in cls.old]).update(timestamp=timezone.now() - timedelta(days=5))
+        cls.hot = [Message.objects.create(channel=cls.channel, author=cls.user, content=f'hot{n}') for n in range(2)]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        storages = {**settings.STORAGES, 'community_archive': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': directory.name},
+        }}
+        self.enterContext(override_settings(STORAGES=storages))
+        cache.clear()
+        archive.archive_channel(self.channel, archive.retention_cutoff(self.channel))
+        self.loads = self.enterContext(mock.patch.object(archive, '_load_partition', wraps=archive._load_partition))
+
+    def contents(self, messages):
+        return [message.content for message in messages]
+
+    def test_ordinary_load_does_not_open_the_archive(self):
+        messages, has_more = history_page(self.channel, limit=5)
+        self.assertEqual((self.contents(messages), has_more), (['hot0', 'hot1'], True))
+        # A full page of hot rows: has_more without a file read either
+        self.assertEqual(history_page(self.channel, self.hot[-1].id + 1, limit=2)[1], True)
+        self.loads.assert_not_called()
+
+    def test_paging_back_continues_into_the_archive(self):
+        messages, has_more = history_page(self.channel, self.hot[0].id, limit=4)
+        self.assertEqual((self.contents(messages), has_more), (['old2', 'old3', 'old4', 'old5'], True))
+        messages, has_more = history_page(self.channel, messages[0].id, limit=4)
+        self.assertEqual((self.contents(messages), has_more), (['old0', 'old1'], False))
+
+    def test_partitions_are_read_from_storage_once(self):
+        with mock.patch.object(archive.gzip, 'decompress', wraps=archive.gzip.decompress) as decompress:
+            first = history_page(self.channel, self.hot[0].id, limit=4)
+            self.assertEqual(history_page(self.channel, self.hot[0].id, limit=4), first)
+        self.assertEqual(decompress.call_count, 1)
+
+    def test_context_of_an_archived_message_reads_both_sides(self):
+        messages, has_older, has_newer = context_page(self.channel, self.old[3].id, limit=6)
+        self.assertEqual(self.contents(messages), ['old0', 'old1', 'old2', 'old3', 'old4', 'old5', 'hot0'])
+        self.assertEqual((has_older, has_newer), (False, True))
+
+    def test_context_of_a_hot_message_skips_the_archive_files(self):
+        messages, _, has_newer = context_page(self.channel, self.hot[1].id, limit=2)
+        self.assertEqual((self.contents(messages), has_newer), (['hot0', 'hot1'], False))
+        self.loads.assert_not_called()
@@ -1,75 +1,343 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.contrib.auth.views import redirect_to_login
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, HttpResponseNotModified, Http404
 from django.views.decorators.http import require_POST
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from datetime import date, datetime, time, timedelta
 from .models import Channel, Message
+from .broadcast import get_broadcaster
+from .cache import WaitersBusy, get_latest_message_id, bump_latest_message_id, wait_for_message
+from .search import search_messages
+from .read_state import mark_read, unread_counts
+from .write_buffer import MessagePending, save_message
+from .archive import archived_after, archived_page, has_archived_before
+from config.ratelimit import check_rates, too_many_requests
 import json
+from time import monotonic
+
+User = get_user_model()
+
+# Seconds of silence before a keep-alive comment is written to an open stream
+STREAM_KEEPALIVE = 15
+# An open stream moves the viewer's read marker at most this often (and once more on close)
+STREAM_READ_INTERVAL = 5
+# Upper bound for get_messages?wait=N long-polls; how many wait at once is
+# capped by community.cache.MAX_WAITERS
+LONG_POLL_MAX = 25
+# Retry-After (seconds) for long-polls turned away by that cap
+LONG_POLL_BUSY_RETRY = 5
+HISTORY_PAGE_SIZE = 50
+HISTORY_PAGE_MAX = 200
+MAX_MESSAGE_LENGTH = 2000
+# Raw JSON body cap, checked before parsing
+MAX_REQUEST_BYTES = 16 * 1024
+
+
+def message_payload(message):
+    return {
+        'id': message.id,
+        'author': message.author.username,
+        'content': message.content,
+        'timestamp': message.timestamp.strftime('%H:%M %p')
+    }
+
+def announce_message(message):
+    """Show a saved message to pollers (the latest-id cache) and open streams."""
+    bump_latest_message_id(message.channel.slug, message.id)
+    get_broadcaster().publish(message.channel.slug, message_payload(message))
+
+def history_page(channel, before_id=None, limit=HISTORY_PAGE_SIZE):
+    """
+    One page of a channel's history ending just before `before_id`, oldest first.
+    Keyset pagination on (channel, id) keeps this an index range scan however
+    deep the client scrolls. Returns (messages, has_more).
+
+    Archive files are only opened when the client pages back past the hot rows
+    (an explicit `before_id`) or there are no hot rows to show at all; an
+    ordinary page load just asks whether older, archived messages exist.
+    """
+    query = Message.objects.filter(channel=channel).select_related('author').order_by('-id')
+    if before_id is not None:
+        query = query.filter(id__lt=before_id)
+    messages = list(query[:limit + 1])
+    has_more = len(messages) > limit
+    if not has_more and channel.retention_days is not None:
+        oldest = messages[-1].id if messages else before_id
+        if (before_id is None and messages) or len(messages) == limit:
+            has_more = has_archived_before(channel, oldest)
+        else:
+            # Ran out of hot rows: continue transparently into the cold archive
+            messages += archived_page(channel, oldest, limit - len(messages))
+            has_more = len(messages) > limit
+    messages = messages[:limit]
+    messages.reverse()
+    return messages, has_more
+
+def newer_page(channel, after_id, limit=HISTORY_PAGE_SIZE):
+    """
+    Up to `limit` messages after `after_id`, oldest first: the rest of the
+    archive first when `after_id` falls inside it, then hot rows.
+    Returns (messages, has_newer).
+    """
+    messages = []
+    if channel.retention_days is not None:
+        messages = archived_after(channel, after_id, limit)
+    if len(messages) <= limit:
+        after_id = messages[-1].id if messages else after_id
+        query = Message.objects.filter(channel=channel, id__gt=after_id).select_related('author').order_by('id')
+        messages += query[:limit + 1 - len(messages)]
+    return messages[:limit], len(messages) > limit
+
+def context_page(channel, around_id, limit=HISTORY_PAGE_SIZE):
+    """
+    Messages surrounding `around_id` (inclusive), oldest first, for jumping to a
+    search hit. Returns (messages, has_older, has_newer).
+    """
+    older, has_older = history_page(channel, around_id + 1, limit // 2 + 1)
+    newer, has_newer = newer_page(channel, around_id, limit // 2)
+    return older + newer, has_older, has_newer
+
+def _int_param(request, name):
+    value = request.GET.get(name, '')
+    return int(value) if value.isdigit() else None
 
 @login_required
 def community_home(request, channel_slug='general'):
-    channels = Channel.objects.all()
     active_channel = get_object_or_404(Channel, slug=channel_slug)
-    # Get last 50 messages (newest first, then reverse for display)
-    messages_qs = active_channel.messages.select_related('author').order_by('-timestamp')[:50]
-    messages = list(messages_qs)
-    messages.reverse()
-    
+    around_id = _int_param(request, 'around')
+    has_newer = False
+    if around_id is not None:
+        # Jumped here from a search hit: show the surrounding conversation
+        messages, has_more, has_newer = context_page(active_channel, around_id)
+    else:
+        # Get last 50 messages (newest first, then reverse for display)
+        messages, has_more = history_page(active_channel, limit=HISTORY_PAGE_SIZE)
+
     last_message_id = messages[-1].id if messages else 0
+    # Viewing the latest page marks the channel as read
+    read_up_to = (active_channel.id, last_message_id) if messages and not has_newer else None
+
+    channels = list(Channel.objects.all())
+    unread = unread_counts(request.user, channels, read_up_to)
+    for channel in channels:
+        channel.unread = unread.get(channel.id, 0)
 
     context = {
         'channels': channels,
         'active_channel': active_channel,
         'messages': messages,
         'last_message_id': last_message_id,
+        'has_more_history': has_more,
+        'has_newer_history': has_newer,
+        'around_id': around_id,
     }
     return render(request, 'dashboard/community.html', context)
 
 @login_required
 @require_POST
 def send_message(request, channel_slug):
+    # Resolve the channel first: buckets are only made for channels that exist
+    channel = get_object_or_404(Channel, slug=channel_slug)
+    allowed, retry_after = check_rates(('chat_user', request.user.pk), ('chat_channel', channel.pk))
+    if not allowed:
+        return too_many_requests(retry_after)
+    if len(request.body) > MAX_REQUEST_BYTES:
+        return JsonResponse({'error': 'Message too long'}, status=413)
     try:
         data = json.loads(request.body)
         content = data.get('content')
         if not content:
             return JsonResponse({'error': 'Empty message'}, status=400)
-            
-        channel = get_object_or_404(Channel, slug=channel_slug)
-        message = Message.objects.create(
-            channel=channel,
-            author=request.user,
-            content=content
-        )
-        
+        if len(content) > MAX_MESSAGE_LENGTH:
+            return JsonResponse({'error': f'Messages are limited to {MAX_MESSAGE_LENGTH} characters'}, status=400)
+
+        try:
+            message = save_message(Message(
+                channel=channel,
+                author=request.user,
+                content=content
+            ), on_saved=announce_message)
+        except MessagePending:
+            # Saved late; streams and polls pick it up when it lands
+            return JsonResponse({'status': 'pending'}, status=202)
+
         return JsonResponse({
             'status': 'ok',
-            'message': {
-                'id': message.id,
-                'author': message.author.username,
-                'content': message.content,
-                'timestamp': message.timestamp.strftime('%H:%M %p')
-            }
+            'message': message_payload(message)
         })
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 @login_required
 def get_messages(request, channel_slug):
+    # Polling fallback for clients that cannot hold a stream_messages connection open
+    latest_id = get_latest_message_id(channel_slug)
+    if latest_id is None:
+        raise Http404("No Channel matches the given query.")
+
+    after_id = request.GET.get('after_id', '')
+    after_id = int(after_id) if after_id.isdigit() else None
+
+    busy = False
+    if after_id is not None and after_id >= latest_id:
+        # Nothing new: answer from cache, optionally holding the request open
+        wait = request.GET.get('wait', '')
+        if wait.isdigit() and int(wait) > 0:
+            try:
+                latest_id = wait_for_message(channel_slug, after_id, min(int(wait), LONG_POLL_MAX))
+            except WaitersBusy:
+                busy = True
+
+    etag = f'"{channel_slug}-{latest_id}"'
+    if after_id is not None and after_id >= latest_id:
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = JsonResponse({'messages': []})
+        response['ETag'] = etag
+        if busy:
+            response['Retry-After'] = LONG_POLL_BUSY_RETRY
+        return response
+
+    query = Message.objects.filter(channel__slug=channel_slug).select_related('author')
+    if after_id is not None:
+        messages = list(query.filter(id__gt=after_id).order_by('id'))
+    else:
+        # Initial load: the newest 50, oldest first
+        messages = list(query.order_by('-id')[:50])
+        messages.reverse()
+
+    if messages:
+        mark_read(request.user, messages[-1].channel_id, messages[-1].id)
+
+    response = JsonResponse({'messages': [message_payload(msg) for msg in messages]})
+    response['ETag'] = etag
+    return response
+
+@login_required
+def get_history(request, channel_slug):
     channel = get_object_or_404(Channel, slug=channel_slug)
-    after_id = request.GET.get('after_id')
-    
-    query = channel.messages.select_related('author').order_by('timestamp')
-    if after_id:
-        query = query.filter(id__gt=after_id)
+    limit = _int_param(request, 'limit')
+    limit = min(limit, HISTORY_PAGE_MAX) if limit else HISTORY_PAGE_SIZE
+    around_id = _int_param(request, 'around_id')
+    after_id = _int_param(request, 'after_id')
+
+    has_newer = False
+    if around_id is not None:
+        messages, has_more, has_newer = context_page(channel, around_id, limit)
+    elif after_id is not None:
+        # Forward paging, used after jumping into the middle of the history
+        messages, has_newer = newer_page(channel, after_id, limit)
+        has_more = True
     else:
-        query = query[:50]
-        
-    messages = []
-    for msg in query:
-        messages.append({
-            'id': msg.id,
-            'author': msg.author.username,
-            'content': msg.content,
-            'timestamp': msg.timestamp.strftime('%H:%M %p')
-        })
-        
-    return JsonResponse({'messages': messages})
+        messages, has_more = history_page(channel, _int_param(request, 'before_id'), limit)
+
+    return JsonResponse({
+        'messages': [message_payload(msg) for msg in messages],
+        'has_more': has_more,
+        'has_newer': has_newer,
+        # Cursors for the next older / newer pages
+        'before_id': messages[0].id if messages else None,
+        'after_id': messages[-1].id if messages else None,
+    })
+
+@login_required
+def search(request):
+    text = request.GET.get('q', '')
+    channel = author = None
+    if request.GET.get('channel'):
+        channel = get_object_or_404(Channel, slug=request.GET['channel'])
+    if request.GET.get('author'):
+        author = get_object_or_404(User, username=request.GET['author'])
+    try:
+        since = _date_param(request, 'since')
+        # Inclusive end date: everything before the following midnight
+        until = _date_param(request, 'until')
+        until = until + timedelta(days=1) if until else None
+    except ValueError:
+        return JsonResponse({'error': 'Dates must be YYYY-MM-DD'}, status=400)
+
+    results = search_messages(text, channel=channel, author=author, since=since, until=until)
+    return JsonResponse({
+        'results': [{
+            **message_payload(msg),
+            'channel': msg.channel.slug,
+            'snippet': snippet,
+            'url': reverse('community_channel', args=[msg.channel.slug]) + f'?around={msg.id}',
+        } for msg, snippet in results],
+    })
+
+def _date_param(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    day = date.fromisoformat(value)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+def _sse_event(payload):
+    return f"id: {payload['id']}\ndata: {json.dumps(payload)}\n\n"
+
+async def stream_messages(request, channel_slug):
+    """
+    Server-Sent Events stream of new messages in a channel.
+    Needs an ASGI server: under WSGI the stream would tie up a worker for as
+    long as the page is open, so it answers 204, which makes EventSource give
+    up and the page fall back to get_messages polling.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+
+    channel = await Channel.objects.filter(slug=channel_slug).afirst()
+    if channel is None:
+        raise Http404("No Channel matches the given query.")
+
+    # EventSource resends the last seen id on reconnect
+    after_id = request.headers.get('Last-Event-ID') or request.GET.get('after_id')
+    broadcaster = get_broadcaster()
+
+    # Messages delivered to an open page count as read, as get_messages polls do
+    read = {'id': 0, 'at': 0.0}
+    amark_read = sync_to_async(mark_read)
+
+    async def mark_delivered(last_id, force=False):
+        now = monotonic()
+        if last_id > read['id'] and (force or now - read['at'] >= STREAM_READ_INTERVAL):
+            await amark_read(user, channel.id, last_id)
+            read.update(id=last_id, at=now)
+
+    async def event_stream():
+        # Subscribe before the catch-up query so nothing published in between is lost
+        subscription = broadcaster.subscribe(channel.slug, timeout=STREAM_KEEPALIVE)
+        last_id = 0
+        try:
+            if after_id and after_id.isdigit():
+                last_id = int(after_id)
+                missed = channel.messages.select_related('author').filter(id__gt=last_id).order_by('id')
+                async for msg in missed:
+                    yield _sse_event(message_payload(msg))
+                    last_id = msg.id
+                await mark_delivered(last_id, force=True)
+            yield "retry: 3000\n: connected\n\n"
+            async for payload in subscription:
+                if payload is None:
+                    yield ": keep-alive\n\n"
+                elif payload['id'] > last_id:
+                    yield _sse_event(payload)
+                    last_id = payload['id']
+                await mark_delivered(last_id)
+        finally:
+            subscription.close()
+            await mark_delivered(last_id, force=True)
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,113 @@
+import logging
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from activity.ingest import record_event
+from activity.models import ActivityEvent
+from config.db_router import pin_to_primary
+
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+
+class MessagePending(Exception):
+    """The buffer didn't write the message in time. It still will, and then calls `on_saved`."""
+
+
+class MessageWriteBuffer:
+    """
+    Write-behind buffer for chat messages.
+
+    Senders hand over an unsaved Message and block on a Future; a single
+    flusher thread collects whatever arrives within `max_delay` seconds (up to
+    `max_batch` messages) and saves it with one bulk_create. Each Future then
+    resolves to its saved Message, primary key included, so callers still get
+    a confirmed id. Needs a backend that returns ids from bulk inserts
+    (PostgreSQL, SQLite 3.35+).
+    """
+
+    def __init__(self, max_batch=100, max_delay=0.05):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, message):
+        self._ensure_started()
+        future = Future()
+        self._queue.put((message, future))
+        return future
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='community-write-buffer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Give the rest of the burst a moment to arrive
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get(timeout=self.max_delay))
+            except queue.Empty:
+                pass
+            self.flush(batch)
+
+    def flush(self, batch):
+        close_old_connections()
+        try:
+            saved = Message.objects.bulk_create([message for message, _ in batch])
+        except Exception as e:
+            logger.exception("Failed to flush %d buffered chat messages", len(batch))
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for message, (_, future) in zip(saved, batch):
+            future.set_result(message)
+
+
+@lru_cache(maxsize=None)
+def get_write_buffer():
+    options = settings.COMMUNITY_WRITE_BUFFER
+    return MessageWriteBuffer(max_batch=options['MAX_BATCH'], max_delay=options['MAX_DELAY'])
+
+
+def _saved(message, on_saved):
+    record_event(message.author_id, ActivityEvent.MESSAGE_POSTED, object_id=message.pk, timestamp=message.timestamp, channel=message.channel_id)
+    if on_saved is not None:
+        on_saved(message)
+    return message
+
+
+def save_message(message, on_saved=None):
+    """
+    Save a chat message, through the write-behind buffer when it's enabled,
+    and call `on_saved(message)` once it has an id. If the buffer takes
+    longer than COMMUNITY_WRITE_BUFFER['TIMEOUT'], raises MessagePending; the
+    message is still written and `on_saved` then runs on the flusher thread.
+    """
+    if not settings.COMMUNITY_WRITE_BUFFER['ENABLED']:
+        message.save()
+        return _saved(message, on_saved)
+    # The insert happens on the flusher thread, out of sight of the request's router state
+    pin_to_primary()
+    future = get_write_buffer().submit(message)
+    try:
+        message = future.result(settings.COMMUNITY_WRITE_BUFFER['TIMEOUT'])
+    except FutureTimeout:
+        def late(future):
+            # A failed flush was logged by the buffer
+            if future.exception() is None:
+                _saved(future.result(), on_saved)
+        future.add_done_callback(late)
+        raise MessagePending
+    return _saved(message, on_saved)
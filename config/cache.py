@@ -0,0 +1,216 @@
+"""
+Shared caching helpers on top of Django's cache framework.
+
+Keys are namespaced and versioned (`<namespace>:v<version>:<parts>`), with
+versions taken from settings.CACHE_KEY_VERSIONS so a deploy that changes a
+cached value's shape can retire the old keys. Every namespace counts hits and
+misses; counters are kept in-process and flushed to the shared cache now and
+then, so `manage.py cache_stats` can report the fleet-wide hit rate.
+"""
+import hashlib
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+STATS_FLUSH_EVERY = 100
+STATS_FLUSH_INTERVAL = 10
+STATS_KEYS = ('hits', 'misses', 'refreshes')
+
+
+def make_key(namespace, *parts):
+    version = getattr(settings, 'CACHE_KEY_VERSIONS', {}).get(namespace, 1)
+    return ':'.join([namespace, f'v{version}', *(str(part) for part in parts)])
+
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(int)
+        self._events = 0
+        self._flushed_at = time.monotonic()
+
+    def record(self, namespace, event, count=1):
+        with self._lock:
+            self._pending[(namespace, event)] += count
+            self._events += count
+            due = (self._events >= STATS_FLUSH_EVERY
+                   or time.monotonic() - self._flushed_at >= STATS_FLUSH_INTERVAL)
+            if not due:
+                return
+            pending, self._pending, self._events = self._pending, defaultdict(int), 0
+            self._flushed_at = time.monotonic()
+        self._flush(pending)
+
+    def _flush(self, pending):
+        for (namespace, event), count in pending.items():
+            key = f'cachestats:{namespace}:{event}'
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                # Evicted between add and incr
+                cache.set(key, count, None)
+        namespaces = cache.get('cachestats:namespaces') or set()
+        new = {namespace for namespace, _ in pending} - namespaces
+        if new:
+            cache.set('cachestats:namespaces', namespaces | new, None)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending, self._events = self._pending, defaultdict(int), 0
+            self._flushed_at = time.monotonic()
+        self._flush(pending)
+
+
+stats = _Stats()
+
+
+def cache_stats():
+    """{namespace: {'hits', 'misses', 'refreshes', 'hit_rate'}} across all workers."""
+    stats.flush()
+    report = {}
+    for namespace in sorted(cache.get('cachestats:namespaces') or ()):
+        counts = cache.get_many([f'cachestats:{namespace}:{event}' for event in STATS_KEYS])
+        row = {event: counts.get(f'cachestats:{namespace}:{event}', 0) for event in STATS_KEYS}
+        lookups = row['hits'] + row['misses']
+        row['hit_rate'] = row['hits'] / lookups if lookups else 0.0
+        report[namespace] = row
+    return report
+
+
+def reset_cache_stats():
+    namespaces = cache.get('cachestats:namespaces') or ()
+    cache.delete_many([f'cachestats:{ns}:{event}' for ns in namespaces for event in STATS_KEYS])
+    cache.delete('cachestats:namespaces')
+
+
+def cache_get(namespace, *parts, default=None):
+    value = cache.get(make_key(namespace, *parts), default)
+    stats.record(namespace, 'misses' if value is default else 'hits')
+    return value
+
+
+def cache_set(namespace, *parts, value, timeout=300):
+    cache.set(make_key(namespace, *parts), value, timeout)
+
+
+def cache_delete(namespace, *parts):
+    cache.delete(make_key(namespace, *parts))
+
+
+# Misses being computed in this process: key -> Future of the value. The lock
+# only guards the dict; computing and waiting happen outside it, so a slow
+# key never holds up the others
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _args_key(args, kwargs):
+    raw = repr((args, sorted(kwargs.items())))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def cached_query(namespace, timeout=300, key=None, beta=1.0, lock_timeout=10):
+    """
+    Cache a function's return value under `namespace`, keyed by its arguments
+    (or by `key(*args, **kwargs)` when given).
+
+    Stampede protection:
+    * single-flight: on a miss only one caller per process computes the value
+      (the others wait on its Future, and get its exception if it fails), and
+      a short cache lock keeps other processes from piling on; they wait
+      briefly for the winner's result instead.
+    * early refresh: entries are recomputed probabilistically before they
+      expire (XFetch), weighted by how long the last computation took, so hot
+      keys rarely expire under load. Callers that lose the refresh race keep
+      getting the still-valid value.
+
+    The wrapped function gets `.invalidate(*args, **kwargs)`.
+    """
+    def decorator(func):
+        def cache_key(args, kwargs):
+            part = key(*args, **kwargs) if key else _args_key(args, kwargs)
+            return make_key(namespace, func.__module__, func.__qualname__, part)
+
+        def compute(full_key, args, kwargs):
+            start = time.monotonic()
+            value = func(*args, **kwargs)
+            delta = time.monotonic() - start
+            # Keep the entry a little past its logical expiry so it can still
+            # be served while one caller refreshes it
+            cache.set(full_key, (value, time.time() + timeout, delta), timeout + max(lock_timeout, delta * 2))
+            return value
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            full_key = cache_key(args, kwargs)
+            entry = cache.get(full_key)
+            if entry is not None:
+                value, expires_at, delta = entry
+                if time.time() - delta * beta * math.log(random.random() or 1e-12) < expires_at:
+                    stats.record(namespace, 'hits')
+                    return value
+                # Near expiry: one caller refreshes, everyone else keeps the current value
+                if cache.add(full_key + ':refresh', 1, lock_timeout):
+                    stats.record(namespace, 'refreshes')
+                    try:
+                        return compute(full_key, args, kwargs)
+                    finally:
+                        cache.delete(full_key + ':refresh')
+                stats.record(namespace, 'hits')
+                return value
+
+            stats.record(namespace, 'misses')
+            with _flights_lock:
+                flight = _flights.get(full_key)
+                leading = flight is None
+                if leading:
+                    flight = _flights[full_key] = Future()
+            if not leading:
+                # Another thread is computing it: wait for its result
+                try:
+                    return flight.result(lock_timeout)
+                except FutureTimeout:
+                    return compute(full_key, args, kwargs)
+            try:
+                value = fill(full_key, args, kwargs)
+            except BaseException as e:
+                flight.set_exception(e)
+                raise
+            else:
+                flight.set_result(value)
+                return value
+            finally:
+                with _flights_lock:
+                    del _flights[full_key]
+
+        def fill(full_key, args, kwargs):
+            # Another thread may have filled it just before this one took the lead
+            entry = cache.get(full_key)
+            if entry is not None:
+                return entry[0]
+            locked = cache.add(full_key + ':lock', 1, lock_timeout)
+            if not locked:
+                # Another process is computing: wait for its result
+                deadline = time.monotonic() + lock_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    entry = cache.get(full_key)
+                    if entry is not None:
+                        return entry[0]
+            try:
+                return compute(full_key, args, kwargs)
+            finally:
+                if locked:
+                    cache.delete(full_key + ':lock')
+
+        wrapper.invalidate = lambda *args, **kwargs: cache.delete(cache_key(args, kwargs))
+        return wrapper
+    return decorator
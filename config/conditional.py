@@ -0,0 +1,77 @@
+"""
+Conditional GET for pages whose content follows from a cheap version lookup.
+
+`conditional_page(version_func)` wraps Django's `condition()`: the version
+(a last-modified datetime plus anything else the page depends on) is looked
+up once per request, turned into an ETag together with the viewer (user id or
+anonymous, plus the CSRF secret on pages that embed a token) and the deploy's
+PAGE_CACHE['VERSION'], and a matching If-None-Match / If-Modified-Since is
+answered with 304 before the view runs.
+
+Anonymous responses get Last-Modified and `public` shared-cache headers so a
+CDN can serve and revalidate them. Authenticated responses are `private,
+no-cache` (browsers revalidate each time and get the 304) and carry only the
+ETag, since Last-Modified can't capture per-user state such as enrollment.
+Every response varies on Cookie, which is what tells the two apart.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+
+def conditional_page(version_func, public=True):
+    """
+    version_func(request, *args, **kwargs) returns (last_modified, extra) or
+    None when the page has no version (e.g. it's about to 404). The result is
+    kept on request.page_version so the view can reuse anything it fetched.
+    Pass public=False for pages that embed per-visitor state (a CSRF form).
+    """
+    def lookup(request, *args, **kwargs):
+        if not hasattr(request, 'page_version'):
+            request.page_version = version_func(request, *args, **kwargs)
+        return request.page_version
+
+    def etag(request, *args, **kwargs):
+        version = lookup(request, *args, **kwargs)
+        if version is None:
+            return None
+        last_modified, extra = version
+        viewer = request.user.pk if request.user.is_authenticated else 'anon'
+        if not public:
+            # The page embeds a CSRF token: a rotated secret (e.g. after logging
+            # in again) must not revalidate a copy holding the old one
+            get_token(request)
+            viewer = f"{viewer}:{request.META['CSRF_COOKIE']}"
+        raw = f"{settings.PAGE_CACHE['VERSION']}:{last_modified.timestamp()}:{extra}:{viewer}"
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        version = lookup(request, *args, **kwargs)
+        if version is None or request.user.is_authenticated:
+            return None
+        return version[0]
+
+    def decorator(view_func):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view_func)
+
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.status_code not in (200, 304):
+                return response
+            patch_vary_headers(response, ['Cookie'])
+            # A page holding a CSRF token is tied to this visitor's cookie
+            if not public or request.user.is_authenticated or request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(
+                    response, public=True,
+                    max_age=settings.PAGE_CACHE['MAX_AGE'], s_maxage=settings.PAGE_CACHE['S_MAXAGE'],
+                )
+            return response
+        return wrapped
+    return decorator
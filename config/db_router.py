@@ -0,0 +1,183 @@
+"""
+Primary/replica database routing.
+
+Reads go to a replica from settings.DATABASE_REPLICAS and writes go to the
+primary (`default`). Replicas trail the primary, so a user who has just written
+(enrolled, submitted a quiz, sent a message) is pinned to the primary:
+
+- for the rest of the request that wrote, and for every unsafe (POST, ...)
+  request, so a view never reads back around its own write;
+- for REPLICA_STICKY_SECONDS afterwards, via a short-lived cookie set by
+  ReplicaPinningMiddleware, so the redirect/next page sees the write too;
+- inside `transaction.atomic()` on the primary and inside `use_primary()`.
+
+Each replica's lag is measured at most every REPLICA_LAG_CHECK_INTERVAL
+seconds; replicas further behind than REPLICA_MAX_LAG, or unreachable, are
+skipped, and with none left reads fall back to the primary.
+"""
+import contextvars
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+PIN_COOKIE = 'db_primary_until'
+
+
+class _RoutingState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('db_routing_state', default=None)
+
+_lag_lock = threading.Lock()
+_lag_checked = {}  # alias -> (monotonic time of check, lag in seconds or None if unreachable)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def measure_lag(alias):
+    """Replication lag of `alias` in seconds, or None if it cannot be reached."""
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT CASE WHEN NOT pg_is_in_recovery() '
+                    'OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+                )
+                return float(cursor.fetchone()[0] or 0)
+            # No replication status to ask for (e.g. a copied SQLite file); check it answers
+            cursor.execute('SELECT 1')
+            return 0.0
+    except DatabaseError:
+        return None
+
+
+def replica_lag(alias):
+    now = time.monotonic()
+    with _lag_lock:
+        checked = _lag_checked.get(alias)
+    if checked and now - checked[0] < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return checked[1]
+    lag = measure_lag(alias)
+    with _lag_lock:
+        _lag_checked[alias] = (now, lag)
+    return lag
+
+
+def healthy_replicas():
+    max_lag = settings.REPLICA_MAX_LAG
+    return [alias for alias in replicas() if (lag := replica_lag(alias)) is not None and lag <= max_lag]
+
+
+def pin_to_primary():
+    """Send this request's remaining reads, and the user's next few requests, to the primary."""
+    state = _state.get()
+    if state is not None:
+        state.pinned = state.wrote = True
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside the block (management commands, read-after-write in scripts)."""
+    token = _state.set(_RoutingState(pinned=True))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not replicas():
+            return None
+        state = _state.get()
+        if state is not None and state.pinned:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == DEFAULT_DB_ALIAS:
+            # Following relations of an object fetched from the primary
+            return DEFAULT_DB_ALIAS
+        candidates = healthy_replicas()
+        return random.choice(candidates) if candidates else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive schema changes through replication
+        return False if db in replicas() else None
+
+
+class ReplicaPinningMiddleware:
+    """Tracks writes per request and carries primary stickiness across requests in a cookie."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not replicas():
+            return self.get_response(request)
+        token = _state.set(self.request_state(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            state = _state.get()
+            _state.reset(token)
+        return self.process_response(state, response)
+
+    async def __acall__(self, request):
+        if not replicas():
+            return await self.get_response(request)
+        # sync_to_async copies the context, so ORM calls share this state object
+        token = _state.set(self.request_state(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            state = _state.get()
+            _state.reset(token)
+        return self.process_response(state, response)
+
+    def request_state(self, request):
+        now = time.time()
+        try:
+            pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        unsafe = request.method not in ('GET', 'HEAD', 'OPTIONS')
+        return _RoutingState(pinned=unsafe or now < pinned_until <= now + settings.REPLICA_STICKY_SECONDS)
+
+    def process_response(self, state, response):
+        if state.wrote:
+            sticky = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(
+                PIN_COOKIE, str(int(time.time() + sticky)), max_age=sticky, httponly=True, samesite='Lax',
+            )
+        return response
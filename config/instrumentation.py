@@ -0,0 +1,182 @@
+"""
+Per-request SQL and latency instrumentation.
+
+QueryInstrumentationMiddleware records query count, total DB time,
+duplicate-query fingerprints and template render time (from the moment the
+`render_timer` context processor runs) for every request. Each connection
+carries one permanent execute wrapper that hands statements to the
+QueryRecorder in the `current_recorder` context variable, and the middleware
+sets that variable for the duration of the request. Context variables follow
+sync_to_async and the gather_queries pool (config/parallel.py), so queries run
+by async views on other threads are counted like those of sync views. Each request is logged as one JSON
+line on the `config.instrumentation` logger; requests over their budget in
+settings.QUERY_BUDGETS are logged as warnings. In DEBUG the numbers are also
+sent back as `Server-Timing` / `X-Query-Count` headers.
+"""
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_IN_LISTS = re.compile(r'\bIN \((?:%s|\?)(?:, *(?:%s|\?))*\)', re.IGNORECASE)
+
+
+def fingerprint(sql):
+    """Normalise a statement so repeats with different parameters group together."""
+    sql = _LITERALS.sub('?', sql)
+    sql = _IN_LISTS.sub('IN (...)', sql)
+    return ' '.join(sql.split())
+
+
+class QueryRecorder:
+    """execute_wrapper that times every statement run through it."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.render_count = 0
+        self.render_started = None
+        self.fingerprints = Counter()
+        # Pool threads of one request record concurrently
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                self.duration += duration
+                self.count += 1
+                if self.render_started is not None:
+                    self.render_count += 1
+                self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return {sql: n for sql, n in self.fingerprints.most_common() if n > 1}
+
+
+current_recorder = contextvars.ContextVar('query_recorder', default=None)
+
+
+def _record(execute, sql, params, many, context):
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_wrapper(connection):
+    if _record not in connection.execute_wrappers:
+        # Outermost, so connection.execute_wrapper() blocks still pop their own wrapper
+        connection.execute_wrappers.insert(0, _record)
+
+
+def install_wrappers():
+    """Put `_record` on this thread's connections; new connections get it as they open."""
+    for alias in connections:
+        install_wrapper(connections[alias])
+
+
+def _connection_created(sender, connection, **kwargs):
+    install_wrapper(connection)
+
+
+connection_created.connect(_connection_created, dispatch_uid='config.instrumentation')
+
+
+def render_timer(request):
+    """Context processor marking the start of template rendering."""
+    recorder = getattr(request, 'query_recorder', None)
+    if recorder is not None and recorder.render_started is None:
+        recorder.render_started = time.perf_counter()
+    return {}
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else None
+
+
+class QueryInstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        install_wrappers()
+        recorder = QueryRecorder()
+        request.query_recorder = recorder
+        token = current_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.report(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        # Connections already open on the thread async ORM calls run on
+        await sync_to_async(install_wrappers)()
+        recorder = QueryRecorder()
+        request.query_recorder = recorder
+        token = current_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.report(request, response, recorder, start)
+
+    def report(self, request, response, recorder, start):
+        total = time.perf_counter() - start
+        render = total - (recorder.render_started - start) if recorder.render_started else 0.0
+
+        name = view_name(request)
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(name)
+        duplicates = recorder.duplicates()
+        record = {
+            'view': name,
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'render_queries': recorder.render_count,
+            'db_ms': round(recorder.duration * 1000, 2),
+            'render_ms': round(render * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'duplicates': len(duplicates),
+        }
+        if budget is not None and recorder.count > budget:
+            record['budget'] = budget
+            record['top_duplicates'] = list(duplicates.items())[:3]
+            logger.warning(json.dumps(record))
+        else:
+            logger.debug(json.dumps(record))
+
+        if settings.DEBUG:
+            response['Server-Timing'] = (
+                f"db;dur={record['db_ms']};desc=\"{recorder.count} queries\", "
+                f"render;dur={record['render_ms']}, total;dur={record['total_ms']}"
+            )
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-Duplicate-Queries'] = str(sum(duplicates.values()) - len(duplicates))
+        return response
@@ -0,0 +1,71 @@
+"""
+URL includes that import their views on first use.
+
+Django imports every included URLconf when the root URLconf loads, and the
+first reverse() (any {% url %} on the first page) populates every resolver
+underneath it. For a namespaced include the root only needs to know the
+prefix, so `lazy_include` hands back a resolver that skips that step: its
+module is imported when a path under the prefix is resolved or one of its
+`namespace:` names is reversed. That keeps DRF (api/) and the admin out of a
+cold start that doesn't touch them.
+"""
+from django.urls import URLResolver
+from django.urls.resolvers import RegexPattern, RoutePattern
+from django.utils.translation import get_language
+
+
+class LazyURLResolver(URLResolver):
+    def _populate(self):
+        # Called by the parent resolver while it builds its own lookups. A
+        # namespaced resolver isn't part of those, so this waits until one of
+        # its own lookups below is needed.
+        pass
+
+    def _populate_now(self):
+        if get_language() not in self._reverse_dict:
+            super()._populate()
+
+    @property
+    def reverse_dict(self):
+        self._populate_now()
+        return self._reverse_dict[get_language()]
+
+    @property
+    def namespace_dict(self):
+        self._populate_now()
+        return self._namespace_dict[get_language()]
+
+    @property
+    def app_dict(self):
+        self._populate_now()
+        return self._app_dict[get_language()]
+
+
+class _LazyURLConf:
+    def __init__(self, load):
+        self._load = load
+
+    @property
+    def urlpatterns(self):
+        return self._load()
+
+
+def _pattern(route):
+    if route.startswith('^'):
+        return RegexPattern(route, is_endpoint=False)
+    return RoutePattern(route, is_endpoint=False)
+
+
+def lazy_include(route, urlconf, namespace):
+    """path()/re_path() + include() for a namespaced URLconf module, imported on first use."""
+    # A dotted path is only imported when the resolver first reads its patterns
+    return LazyURLResolver(_pattern(route), urlconf, app_name=namespace, namespace=namespace)
+
+
+def lazy_admin(route):
+    """The admin site, running admin autodiscovery on first use (see LEAN_STARTUP)."""
+    def load():
+        from django.contrib import admin
+        admin.autodiscover()
+        return admin.site.get_urls()
+    return LazyURLResolver(_pattern(route), _LazyURLConf(load), app_name='admin', namespace='admin')
@@ -0,0 +1,58 @@
+"""
+Run independent ORM queries concurrently from async views.
+
+Django's async ORM methods (`aget`, `acount`, ...) all hop onto the same
+thread-sensitive executor, so awaiting several of them together still runs
+them one after another. `gather_queries` instead hands each callable to a
+bounded thread pool; every pool thread keeps its own database connection, so a
+page's queries overlap and its DB time approaches the slowest query rather
+than the sum of round-trips. The pool size (settings.PARALLEL_QUERY_WORKERS)
+caps the extra connections each process opens; 0 runs queries in order.
+"""
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+
+@lru_cache(maxsize=None)
+def _pool(workers):
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='parallel-query')
+
+
+def _run(func):
+    # Same connection housekeeping as request_started/request_finished
+    close_old_connections()
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+
+def _in_transaction():
+    return connection.in_atomic_block
+
+
+async def gather_queries(**queries):
+    """
+    Evaluate `name=callable` pairs concurrently and return {name: result}.
+    Callables must fully evaluate their querysets (list(), count(), ...) so no
+    lazy query is left for the template to run.
+    """
+    workers = getattr(settings, 'PARALLEL_QUERY_WORKERS', 0)
+    if not workers or await sync_to_async(_in_transaction)():
+        # Pool threads have their own connections and can't see an open transaction
+        # (tests, atomic blocks), so run in order on the request's connection
+        return {name: await sync_to_async(func)() for name, func in queries.items()}
+    loop = asyncio.get_running_loop()
+    pool = _pool(workers)
+    # Copy the context per task so contextvars (e.g. replica pinning) follow the query
+    results = await asyncio.gather(*(
+        loop.run_in_executor(pool, contextvars.copy_context().run, _run, func)
+        for func in queries.values()
+    ))
+    return dict(zip(queries, results))
@@ -0,0 +1,152 @@
+"""
+EXPLAIN-based plan checks for the querysets on hot paths.
+
+Each entry in CRITICAL_QUERIES builds the same queryset a view runs, using
+sample rows from the current database. `check_plans()` EXPLAINs every entry
+and reports full table scans and sorts that an index should have avoided, so
+a dropped or mismatched index shows up as a failing test rather than as a
+slow page in production.
+"""
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Count
+
+from community.models import Channel, Message
+from courses.models import Course, Enrollment, UserQuizAttempt
+
+User = get_user_model()
+
+CRITICAL_QUERIES = {}
+
+# SQLite: "SCAN courses_course" without "USING [COVERING] INDEX" reads every row;
+# "USE TEMP B-TREE FOR ORDER BY" sorts the result instead of walking an index
+_SQLITE_SCAN = re.compile(r'\bSCAN (\w+)(?!\w| USING)')
+_SQLITE_SORT = re.compile(r'USE TEMP B-TREE FOR (?:LAST )?ORDER BY')
+_PG_SCAN = re.compile(r'Seq Scan on (\w+)')
+_PG_SORT = re.compile(r'^\s*(?:->\s*)?(?:Incremental )?Sort\b', re.MULTILINE)
+
+
+def critical_query(name):
+    """Register a function returning a queryset (or None when no sample data exists)."""
+    def decorator(func):
+        CRITICAL_QUERIES[name] = func
+        return func
+    return decorator
+
+
+def explain(queryset):
+    if connection.vendor == 'postgresql':
+        # On a small seeded dataset the planner rightly prefers a seq scan;
+        # disabling it shows whether a usable index exists at all
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
+    return queryset.explain()
+
+
+def plan_problems(plan, vendor=None):
+    vendor = vendor or connection.vendor
+    if vendor == 'sqlite':
+        problems = [f'full scan of {table}' for table in _SQLITE_SCAN.findall(plan)]
+        if _SQLITE_SORT.search(plan):
+            problems.append('sort (temp b-tree for ORDER BY)')
+    elif vendor == 'postgresql':
+        problems = [f'seq scan on {table}' for table in _PG_SCAN.findall(plan)]
+        if _PG_SORT.search(plan):
+            problems.append('sort node')
+    else:
+        raise NotImplementedError(f'No plan checks for {vendor}')
+    return problems
+
+
+def check_plans(names=None):
+    """{name: (plan, problems)} for the registered queries; entries without sample data are skipped."""
+    results = {}
+    for name, build in CRITICAL_QUERIES.items():
+        if names and name not in names:
+            continue
+        queryset = build()
+        if queryset is None:
+            continue
+        plan = explain(queryset)
+        results[name] = (plan, plan_problems(plan))
+    return results
+
+
+def _student():
+    return User.objects.filter(role='student').order_by('pk').first()
+
+
+@critical_query('dashboard.enrollments')
+def _dashboard_enrollments():
+    student = _student()
+    return student and (
+        Enrollment.objects.filter(student=student)
+        .select_related('course', 'course__instructor').order_by('-last_accessed')
+    )
+
+
+@critical_query('dashboard.suggested_courses')
+def _suggested_courses():
+    student = _student()
+    return student and (
+        Course.objects.exclude(id__in=Enrollment.objects.filter(student=student).values_list('course_id', flat=True))
+        .order_by('-created_at')[:3]
+    )
+
+
+@critical_query('admin_dashboard.recent_courses')
+def _recent_courses():
+    return Course.objects.select_related('instructor').order_by('-created_at')[:5]
+
+
+@critical_query('admin_dashboard.recent_users')
+def _recent_users():
+    return User.objects.order_by('-date_joined')[:10]
+
+
+@critical_query('users.by_role')
+def _users_by_role():
+    return User.objects.filter(role='instructor').order_by('-date_joined')[:50]
+
+
+@critical_query('courses.completed_enrollments')
+def _completed_enrollments():
+    course = Course.objects.order_by('pk').first()
+    return course and Enrollment.objects.filter(course=course, progress=100)
+
+
+@critical_query('courses.course_progress')
+def _course_progress():
+    course = Course.objects.order_by('pk').first()
+    return course and Enrollment.objects.filter(course=course).order_by('progress').values('progress').annotate(n=Count('id'))
+
+
+@critical_query('courses.quiz_attempts')
+def _quiz_attempts():
+    attempt = UserQuizAttempt.objects.order_by('pk').first()
+    return attempt and UserQuizAttempt.objects.filter(user_id=attempt.user_id, quiz_id=attempt.quiz_id).order_by('-timestamp')
+
+
+@critical_query('community.channel_messages')
+def _channel_messages():
+    channel = Channel.objects.order_by('pk').first()
+    return channel and channel.messages.all()
+
+
+@critical_query('community.retention_cutoff')
+def _retention_cutoff():
+    message = Message.objects.order_by('pk').first()
+    return message and Message.objects.filter(channel_id=message.channel_id, timestamp__lt=message.timestamp)
+
+
+@critical_query('community.history_page')
+def _history_page():
+    message = Message.objects.order_by('-pk').first()
+    return message and (
+        Message.objects.filter(channel_id=message.channel_id, id__lt=message.pk)
+        .select_related('author').order_by('-id')[:50]
+    )
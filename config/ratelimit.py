@@ -0,0 +1,141 @@
+import threading
+import time
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+
+from .cache import make_key
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'20/m' -> (20 tokens, refilled over 60 seconds)."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+class InProcessBackend:
+    """
+    Token buckets held in this process's memory. Cheap, but each worker
+    enforces its own limit; use CacheBackend with a shared cache to enforce
+    one limit across workers.
+
+    A missing bucket counts as full, so buckets that have refilled are
+    dropped every `sweep_interval` seconds, and past `max_buckets` the least
+    recently used go as well: memory stays bounded however many keys clients
+    make up.
+    """
+
+    def __init__(self, max_buckets=10000, sweep_interval=60):
+        self.max_buckets = max_buckets
+        self.sweep_interval = sweep_interval
+        # key -> (tokens, updated, full_at), least recently used first
+        self._buckets = {}
+        self._swept = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_per_second, cost=1, peek=False):
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(key, None)
+            tokens, updated = bucket[:2] if bucket else (capacity, now)
+            tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+            allowed = tokens >= cost
+            if not peek and allowed:
+                tokens -= cost
+                bucket = (tokens, now, now + (capacity - tokens) / refill_per_second)
+            if bucket is not None:
+                self._buckets[key] = bucket
+            self._evict(now)
+        return allowed, 0 if allowed else (cost - tokens) / refill_per_second
+
+    def _evict(self, now):
+        if now - self._swept >= self.sweep_interval:
+            self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+            self._swept = now
+        while len(self._buckets) > self.max_buckets:
+            del self._buckets[next(iter(self._buckets))]
+
+
+class CacheBackend:
+    """
+    Token buckets stored in the default cache, shared by every worker using it.
+    Read-modify-write is not atomic, so concurrent bursts may slip a few extra
+    requests through; good enough for flood protection.
+    """
+
+    def consume(self, key, capacity, refill_per_second, cost=1, peek=False):
+        now = time.time()
+        cache_key = make_key('ratelimit', key)
+        tokens, updated = cache.get(cache_key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+        allowed = tokens >= cost
+        if peek:
+            return allowed, 0 if allowed else (cost - tokens) / refill_per_second
+        if allowed:
+            tokens -= cost
+        # Expire once the bucket would have refilled anyway
+        cache.set(cache_key, (tokens, now), int(capacity / refill_per_second) + 1)
+        return allowed, 0 if allowed else (cost - tokens) / refill_per_second
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(getattr(settings, 'RATE_LIMIT_BACKEND', 'config.ratelimit.InProcessBackend'))()
+
+
+def check_rate(scope, ident):
+    """
+    Take one token from the `scope` bucket of `ident`.
+    Returns (allowed, retry_after_seconds). Rates come from settings.RATE_LIMITS.
+    """
+    return check_rates((scope, ident))
+
+
+def check_rates(*limits):
+    """
+    Take one token from each `(scope, ident)` bucket, or from none of them if
+    any is empty, so a request turned away by one limit doesn't use up the
+    others. Returns (allowed, retry_after_seconds).
+    """
+    backend = get_backend()
+    buckets = []
+    for scope, ident in limits:
+        capacity, period = parse_rate(settings.RATE_LIMITS[scope])
+        buckets.append((f'{scope}:{ident}', capacity, capacity / period))
+    if len(buckets) > 1:
+        waits = [backend.consume(*bucket, peek=True) for bucket in buckets]
+        if not all(allowed for allowed, _ in waits):
+            return False, max(retry_after for _, retry_after in waits)
+    results = [backend.consume(*bucket) for bucket in buckets]
+    return all(allowed for allowed, _ in results), max(retry_after for _, retry_after in results)
+
+
+def too_many_requests(retry_after):
+    response = JsonResponse({'error': 'Too many requests, slow down.'}, status=429)
+    response['Retry-After'] = str(int(retry_after) + 1)
+    return response
+
+
+def rate_limit(*limits):
+    """
+    Reject a JSON view with 429 once any of its `(scope, key)` limits is
+    exceeded, where `key(request, **kwargs)` picks the bucket:
+
+        @rate_limit(('activity_track', lambda request: request.user.pk))
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            allowed, retry_after = check_rates(*(
+                (scope, key(request, *args, **kwargs)) for scope, key in limits
+            ))
+            if not allowed:
+                return too_many_requests(retry_after)
+            return view_func(request, *args, **kwargs)
+        return wrapped
+    return decorator
@@ -1,12 +1,25 @@
 from pathlib import Path
 import os
 import dj_database_url
-from dotenv import load_dotenv
-
-load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Deployed environments get their variables from the platform; only pay for
+# python-dotenv when there is a .env file to read
+if (BASE_DIR / '.env').exists():
+    from dotenv import load_dotenv
+    load_dotenv(BASE_DIR / '.env')
+
+# Lean startup (on by default on Vercel, where every cold start is on a
+# request's critical path): Cloudinary, DRF and the admin's registrations are
+# left out of app loading and the first render, so they're imported on first
+# use (media storage, /api/, /admin/) instead. In this mode the API speaks
+# JSON only (no browsable API or api-auth/ login) and Cloudinary's management
+# commands are unavailable. Profile with `python manage.py profile_startup`.
+LEAN_STARTUP = os.environ.get('LEAN_STARTUP', 'True' if os.environ.get('VERCEL') else 'False') == 'True'
+# Cold-start budget for django.setup() plus the first request, in milliseconds
+STARTUP_BUDGET_MS = int(os.environ.get('STARTUP_BUDGET_MS', 1500))
+
 SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-dev-key-change-in-prod')
 
 DEBUG = os.environ.get('DEBUG', 'True') == 'True'
@@ -14,27 +27,34 @@ DEBUG = os.environ.get('DEBUG', 'True') == 'True'
 ALLOWED_HOSTS = ['*', '.vercel.app', '.onrender.com']
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # SimpleAdminConfig skips autodiscovery; config/lazy_urls.py runs it on first use
+    'django.contrib.admin.apps.SimpleAdminConfig' if LEAN_STARTUP else 'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
     # Third party
-    'rest_framework',
+    'rest_framework.authtoken',
     # Local apps
+    'api',
     'dashboard',
     'courses',
     'users',
     'community',
+    'jobs',
+    'activity',
     'theme',
-    'cloudinary_storage',
-    'cloudinary',
 ]
+if not LEAN_STARTUP:
+    # Their template tags are loaded with the template engine on the first render
+    INSTALLED_APPS += ['rest_framework', 'cloudinary_storage', 'cloudinary']
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'config.db_router.ReplicaPinningMiddleware',
+    'config.instrumentation.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -55,6 +75,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                # Keep last: marks the start of rendering for the instrumentation middleware
+                'config.instrumentation.render_timer',
             ],
         },
     },
@@ -69,6 +91,63 @@ DATABASES = {
     )
 }
 
+# Read replicas: DATABASE_REPLICA_URLS is a comma-separated list of database
+# URLs, added as replica_0, replica_1, ... See config/db_router.py. Locally a
+# copy of db.sqlite3 (sqlite:///db-replica.sqlite3) stands in for a replica.
+DATABASE_REPLICAS = []
+for i, url in enumerate(u.strip() for u in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if u.strip()):
+    DATABASES[f'replica_{i}'] = dj_database_url.parse(url, conn_max_age=600)
+    DATABASES[f'replica_{i}']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(f'replica_{i}')
+DATABASE_ROUTERS = ['config.db_router.ReplicaRouter']
+# After a write, keep the user's reads on the primary for this long
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+# Skip replicas further behind than this (seconds); lag is re-checked every interval
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 2))
+REPLICA_LAG_CHECK_INTERVAL = 5
+
+# Cache: CACHE_BACKEND picks locmem (dev), file or db (single host), or redis
+# (shared; used automatically when REDIS_URL is set). See config/cache.py for
+# the namespaced key helpers and cached_query.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'redis' if os.environ.get('REDIS_URL') else 'locmem')
+if CACHE_BACKEND == 'redis':
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0'),
+    }}
+elif CACHE_BACKEND == 'file':
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', str(BASE_DIR / '.cache')),
+    }}
+elif CACHE_BACKEND == 'db':
+    # Needs `python manage.py createcachetable` (run by build.sh)
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    }}
+else:
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }}
+CACHES['default']['KEY_PREFIX'] = os.environ.get('CACHE_KEY_PREFIX', 'samlms')
+
+# Conditional GET / HTTP caching for catalog and lesson pages (config/conditional.py).
+# VERSION goes into every ETag so a deploy with new templates invalidates them.
+PAGE_CACHE = {
+    'VERSION': os.environ.get('PAGE_CACHE_VERSION', os.environ.get('VERCEL_GIT_COMMIT_SHA', '')),
+    'MAX_AGE': 60,
+    'S_MAXAGE': 300,
+}
+
+# Bump a namespace's version to retire all of its keys on the next deploy
+CACHE_KEY_VERSIONS = {
+    'community': 1,
+    # Cached archive partitions are pickled Message objects: bump when the model changes
+    'archive': 1,
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -111,6 +190,40 @@ STORAGES = {
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedStaticFilesStorage",
     },
+    # Cold storage for archived community messages (see community/archive.py)
+    "community_archive": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {
+            "location": os.environ.get('COMMUNITY_ARCHIVE_DIR', str(BASE_DIR / 'archive')),
+        },
+    },
+    # Files produced by background jobs, e.g. CSV exports (see jobs/queue.py). Vercel's
+    # filesystem is read-only and per instance, so there they go to Cloudinary
+    "job_files": {
+        "BACKEND": "cloudinary_storage.storage.RawMediaCloudinaryStorage",
+    } if os.environ.get('VERCEL') and not os.environ.get('JOB_FILES_DIR') else {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {
+            "location": os.environ.get('JOB_FILES_DIR', str(BASE_DIR / 'job_files')),
+        },
+    },
+    # Closed days of activity events, one gzip JSONL file each (see activity/partitions.py)
+    "activity_archive": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {
+            "location": os.environ.get('ACTIVITY_ARCHIVE_DIR', str(BASE_DIR / 'activity_archive')),
+        },
+    },
+    # Course slide decks, one PPTX file per course (see courses/slides.py). Decks
+    # are written on demand by the slides view, so on Vercel they go to Cloudinary too
+    "slide_decks": {
+        "BACKEND": "cloudinary_storage.storage.RawMediaCloudinaryStorage",
+    } if os.environ.get('VERCEL') and not os.environ.get('SLIDE_DECKS_DIR') else {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {
+            "location": os.environ.get('SLIDE_DECKS_DIR', str(BASE_DIR / 'slide_decks')),
+        },
+    },
 }
 
 LOGGING = {
@@ -131,9 +244,104 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'config.instrumentation': {
+            'handlers': ['console'],
+            'level': os.environ.get('QUERY_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
     },
 }
 
+# Max queries per view (by URL name). Over-budget requests are logged as
+# warnings by QueryInstrumentationMiddleware and fail QueryBudgetMixin tests.
+QUERY_BUDGETS = {
+    # Includes building the facet index (courses/facets.py) on a cold cache
+    'course_list': 6,
+    'course_detail': 6,
+    'lesson_detail': 6,
+    'dashboard': 12,
+}
+
 AUTH_USER_MODEL = 'users.User'
 
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Community chat push: in-process fan-out by default. Point this at a shared
+# pub/sub backend when running more than one ASGI worker.
+COMMUNITY_BROADCAST_BACKEND = os.environ.get('COMMUNITY_BROADCAST_BACKEND', 'community.broadcast.InProcessBroadcaster')
+
+# Group bursts of chat messages into bulk inserts (see community/write_buffer.py)
+COMMUNITY_WRITE_BUFFER = {
+    'ENABLED': os.environ.get('COMMUNITY_WRITE_BUFFER', 'False') == 'True',
+    'MAX_BATCH': 100,
+    'MAX_DELAY': 0.05,
+    # Seconds a send waits for its row before answering 202 (the write still lands)
+    'TIMEOUT': 5,
+}
+
+# Lesson views buffer Enrollment.last_accessed and write it in one bulk_update
+# every FLUSH_INTERVAL seconds, skipping rows already on top of the user's
+# dashboard and touched less than THRESHOLD seconds ago (courses/access.py).
+ACCESS_TRACKING = {
+    'ENABLED': os.environ.get('ACCESS_TRACKING_BUFFER', 'True') == 'True',
+    'FLUSH_INTERVAL': 10,
+    'THRESHOLD': 60,
+}
+
+# Learning-activity events (activity/ingest.py). Views drop events into a
+# bounded queue that a background thread writes with bulk_create; when the
+# queue is full, events wait up to BLOCK_TIMEOUT seconds and are then dropped
+# and counted. Off by default: serverless platforms freeze threads between requests.
+ACTIVITY = {
+    'ENABLED': os.environ.get('ACTIVITY_LOG', 'False') == 'True',
+    'BUFFER_SIZE': 10000,
+    'MAX_BATCH': 500,
+    'MAX_DELAY': 1.0,
+    'BLOCK_TIMEOUT': 0.0,
+}
+
+# Thread pool for running a page's independent queries concurrently from async
+# views (config/parallel.py). Each worker holds its own DB connection; 0 disables.
+PARALLEL_QUERY_WORKERS = int(os.environ.get('PARALLEL_QUERY_WORKERS', 4))
+
+# A .pptx whose slide masters and layouts exported course decks start from
+# (courses/slides.py); empty uses python-pptx's default template.
+SLIDE_DECK_TEMPLATE = os.environ.get('SLIDE_DECK_TEMPLATE') or None
+
+# Public REST API, versioned in the URL (/api/v1/...)
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.TokenAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticatedOrReadOnly'],
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.CursorPagination',
+    'PAGE_SIZE': 20,
+    'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.URLPathVersioning',
+    'ALLOWED_VERSIONS': ['v1'],
+    'DEFAULT_VERSION': 'v1',
+}
+if LEAN_STARTUP:
+    # The browsable API needs the rest_framework app's templates
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = ['rest_framework.renderers.JSONRenderer']
+
+# Background jobs (jobs/queue.py), run by `python manage.py run_worker`.
+# EAGER runs each job in-process right after enqueueing, for setups without a worker.
+JOBS = {
+    # On by default on Vercel, which has no worker process
+    'EAGER': os.environ.get('JOBS_EAGER', 'True' if os.environ.get('VERCEL') else 'False') == 'True',
+    'POLL_INTERVAL': 1.0,
+    # Requeue jobs still 'running' after this long: their worker has died
+    'STALE_AFTER': 600,
+}
+
+# Token-bucket rate limits (see config/ratelimit.py). InProcessBackend limits
+# each worker separately; CacheBackend shares buckets through the default cache.
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'config.ratelimit.InProcessBackend')
+RATE_LIMITS = {
+    'chat_user': '20/m',
+    'chat_channel': '300/m',
+    'activity_track': '60/m',
+}
+
 # Trigger reload for DB connection
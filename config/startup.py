@@ -0,0 +1,113 @@
+"""
+Cold-start measurement.
+
+`measure_startup()` starts a fresh interpreter (`python -X importtime -m
+config.startup`), which times the phases of a serverless cold start the way
+config/wsgi.py goes through them: settings import, app loading (with each
+AppConfig.ready()), building the WSGI handler and serving one request. The
+child reports the phases as JSON on stdout; -X importtime reports every
+import on stderr, which is parsed into per-module self and cumulative times.
+"""
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def measure_startup(path='/', lean=None, importtime=True):
+    """
+    Returns {'phases': {name: ms}, 'ready': {app_label: ms}, 'status': ...,
+    'imports': [(module, self_ms, cumulative_ms), ...]}. `lean` overrides
+    LEAN_STARTUP for the child.
+    """
+    import subprocess
+
+    env = dict(os.environ)
+    if lean is not None:
+        env['LEAN_STARTUP'] = 'True' if lean else 'False'
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-m', 'config.startup', path]
+    child = subprocess.run(command, cwd=BASE_DIR, env=env, capture_output=True, text=True)
+    if child.returncode != 0:
+        raise RuntimeError(f'Startup probe failed:\n{child.stderr[-2000:]}')
+    report = json.loads(child.stdout.strip().splitlines()[-1])
+    report['imports'] = parse_importtime(child.stderr)
+    return report
+
+
+def parse_importtime(output):
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        imports.append((name, int(self_us) / 1000, int(cumulative_us) / 1000))
+    return imports
+
+
+def _serve(application, path):
+    status = []
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+    }
+    body = application(environ, lambda code, headers: status.append(code))
+    try:
+        b''.join(body)
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+    return status[0]
+
+
+def main(path):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    phases, ready = {}, {}
+    start = mark = time.perf_counter()
+
+    def lap(name):
+        nonlocal mark
+        now = time.perf_counter()
+        phases[name] = round((now - mark) * 1000, 1)
+        mark = now
+
+    import django
+    from django.apps import AppConfig
+    from django.conf import settings
+
+    settings.INSTALLED_APPS
+    lap('settings')
+
+    create = AppConfig.create.__func__
+
+    def timed_create(cls, entry):
+        config = create(cls, entry)
+        original = config.ready
+
+        def timed_ready():
+            began = time.perf_counter()
+            original()
+            ready[config.label] = round((time.perf_counter() - began) * 1000, 1)
+        config.ready = timed_ready
+        return config
+
+    AppConfig.create = classmethod(timed_create)
+    django.setup(set_prefix=False)
+    lap('setup')
+
+    from django.core.handlers.wsgi import WSGIHandler
+    application = WSGIHandler()
+    lap('handler')
+
+    status = _serve(application, path)
+    lap('first_request')
+    phases['total'] = round((time.perf_counter() - start) * 1000, 1)
+    print(json.dumps({'phases': phases, 'ready': ready, 'status': status}))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else '/')
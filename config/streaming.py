@@ -0,0 +1,33 @@
+"""
+Streaming responses under ASGI.
+
+Given a synchronous iterator, ASGI's StreamingHttpResponse runs it to the
+end through sync_to_async(list) before sending a byte, which buffers a
+whole export in memory. `async_chunks` wraps it in an async generator that
+pulls one chunk at a time on the request's sync thread instead, so a
+streamed export stays streamed whichever server runs it. Thread-sensitive
+calls all land on the same thread, so a generator holding a database
+cursor keeps using its own connection.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+_DONE = object()
+
+
+async def async_chunks(chunks):
+    chunks = iter(chunks)
+    step = sync_to_async(next)
+    try:
+        while (chunk := await step(chunks, _DONE)) is not _DONE:
+            yield chunk
+    finally:
+        # A client that disconnects closes us; let the generator clean up its cursor
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            await sync_to_async(close)()
+
+
+def streaming_content(request, chunks):
+    """`chunks` as StreamingHttpResponse content for the server `request` came in on."""
+    return async_chunks(chunks) if isinstance(request, ASGIRequest) else chunks
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+from .instrumentation import fingerprint
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin asserting that a view stays within its query budget.
+    Budgets default to settings.QUERY_BUDGETS, the same table the
+    instrumentation middleware warns against in production.
+    """
+
+    def assertQueryBudget(self, url, budget=None, method='get', client=None, data=None, **extra):
+        client = client or self.client
+        if budget is None:
+            view_name = resolve(url.split('?')[0]).view_name
+            budget = settings.QUERY_BUDGETS[view_name]
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(client, method)(url, data, **extra)
+        if len(ctx) > budget:
+            counts = {}
+            for query in ctx.captured_queries:
+                key = fingerprint(query['sql'])
+                counts[key] = counts.get(key, 0) + 1
+            repeated = '\n'.join(f'  {n}x {sql[:200]}' for sql, n in sorted(counts.items(), key=lambda i: -i[1]) if n > 1)
+            self.fail(f'{url} ran {len(ctx)} queries, budget is {budget}.\nRepeated statements:\n{repeated or "  (none)"}')
+        return response
@@ -1,14 +1,20 @@
-from django.contrib import admin
 from django.urls import path, include
 from theme.views import home
 from django.conf import settings
 from django.conf.urls.static import static
+from config.lazy_urls import lazy_admin, lazy_include
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    # Namespaced and loaded on first use, so a cold start doesn't import the admin or DRF
+    lazy_admin('admin/'),
     path('', home, name='home'),
-    path('api-auth/', include('rest_framework.urls')),
+    lazy_include(r'^api/(?P<version>v1)/', 'api.urls', namespace='api'),
     path('users/', include('users.urls')),
     path('dashboard/', include('dashboard.urls')),
     path('courses/', include('courses.urls')),
+    path('jobs/', include('jobs.urls')),
+    path('activity/', include('activity.urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+if not settings.LEAN_STARTUP:
+    urlpatterns.append(path('api-auth/', include('rest_framework.urls')))
@@ -0,0 +1,156 @@
+"""
+Coalesced Enrollment.last_accessed updates.
+
+Lesson views record "user X touched course Y at T" instead of saving the
+enrollment. Touches are kept per worker, latest per (user, course), and
+written by the request that finds the buffer older than FLUSH_INTERVAL: one
+SELECT of the users' enrollments and one bulk_update. Like the cache stats
+counters this needs no background thread, so it also works where the
+process is frozen between requests.
+
+A write is skipped when the enrollment is already the user's most recently
+accessed one and its stored value is younger than THRESHOLD: rewriting it
+wouldn't change the dashboard order. Pending touches go to the cache too
+(one small map per user), and the dashboard overlays them on what it read,
+so its order is right before the flush lands, whichever worker buffered them.
+"""
+import atexit
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from activity.ingest import record_event
+from activity.models import ActivityEvent
+from config.cache import cache_get, cache_set
+from .models import Enrollment
+
+# The overlay only ever moves last_accessed forward, so it can outlive the
+# flush; this just bounds how long an idle worker's touches stay covered
+OVERLAY_TIMEOUT = 3600
+
+
+class AccessBuffer:
+    def __init__(self, flush_interval, threshold):
+        self.flush_interval = flush_interval
+        self.threshold = timedelta(seconds=threshold)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flushed_at = time.monotonic()
+
+    def record(self, user_id, course_id, when):
+        with self._lock:
+            key = (user_id, course_id)
+            if key not in self._pending or self._pending[key] < when:
+                self._pending[key] = when
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        with self._lock:
+            if time.monotonic() - self._flushed_at < self.flush_interval:
+                return 0
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+        return self._write(pending)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+        return self._write(pending)
+
+    def _write(self, pending):
+        """Returns the number of enrollments updated."""
+        if not pending:
+            return 0
+        enrollments = {}
+        latest = {}
+        for enrollment in Enrollment.objects.filter(student__in={user_id for user_id, _ in pending}).only(
+            'id', 'student_id', 'course_id', 'last_accessed',
+        ):
+            enrollments[(enrollment.student_id, enrollment.course_id)] = enrollment
+            if enrollment.student_id not in latest or enrollment.last_accessed > latest[enrollment.student_id]:
+                latest[enrollment.student_id] = enrollment.last_accessed
+
+        changed = []
+        # Oldest first, so each write is compared with the user's order as it stands after the previous ones
+        for (user_id, course_id), when in sorted(pending.items(), key=lambda item: item[1]):
+            enrollment = enrollments.get((user_id, course_id))
+            if enrollment is None or enrollment.last_accessed >= when:
+                continue
+            if enrollment.last_accessed == latest[user_id] and when - enrollment.last_accessed < self.threshold:
+                continue
+            enrollment.last_accessed = latest[user_id] = when
+            changed.append(enrollment)
+        Enrollment.objects.bulk_update(changed, ['last_accessed'], batch_size=500)
+        return len(changed)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_access_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            options = settings.ACCESS_TRACKING
+            _buffer = AccessBuffer(options['FLUSH_INTERVAL'], options['THRESHOLD'])
+            atexit.register(flush_on_exit)
+    return _buffer
+
+
+def flush_on_exit():
+    try:
+        close_old_connections()
+        _buffer.flush()
+    except Exception:
+        # Best effort; a lost last_accessed only nudges the dashboard order
+        pass
+
+
+def record_access(user_id, course_id, when=None):
+    when = when or timezone.now()
+    if not settings.ACCESS_TRACKING['ENABLED']:
+        Enrollment.objects.filter(student_id=user_id, course_id=course_id).update(last_accessed=when)
+        return
+    recent = cache_get('access', user_id) or {}
+    recent[course_id] = when.timestamp()
+    cache_set('access', user_id, value=recent, timeout=OVERLAY_TIMEOUT)
+    get_access_buffer().record(user_id, course_id, when)
+
+
+def apply_pending_access(user_id, enrollments):
+    """
+    Overlay touches not yet flushed on the user's enrollments and return
+    them re-sorted by last_accessed, newest first.
+    """
+    if settings.ACCESS_TRACKING['ENABLED']:
+        get_access_buffer().flush_if_due()
+    recent = cache_get('access', user_id) or {}
+    for enrollment in enrollments:
+        when = recent.get(enrollment.course_id)
+        if when is not None:
+            when = datetime.fromtimestamp(when, tz=dt_timezone.utc)
+            if when > enrollment.last_accessed:
+                enrollment.last_accessed = when
+    return sorted(enrollments, key=lambda enrollment: enrollment.last_accessed, reverse=True)
+
+
+def tracks_access(view_func):
+    """
+    Record a touch of the course (and a lesson_opened event) for signed-in
+    users who got the page, or a 304 for it.
+    """
+    @wraps(view_func)
+    def wrapped(request, *args, **kwargs):
+        response = view_func(request, *args, **kwargs)
+        if response.status_code in (200, 304) and request.user.is_authenticated:
+            record_access(request.user.pk, kwargs['course_pk'])
+            record_event(request.user.pk, ActivityEvent.LESSON_OPENED, course_id=kwargs['course_pk'], object_id=kwargs.get('lesson_pk'))
+        return response
+    return wrapped
@@ -0,0 +1,103 @@
+"""
+Question banks: a different sample of a quiz's questions for every attempt.
+
+A quiz with `questions_per_attempt` set is a bank. Its question ids are read
+once, grouped by stratum (tag or difficulty, or a single group) and cached
+as sorted integer arrays, so drawing a sample never touches the Question
+table: each stratum gets a share of the draw in proportion to its size and
+random.sample() picks that many ids from its array, which costs O(N) in the
+sample size however large the bank is. The sample is shuffled, kept for the
+attempt and graded against, so a learner can't resubmit a friendlier set.
+
+API clients, which have no session to keep the draw in, get it back as a
+signed token (`make_sample_token`) and hand it in with their answers.
+
+The cached arrays are dropped whenever a question is saved or deleted
+(courses/signals.py); bulk_create() sends no signals, so importers call
+`invalidate_bank()` themselves.
+"""
+import random
+from array import array
+
+from django.core import signing
+
+from config.cache import cache_delete, cache_get, cache_set
+
+from .models import Question
+
+# Saves and deletes invalidate the arrays, so this only bounds stale memory
+BANK_TIMEOUT = 24 * 3600
+
+TOKEN_SALT = 'courses.banks'
+# How long a drawn sample can be answered for, in seconds
+SAMPLE_MAX_AGE = 24 * 3600
+
+
+def invalidate_bank(quiz_id):
+    for stratify_by in ('', 'tag', 'difficulty'):
+        cache_delete('quizbank', quiz_id, stratify_by)
+
+
+def bank_strata(quiz):
+    """{stratum: array of question ids}, sorted by id, from the cache when possible."""
+    strata = cache_get('quizbank', quiz.pk, quiz.stratify_by)
+    if strata is None:
+        strata = {}
+        rows = Question.objects.filter(quiz=quiz).order_by('id')
+        if quiz.stratify_by:
+            rows = rows.values_list('id', quiz.stratify_by)
+        else:
+            rows = ((question_id, '') for question_id in rows.values_list('id', flat=True))
+        for question_id, stratum in rows:
+            strata.setdefault(stratum, array('q')).append(question_id)
+        cache_set('quizbank', quiz.pk, quiz.stratify_by, value=strata, timeout=BANK_TIMEOUT)
+    return strata
+
+
+def allocate(sizes, n):
+    """
+    Split a draw of `n` over strata of the given sizes ({stratum: size}) in
+    proportion to their size, handing out the rounding remainder largest
+    fraction first. Returns {stratum: count}.
+    """
+    total = sum(sizes.values())
+    n = min(n, total)
+    if not n:
+        return dict.fromkeys(sizes, 0)
+    shares = {stratum: n * size / total for stratum, size in sizes.items()}
+    counts = {stratum: int(share) for stratum, share in shares.items()}
+    leftover = n - sum(counts.values())
+    for stratum in sorted(shares, key=lambda s: shares[s] - counts[s], reverse=True)[:leftover]:
+        counts[stratum] += 1
+    return counts
+
+
+def sample_questions(quiz, rng=random):
+    """The question ids to ask in a new attempt at `quiz`, in the order to ask them."""
+    if not quiz.questions_per_attempt:
+        return list(Question.objects.filter(quiz=quiz).order_by('id').values_list('id', flat=True))
+    strata = bank_strata(quiz)
+    counts = allocate({stratum: len(ids) for stratum, ids in strata.items()}, quiz.questions_per_attempt)
+    sample = []
+    for stratum, ids in strata.items():
+        sample.extend(rng.sample(ids, counts[stratum]))
+    rng.shuffle(sample)
+    return sample
+
+
+def questions_in_order(quiz, question_ids):
+    """The sampled questions of `quiz`, in sample order. Ids no longer in the quiz are skipped."""
+    questions = Question.objects.filter(quiz=quiz).in_bulk(question_ids)
+    return [questions[question_id] for question_id in question_ids if question_id in questions]
+
+
+def make_sample_token(user, quiz, question_ids):
+    return signing.dumps([user.pk, quiz.pk, question_ids], salt=TOKEN_SALT, compress=True)
+
+
+def read_sample_token(token, user, quiz):
+    """The question ids drawn for this user and quiz. Raises signing.BadSignature."""
+    user_id, quiz_id, question_ids = signing.loads(token, salt=TOKEN_SALT, max_age=SAMPLE_MAX_AGE)
+    if (user_id, quiz_id) != (user.pk, quiz.pk):
+        raise signing.BadSignature('Sample was drawn for another quiz or user.')
+    return question_ids
@@ -0,0 +1,295 @@
+"""
+Facet index for the course catalog.
+
+Every facet value (a category, free/paid, an instructor, a length bucket, a
+tag) maps to the ids of the courses that have it, as one of:
+
+- a bitset held in a Python int (bit n set for course n), for values that
+  many courses share, or
+- a sorted array of ids, for rare ones such as most instructors, where a
+  bitset would be mostly zeros: it keeps the cached index small, and a read
+  has to unpickle all of it.
+
+The whole index lives in the cache, so filtering a request is integer
+arithmetic: values of one facet are OR-ed (Development or Data Science),
+facets are AND-ed (and free, and short), and each value's count is its
+overlap with the other facets' selections, i.e. how many results picking it
+would give.
+
+The index is built with two queries on a cold cache. After that, saving,
+deleting or re-tagging a course (or changing its outline) updates only that
+course's ids (courses/signals.py).
+
+Every change first bumps a generation counter in the cache, and the index
+records the generation it reflects; a read only trusts an index whose
+generation is current. A change patches the cached index in place when it
+holds the lock and the index was current just before its own bump. When two
+changes collide, or one lands while a cold index is being built (also under
+the lock), the stored index simply falls behind the counter and is rebuilt
+on the next read, so no update is ever lost.
+"""
+from array import array
+from bisect import bisect_left, insort
+from itertools import compress
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from config.cache import cache_delete, cache_set, make_key, stats
+
+from .models import Course
+
+FACETS = [
+    ('category', 'Category'),
+    ('price', 'Price'),
+    ('length', 'Length'),
+    ('instructor', 'Instructor'),
+    ('tag', 'Tag'),
+]
+
+# (value, label, most lessons); the last bucket is open-ended
+LENGTHS = [
+    ('short', 'Under 10 lessons', 9),
+    ('medium', '10 to 30 lessons', 30),
+    ('long', 'Over 30 lessons', None),
+]
+LENGTH_LABELS = {value: label for value, label, _ in LENGTHS}
+
+# An id array takes 64 bits per course, a bitset one bit per possible id
+SPARSE_RATIO = 64
+
+LOCK_TIMEOUT = 10
+
+_DIGITS = bytes.maketrans(b'01', b'\x00\x01')
+
+
+def length_bucket(lessons):
+    for value, _, most in LENGTHS:
+        if most is None or lessons <= most:
+            return value
+
+
+def _course_rows(course_ids=None):
+    """{course id: {facet: [(value, label)]}} with one query for the courses and one for their tags."""
+    courses = Course.objects.annotate(lessons=Count('modules__lessons'))
+    tags = Course.tags.through.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+        tags = tags.filter(course_id__in=course_ids)
+    rows = {}
+    for course_id, category, price, instructor_id, username, lessons in courses.values_list(
+        'id', 'category', 'price', 'instructor_id', 'instructor__username', 'lessons',
+    ):
+        rows[course_id] = {
+            'category': [(category, category)] if category else [],
+            'price': [('paid', 'Paid') if price > 0 else ('free', 'Free')],
+            'length': [(length_bucket(lessons), LENGTH_LABELS[length_bucket(lessons)])],
+            'instructor': [(str(instructor_id), username)],
+            'tag': [],
+        }
+    for course_id, slug, name in tags.values_list('course_id', 'tag__slug', 'tag__name'):
+        if course_id in rows:
+            rows[course_id]['tag'].append((slug, name))
+    return rows
+
+
+def _to_bits(ids):
+    if isinstance(ids, int):
+        return ids
+    if not ids:
+        return 0
+    buffer = bytearray(ids[-1] // 8 + 1)
+    for course_id in ids:
+        buffer[course_id >> 3] |= 1 << (course_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def _compact(ids, width):
+    """The smaller of the two representations for a sorted array of course ids."""
+    if len(ids) * SPARSE_RATIO < width:
+        return ids
+    return _to_bits(ids)
+
+
+def _add(index, course_id, values):
+    index['all'] |= 1 << course_id
+    for facet, pairs in values.items():
+        postings = index['bits'][facet]
+        for value, label in pairs:
+            ids = postings.get(value, array('q'))
+            if isinstance(ids, int):
+                postings[value] = ids | 1 << course_id
+            else:
+                insort(ids, course_id)
+                postings[value] = _compact(ids, index['all'].bit_length())
+            index['labels'][facet][value] = label
+
+
+def _remove(index, course_id):
+    bit = 1 << course_id
+    index['all'] &= ~bit
+    for facet, postings in index['bits'].items():
+        for value, ids in list(postings.items()):
+            if isinstance(ids, int):
+                ids &= ~bit
+            else:
+                position = bisect_left(ids, course_id)
+                if position < len(ids) and ids[position] == course_id:
+                    del ids[position]
+            if ids:
+                postings[value] = ids
+            else:
+                del postings[value]
+                del index['labels'][facet][value]
+
+
+def build_index():
+    rows = _course_rows()
+    index = {
+        'all': _to_bits(sorted(rows)),
+        'bits': {facet: {} for facet, _ in FACETS},
+        'labels': {facet: {} for facet, _ in FACETS},
+    }
+    collected = {facet: {} for facet, _ in FACETS}
+    for course_id in sorted(rows):
+        for facet, pairs in rows[course_id].items():
+            for value, label in pairs:
+                collected[facet].setdefault(value, array('q')).append(course_id)
+                index['labels'][facet][value] = label
+    width = index['all'].bit_length()
+    for facet, postings in collected.items():
+        for value, ids in postings.items():
+            index['bits'][facet][value] = _compact(ids, width)
+    return index
+
+
+def _bump_generation():
+    """Mark every stored index stale. Returns the new generation, or None if the counter was lost."""
+    key = make_key('facets', 'generation')
+    cache.add(key, 0, None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr: restarting the count could match an old index
+        cache_delete('facets', 'index')
+        return None
+
+
+def invalidate():
+    """Have the next read rebuild the index, e.g. when a tag is renamed."""
+    _bump_generation()
+
+
+def get_index():
+    index_key, generation_key = make_key('facets', 'index'), make_key('facets', 'generation')
+    found = cache.get_many([index_key, generation_key])
+    generation = found.get(generation_key, 0)
+    index = found.get(index_key)
+    if index is not None and index['generation'] == generation:
+        stats.record('facets', 'hits')
+        return index
+    stats.record('facets', 'misses')
+
+    lock = make_key('facets', 'lock')
+    if not cache.add(lock, 1, LOCK_TIMEOUT):
+        # A change or another build is in progress: answer from the database, store nothing
+        return build_index()
+    try:
+        # Read before the rows, so a change made during the build leaves this index behind
+        generation = cache.get(generation_key, 0)
+        index = build_index()
+        index['generation'] = generation
+        cache_set('facets', 'index', value=index, timeout=None)
+    finally:
+        cache.delete(lock)
+    return index
+
+
+def update_course(course_id):
+    """Bring one course's bits up to date, or leave the index to be rebuilt if that isn't safe."""
+    generation = _bump_generation()
+    lock = make_key('facets', 'lock')
+    if not cache.add(lock, 1, LOCK_TIMEOUT):
+        # The bump already retired the stored index
+        return
+    try:
+        index = cache.get(make_key('facets', 'index'))
+        if index is None or generation is None or index['generation'] != generation - 1:
+            # Nothing current to keep current; the next read builds it
+            return
+        _remove(index, course_id)
+        values = _course_rows([course_id]).get(course_id)
+        if values is not None:
+            _add(index, course_id, values)
+        index['generation'] = generation
+        cache_set('facets', 'index', value=index, timeout=None)
+    finally:
+        cache.delete(lock)
+
+
+def parse_selection(params):
+    """{facet: set of values} from a QueryDict like ?category=Development&price=free."""
+    selected = {}
+    for facet, _ in FACETS:
+        values = {value for value in params.getlist(facet) if value}
+        if values:
+            selected[facet] = values
+    return selected
+
+
+def _union(postings, values):
+    mask = 0
+    for value in values:
+        mask |= _to_bits(postings.get(value, 0))
+    return mask
+
+
+def _count(ids, base, flags):
+    if isinstance(ids, int):
+        return (ids & base).bit_count()
+    if flags is None:
+        # Nothing selected in the other facets
+        return len(ids)
+    # flags[n] is b'1' when course n is in `base`: a C-level lookup per id
+    return sum(map(flags.__getitem__, ids)) - ord('0') * len(ids)
+
+
+def course_ids(mask):
+    """The set bits of `mask`, lowest first."""
+    # Binary digits as b'\x00'/b'\x01' select from a range, all in C
+    digits = bin(mask)[:1:-1].encode().translate(_DIGITS)
+    return list(compress(range(len(digits)), digits))
+
+
+def filter_courses(index, selected):
+    """
+    Returns (ids of the matching courses, facets), facets being
+    [(facet, title, [(value, label, count, checked)])] for the filter bar.
+    Values that would leave no results are left out unless checked.
+    """
+    masks = {facet: _union(index['bits'][facet], values) for facet, values in selected.items()}
+    result = index['all']
+    for mask in masks.values():
+        result &= mask
+
+    width = index['all'].bit_length() + 1
+    facets = []
+    for facet, title in FACETS:
+        base = index['all']
+        others = [mask for other, mask in masks.items() if other != facet]
+        for mask in others:
+            base &= mask
+        flags = bin(base)[:1:-1].ljust(width, '0').encode() if others else None
+        checked = selected.get(facet, set())
+        values = []
+        for value, ids in index['bits'][facet].items():
+            count = _count(ids, base, flags)
+            if count or value in checked:
+                values.append((value, index['labels'][facet][value], count, value in checked))
+        if facet == 'length':
+            order = [value for value, _, _ in LENGTHS]
+            values.sort(key=lambda item: order.index(item[0]))
+        else:
+            values.sort(key=lambda item: (-item[2], item[1]))
+        facets.append((facet, title, values))
+    return course_ids(result), facets
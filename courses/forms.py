@@ -4,11 +4,13 @@ from .models import Course, Module, Lesson, Quiz, Question
 class CourseForm(forms.ModelForm):
     class Meta:
         model = Course
-        fields = ['title', 'description', 'price', 'thumbnail']
+        fields = ['title', 'description', 'price', 'category', 'tags', 'thumbnail']
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control bg-dark text-white border-secondary', 'placeholder': 'Enter course title'}),
             'description': forms.Textarea(attrs={'class': 'form-control bg-dark text-white border-secondary', 'rows': 4, 'placeholder': 'Course details...'}),
             'price': forms.NumberInput(attrs={'class': 'form-control bg-dark text-white border-secondary'}),
+            'category': forms.TextInput(attrs={'class': 'form-control bg-dark text-white border-secondary', 'placeholder': 'e.g. Development'}),
+            'tags': forms.SelectMultiple(attrs={'class': 'form-select bg-dark text-white border-secondary'}),
             'thumbnail': forms.FileInput(attrs={'class': 'form-control bg-dark text-white border-secondary'}),
         }
 
@@ -35,16 +37,19 @@ class LessonForm(forms.ModelForm):
 class QuizForm(forms.ModelForm):
     class Meta:
         model = Quiz
-        fields = ['title', 'pass_score']
+        fields = ['title', 'pass_score', 'questions_per_attempt', 'stratify_by', 'time_limit_minutes']
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control bg-dark text-white border-secondary'}),
             'pass_score': forms.NumberInput(attrs={'class': 'form-control bg-dark text-white border-secondary'}),
+            'questions_per_attempt': forms.NumberInput(attrs={'class': 'form-control bg-dark text-white border-secondary'}),
+            'stratify_by': forms.Select(attrs={'class': 'form-select bg-dark text-white border-secondary'}),
+            'time_limit_minutes': forms.NumberInput(attrs={'class': 'form-control bg-dark text-white border-secondary'}),
         }
 
 class QuestionForm(forms.ModelForm):
     class Meta:
         model = Question
-        fields = ['text', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_option']
+        fields = ['text', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_option', 'tag', 'difficulty']
         widgets = {
             'text': forms.Textarea(attrs={'class': 'form-control bg-dark text-white border-secondary', 'rows': 2, 'placeholder': 'Question text...'}),
             'option_a': forms.TextInput(attrs={'class': 'form-control bg-dark text-white border-secondary', 'placeholder': 'Option A'}),
@@ -52,4 +57,6 @@ class QuestionForm(forms.ModelForm):
             'option_c': forms.TextInput(attrs={'class': 'form-control bg-dark text-white border-secondary', 'placeholder': 'Option C'}),
             'option_d': forms.TextInput(attrs={'class': 'form-control bg-dark text-white border-secondary', 'placeholder': 'Option D'}),
             'correct_option': forms.Select(attrs={'class': 'form-select bg-dark text-white border-secondary'}),
+            'tag': forms.TextInput(attrs={'class': 'form-control bg-dark text-white border-secondary', 'placeholder': 'Tag (optional)'}),
+            'difficulty': forms.Select(attrs={'class': 'form-select bg-dark text-white border-secondary'}),
         }
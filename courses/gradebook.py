@@ -0,0 +1,122 @@
+"""
+Course gradebook: one row per enrolled student with their progress, the
+best score and pass flag of each quiz, and when their certificate was
+issued.
+
+Two queries cover any number of students and quizzes: the enrollments (with
+the certificate date), and the best attempt of each (student, quiz) pair as
+one grouped query over UserQuizAttempt. Both are ordered by student id and
+rows are built by merging the two streams, so an export holds one student in
+memory at a time however large the course is, and starts writing as soon as
+the attempts have been grouped. Pivoting per (student, quiz) group keeps the
+work proportional to the attempts; a conditional MAX per quiz column in SQL
+would evaluate every quiz's CASE on every attempt.
+
+Pass flags are Yes if any attempt passed, No if the student tried and never
+passed, and empty if they never tried.
+"""
+import csv
+import io
+
+from django.db import connections
+from django.db.models import Case, IntegerField, Max, OuterRef, Subquery, When
+from django.utils import timezone
+
+from .models import Certificate, Enrollment, Quiz, UserQuizAttempt
+
+# Rows per round trip when streaming an export
+CHUNK_SIZE = 2000
+
+# Columns before the quiz columns
+STUDENT_COLUMNS = ['Student', 'Email', 'Progress (%)', 'Completed']
+
+
+def course_quizzes(course):
+    return list(Quiz.objects.filter(course=course).order_by('id').only('id', 'title'))
+
+
+def header(quizzes):
+    columns = list(STUDENT_COLUMNS)
+    for quiz in quizzes:
+        columns += [f'{quiz.title}: best score', f'{quiz.title}: passed']
+    return columns + ['Certificate issued']
+
+
+def student_ids(course):
+    """The course's students in gradebook order, for paging."""
+    return Enrollment.objects.filter(course=course).order_by('student_id').values_list('student_id', flat=True)
+
+
+def _raw_rows(queryset):
+    """
+    The rows of `queryset` as the database returns them, fetched in chunks.
+    Skips the ORM's per-row converters, a third of the export's time with
+    two aggregates over a million groups; both are plain integers already.
+    """
+    sql, params = queryset.query.sql_with_params()
+    # A server-side cursor where the backend has them, like QuerySet.iterator()
+    with connections[queryset.db].chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(CHUNK_SIZE)
+            if not rows:
+                return
+            yield from rows
+
+
+def gradebook_rows(course, quizzes, students=None):
+    """
+    Yields the gradebook rows of `students` (ids), or of every enrolled
+    student, streaming both queries.
+    """
+    certificate = Certificate.objects.filter(user=OuterRef('student_id'), course=course).order_by('issued_at')
+    enrollments = (
+        Enrollment.objects.filter(course=course)
+        .annotate(certificate=Subquery(certificate.values('issued_at')[:1]))
+        .order_by('student_id')
+        .values_list('student_id', 'student__username', 'student__email', 'progress', 'completed', 'certificate')
+    )
+    attempts = (
+        UserQuizAttempt.objects.filter(quiz__in=[quiz.pk for quiz in quizzes])
+        .values('user_id', 'quiz_id')
+        .annotate(best=Max('score'), passed=Max(Case(When(passed=True, then=1), default=0, output_field=IntegerField())))
+        .order_by('user_id', 'quiz_id')
+        .values_list('user_id', 'quiz_id', 'best', 'passed')
+    )
+    if students is not None:
+        students = list(students)
+        enrollments = enrollments.filter(student_id__in=students)
+        attempts = attempts.filter(user_id__in=students)
+    enrollments = enrollments.iterator(chunk_size=CHUNK_SIZE)
+    attempts = _raw_rows(attempts) if quizzes else iter(())
+
+    column = {quiz.pk: 4 + 2 * i for i, quiz in enumerate(quizzes)}
+    blank = [None] * (2 * len(quizzes))
+    pending = next(attempts, None)
+    for student_id, username, email, progress, completed, issued in enrollments:
+        row = [username, email, progress, 'Yes' if completed else 'No', *blank, None]
+        # Attempts by people no longer enrolled sort in between; skip them
+        while pending is not None and pending[0] < student_id:
+            pending = next(attempts, None)
+        while pending is not None and pending[0] == student_id:
+            _, quiz_id, best, passed = pending
+            row[column[quiz_id]] = best
+            row[column[quiz_id] + 1] = 'Yes' if passed else 'No'
+            pending = next(attempts, None)
+        if issued is not None:
+            row[-1] = timezone.localdate(issued).isoformat()
+        yield row
+
+
+def stream_csv(header, rows, batch=500):
+    """CSV text for a StreamingHttpResponse, a batch of rows per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % batch == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -1,8 +1,38 @@
-from django.db import models
-from django.conf import settings
-from django.utils import timezone
-from .models import Enrollment
-# ... imports
-
-# (Logic to update progress would typically be here or in views)
-# For now, we will handle it in views.py
+from activity.ingest import record_event
+from activity.models import ActivityEvent
+
+from .banks import questions_in_order
+from .models import UserQuizAttempt
+
+
+def score_answers(quiz, questions, answers):
+    """
+    Score `answers` ({question_id: 'A'..'D'}) against the quiz's questions.
+    Returns (percentage, correct, total).
+    """
+    correct = sum(1 for question in questions if answers.get(question.id) == question.correct_option)
+    total = len(questions)
+    percentage = int((correct / total) * 100) if total > 0 else 0
+    return percentage, correct, total
+
+
+def grade_quiz(user, quiz, answers, question_ids=None):
+    """
+    Score `answers` against the quiz, or only the questions drawn for this
+    attempt when `question_ids` is given, and record the attempt.
+    Returns (attempt, correct, total).
+    """
+    questions = list(quiz.questions.all()) if question_ids is None else questions_in_order(quiz, question_ids)
+    percentage, correct, total = score_answers(quiz, questions, answers)
+    attempt = UserQuizAttempt.objects.create(
+        user=user,
+        quiz=quiz,
+        score=percentage,
+        passed=percentage >= quiz.pass_score,
+        question_ids=question_ids or [],
+    )
+    record_event(
+        user.pk, ActivityEvent.QUIZ_SUBMITTED, course_id=quiz.course_id, object_id=quiz.pk,
+        timestamp=attempt.timestamp, score=attempt.score, passed=attempt.passed,
+    )
+    return attempt, correct, total
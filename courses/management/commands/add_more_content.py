@@ -19,28 +19,28 @@ class Command(BaseCommand):
                 'title': 'modern JavaScript Essentials',
                 'desc': 'Deep dive into ES6+, Async/Await, and DOM manipulation.',
                 'image': 'https://images.unsplash.com/photo-1579468118864-1b9ea3c0db4a?auto=format&fit=crop&q=80',
-                'price': '$49.99',
+                'price': '49.99',
                 'category': 'Development'
             },
             {
                 'title': 'Advanced Django Patterns',
                 'desc': 'Master CBVs, Middleware, Signals, and Deployment.',
                 'image': 'https://images.unsplash.com/photo-1517694712202-14dd9538aa97?auto=format&fit=crop&q=80',
-                'price': '$89.99',
+                'price': '89.99',
                 'category': 'Development'
             },
             {
                 'title': 'Statistics for Data Science',
                 'desc': 'Probability, distributions, hypothesis testing and regression analysis.',
                 'image': 'https://images.unsplash.com/photo-1551288049-bebda4e38f71?auto=format&fit=crop&q=80',
-                'price': '$39.99',
+                'price': '39.99',
                 'category': 'Data Science'
             },
             {
                 'title': 'Deep Learning with PyTorch',
                 'desc': 'Build neural networks, CNNs, and NLP models from scratch.',
                 'image': 'https://images.unsplash.com/photo-1620712943543-bcc4688e7485?auto=format&fit=crop&q=80',
-                'price': '$99.99',
+                'price': '99.99',
                 'category': 'Data Science'
             }
         ]
@@ -52,9 +52,8 @@ class Command(BaseCommand):
                 defaults={
                     'description': c['desc'],
                     'instructor': instructor,
-                    'image': c['image'],
                     'price': c['price'],
-                    'category': c['category']
+                    'category': c['category'],
                 }
             )
             created_courses[c['title']] = course
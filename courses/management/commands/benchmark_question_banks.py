@@ -0,0 +1,92 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from courses.banks import allocate, bank_strata, invalidate_bank, sample_questions
+from courses.models import Course, Question, Quiz
+from dashboard.management.commands.benchmark_views import percentile
+
+User = get_user_model()
+
+TAGS = ['algebra', 'geometry', 'statistics', 'calculus', 'logic', 'probability', 'sets', 'graphs']
+DIFFICULTIES = ['easy', 'medium', 'medium', 'hard']
+
+
+class Command(BaseCommand):
+    help = ('Compares drawing per-attempt samples from a large question bank with ORDER BY RANDOM() '
+            'against the cached per-stratum id arrays. Works in a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=10000, help='Questions in the bank')
+        parser.add_argument('--draw', type=int, default=40, help='Questions per attempt')
+        parser.add_argument('--attempts', type=int, default=200, help='Samples drawn per method')
+        parser.add_argument('--stratify-by', choices=['', 'tag', 'difficulty'], default='tag')
+
+    def handle(self, *args, **options):
+        instructor = User.objects.filter(role='instructor').first() or User.objects.first()
+        if instructor is None:
+            raise CommandError('No users found. Run generate_dataset first.')
+
+        with transaction.atomic():
+            quiz = self.build_bank(instructor, options)
+            self.stdout.write(f"{options['questions']} questions, {options['draw']} per attempt, "
+                              f"stratified by {options['stratify_by'] or 'nothing'}\n")
+            self.stdout.write(f"{'method':<28}{'p50 ms':>10}{'p95 ms':>10}")
+
+            self.report('ORDER BY RANDOM()', self.run(lambda: self.order_by_random(quiz), options['attempts']))
+
+            def cold():
+                invalidate_bank(quiz.pk)
+                return sample_questions(quiz)
+            self.report('bank, cold cache', self.run(cold, max(1, options['attempts'] // 10)))
+
+            bank_strata(quiz)
+            self.report('bank, warm cache', self.run(lambda: sample_questions(quiz), options['attempts']))
+            invalidate_bank(quiz.pk)
+            transaction.set_rollback(True)
+
+    def build_bank(self, instructor, options):
+        course = Course.objects.create(title='Question bank benchmark', description='...', instructor=instructor)
+        quiz = Quiz.objects.create(
+            course=course, title='Bank', questions_per_attempt=options['draw'], stratify_by=options['stratify_by'],
+        )
+        rng = random.Random(0)
+        Question.objects.bulk_create([
+            Question(
+                quiz=quiz, text=f'Question {n}', option_a='a', option_b='b', option_c='c', option_d='d',
+                correct_option=rng.choice('ABCD'), tag=rng.choice(TAGS), difficulty=rng.choice(DIFFICULTIES),
+            )
+            for n in range(options['questions'])
+        ], batch_size=2000)
+        return quiz
+
+    def order_by_random(self, quiz):
+        """The straightforward way: one random-ordered query per stratum."""
+        questions = Question.objects.filter(quiz=quiz)
+        if not quiz.stratify_by:
+            return list(questions.order_by('?').values_list('id', flat=True)[:quiz.questions_per_attempt])
+        sizes = dict(questions.values(quiz.stratify_by).annotate(n=Count('id')).values_list(quiz.stratify_by, 'n'))
+        sample = []
+        for stratum, count in allocate(sizes, quiz.questions_per_attempt).items():
+            stratum_questions = questions.filter(**{quiz.stratify_by: stratum}).order_by('?')
+            sample.extend(stratum_questions.values_list('id', flat=True)[:count])
+        return sample
+
+    def run(self, draw, count):
+        timings = []
+        for _ in range(count):
+            start = time.perf_counter()
+            sample = draw()
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings, sample
+
+    def report(self, name, result):
+        timings, sample = result
+        if len(sample) != len(set(sample)):
+            raise CommandError(f'{name} drew a question twice')
+        self.stdout.write(f'{name:<28}{statistics.median(timings):>10.2f}{percentile(timings, 95):>10.2f}')
@@ -0,0 +1,81 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from courses.models import Course
+from courses.slides import record_decks, stale_courses, write_deck
+
+# Decks recorded per query; an interrupted run keeps what it recorded
+RECORD_BATCH = 50
+
+
+class Command(BaseCommand):
+    help = ('Exports courses as PPTX slide decks to the slide_decks storage. Courses unchanged since '
+            'their last export are skipped; the rest are built in a process pool.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='courses',
+                            help='Only this course (repeatable)')
+        parser.add_argument('--force', action='store_true', help='Rebuild decks that are up to date')
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                            help='Worker processes; 1 exports in this process')
+        parser.add_argument('--template', help='A .pptx to start each deck from (default: SLIDE_DECK_TEMPLATE)')
+
+    def handle(self, *args, **options):
+        if options['force']:
+            courses = Course.objects.order_by('id')
+            if options['courses']:
+                courses = courses.filter(pk__in=options['courses'])
+            course_ids = list(courses.values_list('id', flat=True))
+        else:
+            course_ids = stale_courses(options['courses'])
+        if not course_ids:
+            self.stdout.write('All decks are up to date.')
+            return
+
+        start = time.perf_counter()
+        written, failed = [], []
+        exported = slides = 0
+        for course_id, result in self.run(course_ids, options['template'], options['workers']):
+            if isinstance(result, Exception):
+                failed.append(course_id)
+                self.stderr.write(f'Course {course_id}: {result!r}')
+                continue
+            written.append(result)
+            if len(written) == RECORD_BATCH:
+                record_decks(written)
+                written = []
+            exported += 1
+            slides += result['slide_count']
+        if written:
+            record_decks(written)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {exported} deck(s), {slides} slides, in {time.perf_counter() - start:.1f}s'
+        ))
+        if failed:
+            self.stderr.write(f'{len(failed)} failed: {", ".join(map(str, failed))}')
+
+    def run(self, course_ids, template, workers):
+        """Yields (course id, write_deck result or the exception it raised)."""
+        if workers <= 1 or len(course_ids) == 1:
+            for course_id in course_ids:
+                try:
+                    yield course_id, write_deck(course_id, template)
+                except Exception as exc:
+                    yield course_id, exc
+            return
+
+        # Forked workers must not share this process's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            futures = {pool.submit(write_deck, course_id, template): course_id for course_id in course_ids}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as exc:
+                    yield futures[future], exc
@@ -0,0 +1,237 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from community.models import Channel, Message
+from courses.models import Course, Module, Lesson, Enrollment, Quiz, Question, UserQuizAttempt
+
+User = get_user_model()
+
+PREFIX = 'gen_'
+WORDS = (
+    'python django data model query index cache async thread render template deploy '
+    'vector matrix loop function class module lesson quiz score path course learn build '
+    'debug test review scale shard replica latency budget profile stream batch'
+).split()
+
+
+@contextmanager
+def historic_timestamps(*fields):
+    """Let bulk_create keep the generated values of auto_now/auto_now_add fields."""
+    saved = [(f, f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in saved:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+def field(model, name):
+    return model._meta.get_field(name)
+
+
+class Command(BaseCommand):
+    help = 'Deterministically generates a large synthetic dataset with bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--instructors', type=int, default=50)
+        parser.add_argument('--courses', type=int, default=100)
+        parser.add_argument('--modules', type=int, default=5, help='Modules per course')
+        parser.add_argument('--lessons', type=int, default=6, help='Lessons per module')
+        parser.add_argument('--quizzes', type=int, default=2, help='Quizzes per course')
+        parser.add_argument('--questions', type=int, default=10, help='Questions per quiz')
+        parser.add_argument('--enrollments', type=int, default=5000)
+        parser.add_argument('--attempts', type=int, default=5000, help='Quiz attempts')
+        parser.add_argument('--channels', type=int, default=4)
+        parser.add_argument('--messages', type=int, default=20000)
+        parser.add_argument('--days', type=int, default=365, help='Spread timestamps over this many days')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--flush', action='store_true', help=f'Delete previously generated ({PREFIX}*) data first')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.days = options['days']
+
+        if options['flush']:
+            self.step('Flushing previous dataset', self.flush)
+        if User.objects.filter(username__startswith=PREFIX).exists():
+            self.stdout.write(self.style.ERROR('Generated data already present; rerun with --flush.'))
+            return
+
+        users = self.step('Users', self.make_users, options['users'], options['instructors'])
+        students, instructors = users
+        courses = self.step('Courses', self.make_courses, options['courses'], instructors)
+        self.step('Modules and lessons', self.make_outline, courses, options['modules'], options['lessons'])
+        quizzes = self.step('Quizzes and questions', self.make_quizzes, courses, options['quizzes'], options['questions'])
+        self.step('Enrollments', self.make_enrollments, students, courses, options['enrollments'])
+        self.step('Quiz attempts', self.make_attempts, students, quizzes, options['attempts'])
+        channels = self.step('Channels', self.make_channels, options['channels'])
+        self.step('Messages', self.make_messages, students + instructors, channels, options['messages'])
+        self.stdout.write(self.style.SUCCESS('Dataset ready.'))
+
+    def step(self, label, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.stdout.write(f'{label:<24} {time.perf_counter() - start:8.2f}s')
+        return result
+
+    def past(self):
+        return self.now - timedelta(seconds=self.rng.randrange(self.days * 86400))
+
+    def sentence(self, words):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(words))
+
+    def bulk(self, model, objs):
+        """bulk_create an iterable in batches, returning the created ids."""
+        ids, batch = [], []
+        for obj in objs:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                ids += self._insert(model, batch)
+                batch = []
+        if batch:
+            ids += self._insert(model, batch)
+        return ids
+
+    def _insert(self, model, batch):
+        with transaction.atomic():
+            created = model.objects.bulk_create(batch)
+        return [obj.pk for obj in created]
+
+    def flush(self):
+        generated = User.objects.filter(username__startswith=PREFIX)
+        Message.objects.filter(author__in=generated).delete()
+        Channel.objects.filter(slug__startswith=PREFIX.replace('_', '-')).delete()
+        Course.objects.filter(instructor__in=generated).delete()
+        generated.delete()
+
+    def make_users(self, count, instructor_count):
+        # Hashing once keeps 100k users fast; every generated account uses "password"
+        password = make_password('password')
+        with historic_timestamps(field(User, 'date_joined')):
+            ids = self.bulk(User, (
+                User(
+                    username=f'{PREFIX}{"instructor" if i < instructor_count else "student"}_{i}',
+                    email=f'{PREFIX}{i}@example.com',
+                    password=password,
+                    role='instructor' if i < instructor_count else 'student',
+                    xp=self.rng.randrange(2000),
+                    date_joined=self.past(),
+                )
+                for i in range(count + instructor_count)
+            ))
+        return ids[instructor_count:], ids[:instructor_count]
+
+    def make_courses(self, count, instructors):
+        with historic_timestamps(field(Course, 'created_at'), field(Course, 'updated_at')):
+            courses = []
+            for i in range(count):
+                created = self.past()
+                courses.append(Course(
+                    title=f'{self.sentence(3).title()} {i}',
+                    description=self.sentence(30),
+                    price=self.rng.choice([0, 0, 19.99, 49.99, 99.99]),
+                    instructor_id=self.rng.choice(instructors),
+                    created_at=created,
+                    updated_at=created,
+                ))
+            return self.bulk(Course, courses)
+
+    def make_outline(self, courses, modules_per_course, lessons_per_module):
+        module_ids = self.bulk(Module, (
+            Module(course_id=course_id, title=self.sentence(3).title(), order=m + 1)
+            for course_id in courses for m in range(modules_per_course)
+        ))
+        self.bulk(Lesson, (
+            Lesson(module_id=module_id, title=self.sentence(4).title(), content=self.sentence(80), order=l + 1)
+            for module_id in module_ids for l in range(lessons_per_module)
+        ))
+
+    def make_quizzes(self, courses, quizzes_per_course, questions_per_quiz):
+        quiz_ids = self.bulk(Quiz, (
+            Quiz(course_id=course_id, title=f'Quiz {q + 1}')
+            for course_id in courses for q in range(quizzes_per_course)
+        ))
+        self.bulk(Question, (
+            Question(
+                quiz_id=quiz_id, text=self.sentence(12) + '?',
+                option_a=self.sentence(3), option_b=self.sentence(3),
+                option_c=self.sentence(3), option_d=self.sentence(3),
+                correct_option=self.rng.choice('ABCD'),
+            )
+            for quiz_id in quiz_ids for _ in range(questions_per_quiz)
+        ))
+        return quiz_ids
+
+    def make_enrollments(self, students, courses, count):
+        if not students or not courses:
+            return
+        per_student, extra = divmod(count, len(students))
+
+        def rows():
+            for i, student_id in enumerate(students):
+                k = min(len(courses), per_student + (1 if i < extra else 0))
+                for course_id in self.rng.sample(courses, k):
+                    enrolled = self.past()
+                    progress = self.rng.choice([0, 10, 25, 50, 75, 90, 100])
+                    yield Enrollment(
+                        student_id=student_id, course_id=course_id, progress=progress,
+                        completed=progress == 100, date_enrolled=enrolled,
+                        last_accessed=enrolled + timedelta(hours=self.rng.randrange(24 * 30)),
+                    )
+
+        with historic_timestamps(field(Enrollment, 'date_enrolled'), field(Enrollment, 'last_accessed')):
+            self.bulk(Enrollment, rows())
+
+    def make_attempts(self, students, quizzes, count):
+        if not students or not quizzes:
+            return
+
+        def rows():
+            for _ in range(count):
+                score = self.rng.randrange(0, 101, 10)
+                yield UserQuizAttempt(
+                    user_id=self.rng.choice(students), quiz_id=self.rng.choice(quizzes),
+                    score=score, passed=score >= 70, timestamp=self.past(),
+                )
+
+        with historic_timestamps(field(UserQuizAttempt, 'timestamp')):
+            self.bulk(UserQuizAttempt, rows())
+
+    def make_channels(self, count):
+        slug_prefix = PREFIX.replace('_', '-')
+        return [
+            Channel.objects.create(name=f'{slug_prefix}channel-{i}', slug=f'{slug_prefix}channel-{i}')
+            for i in range(count)
+        ]
+
+    def make_messages(self, authors, channels, count):
+        if not authors or not channels:
+            return
+        # Oldest first, so ids grow with time as they do in production
+        step = self.days * 86400 / max(count, 1)
+        start = self.now - timedelta(days=self.days)
+
+        def rows():
+            for i in range(count):
+                yield Message(
+                    channel=self.rng.choice(channels), author_id=self.rng.choice(authors),
+                    content=self.sentence(self.rng.randrange(3, 25)),
+                    timestamp=start + timedelta(seconds=i * step),
+                )
+
+        with historic_timestamps(field(Message, 'timestamp')):
+            self.bulk(Message, rows())
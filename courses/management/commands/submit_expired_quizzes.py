@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses.quiz_sessions import submit_expired
+
+
+class Command(BaseCommand):
+    help = 'Submits and grades quiz sessions whose time limit has run out'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Sessions graded per transaction')
+        parser.add_argument('--every', type=float, help='Keep running, sweeping every this many seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            count = submit_expired(batch_size=options['batch_size'])
+            if count or not options['every']:
+                self.stdout.write(f'Submitted {count} expired quiz sessions.')
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_userlearningpath'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-created_at'], name='courses_course_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['student', '-last_accessed'], name='courses_enr_student_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['course', 'progress'], name='courses_enr_course_prog_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userquizattempt',
+            index=models.Index(fields=['user', 'quiz', 'timestamp'], name='courses_attempt_user_quiz_idx'),
+        ),
+    ]
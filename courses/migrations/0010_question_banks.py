@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_offline_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='difficulty',
+            field=models.CharField(choices=[('easy', 'Easy'), ('medium', 'Medium'), ('hard', 'Hard')], default='medium', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='tag',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='questions_per_attempt',
+            field=models.PositiveIntegerField(blank=True, help_text='Questions drawn per attempt; leave empty to ask them all', null=True),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='stratify_by',
+            field=models.CharField(blank=True, choices=[('tag', 'Tag'), ('difficulty', 'Difficulty')], help_text='Draw from each tag or difficulty in proportion to its share of the bank', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='userquizattempt',
+            name='question_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
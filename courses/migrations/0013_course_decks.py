@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_course_categories_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseDeck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255)),
+                ('course_updated_at', models.DateTimeField()),
+                ('slide_count', models.PositiveIntegerField()),
+                ('exported_at', models.DateTimeField(auto_now=True)),
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='deck', to='courses.course')),
+            ],
+        ),
+    ]
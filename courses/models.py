@@ -3,21 +3,48 @@ from django.conf import settings
 from django.utils import timezone
 import uuid
 
+class Tag(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    slug = models.SlugField(max_length=50, unique=True)
+
+    def __str__(self):
+        return self.name
+
 class Course(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=6, decimal_places=2, default=0.00)
     thumbnail = models.ImageField(upload_to='course_thumbnails/', blank=True, null=True)
     instructor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='courses_taught')
+    category = models.CharField(max_length=50, blank=True)
+    tags = models.ManyToManyField(Tag, blank=True, related_name='courses')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Newest-first listings (suggested courses, admin dashboard)
+            models.Index(fields=['-created_at'], name='courses_course_created_idx'),
+        ]
+
     def get_modules_count(self):
         return self.modules.count()
 
     def __str__(self):
         return self.title
 
+class CourseDeck(models.Model):
+    """The last slide deck exported for a course (see courses/slides.py)."""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, related_name='deck')
+    path = models.CharField(max_length=255)
+    # The course's updated_at when the deck was built; a deck is current while they match
+    course_updated_at = models.DateTimeField()
+    slide_count = models.PositiveIntegerField()
+    exported_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.course.title} ({self.slide_count} slides)"
+
 class Module(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='modules')
     title = models.CharField(max_length=200)
@@ -49,19 +76,60 @@ class Enrollment(models.Model):
     last_accessed = models.DateTimeField(auto_now=True)
     completed = models.BooleanField(default=False)
     progress = models.IntegerField(default=0) # Percentage
+    last_lesson = models.ForeignKey('Lesson', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
 
     class Meta:
         unique_together = ('student', 'course')
+        indexes = [
+            # Student dashboard: WHERE student_id = %s ORDER BY last_accessed DESC
+            models.Index(fields=['student', '-last_accessed'], name='courses_enr_student_recent_idx'),
+            # Per-course progress / completion stats
+            models.Index(fields=['course', 'progress'], name='courses_enr_course_prog_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.username} enrolled in {self.course.title}"
 
+class LessonCompletion(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='lesson_completions')
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='completions')
+    # When the learner finished it (client clock) and when the server recorded it
+    completed_at = models.DateTimeField()
+    synced_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'lesson')
+        indexes = [
+            # Sync deltas: WHERE user_id = %s AND synced_at > %s
+            models.Index(fields=['user', 'synced_at'], name='courses_completion_synced_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} completed {self.lesson.title}"
+
+class SyncEvent(models.Model):
+    """Idempotency key of an offline event already applied by /sync."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sync_events')
+    key = models.CharField(max_length=64)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+
+    def __str__(self):
+        return f"{self.user.username}: {self.key}"
+
 # --- Assessment Models ---
 
 class Quiz(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='quizzes')
     title = models.CharField(max_length=200)
     pass_score = models.IntegerField(default=70, help_text="Percentage required to pass")
+    # Question banks: draw a sample per attempt instead of serving every question (see courses/banks.py)
+    questions_per_attempt = models.PositiveIntegerField(null=True, blank=True, help_text="Questions drawn per attempt; leave empty to ask them all")
+    stratify_by = models.CharField(max_length=10, blank=True, choices=[('tag', 'Tag'), ('difficulty', 'Difficulty')],
+                                   help_text="Draw from each tag or difficulty in proportion to its share of the bank")
+    time_limit_minutes = models.PositiveIntegerField(null=True, blank=True, help_text="Leave empty for no time limit")
     
     def __str__(self):
         return self.title
@@ -74,6 +142,8 @@ class Question(models.Model):
     option_c = models.CharField(max_length=200)
     option_d = models.CharField(max_length=200)
     correct_option = models.CharField(max_length=1, choices=[('A', 'A'), ('B', 'B'), ('C', 'C'), ('D', 'D')])
+    tag = models.CharField(max_length=50, blank=True)
+    difficulty = models.CharField(max_length=10, default='medium', choices=[('easy', 'Easy'), ('medium', 'Medium'), ('hard', 'Hard')])
     
     def __str__(self):
         return self.text[:50]
@@ -84,10 +154,51 @@ class UserQuizAttempt(models.Model):
     score = models.IntegerField()
     passed = models.BooleanField(default=False)
     timestamp = models.DateTimeField(auto_now_add=True)
-    
+    # The questions this attempt was drawn and graded on; empty when it was asked the whole quiz
+    question_ids = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        indexes = [
+            # A user's attempts at a quiz, latest first
+            models.Index(fields=['user', 'quiz', 'timestamp'], name='courses_attempt_user_quiz_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.quiz.title} - {self.score}%"
 
+class QuizSession(models.Model):
+    """
+    An attempt in progress: the questions drawn for it, the answers saved so
+    far and when it has to be in by. Submitting (or the sweep in
+    courses/quiz_sessions.py, once the deadline has passed) grades it into a
+    UserQuizAttempt.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='quiz_sessions')
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='sessions')
+    # Empty when the whole quiz is asked, as on UserQuizAttempt
+    question_ids = models.JSONField(default=list, blank=True)
+    # {question id: 'A'..'D'}, overwritten in one piece by each autosave
+    answers = models.JSONField(default=dict, blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    deadline = models.DateTimeField(null=True, blank=True)
+    saved_at = models.DateTimeField(null=True, blank=True)
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    attempt = models.OneToOneField(UserQuizAttempt, on_delete=models.SET_NULL, null=True, blank=True, related_name='session')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'quiz'], condition=models.Q(submitted_at__isnull=True),
+                                    name='courses_qsession_one_open'),
+        ]
+        indexes = [
+            # The sweep's scan for open sessions past their deadline
+            models.Index(fields=['deadline'], condition=models.Q(submitted_at__isnull=True),
+                         name='courses_qsession_open_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.quiz_id} - started {self.started_at:%Y-%m-%d %H:%M}"
+
 class Certificate(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
@@ -122,14 +233,19 @@ class UserLearningPath(models.Model):
     
     @property
     def progress(self):
-        total_courses = self.path.courses.count()
+        # Uses prefetched path courses when available; callers rendering many paths
+        # can also set `completed_course_ids` to skip the enrollment lookup
+        courses = self.path.courses.all()
+        total_courses = len(courses)
         if total_courses == 0:
             return 0
-        completed_courses = 0
-        for course in self.path.courses.all():
+        completed_ids = getattr(self, 'completed_course_ids', None)
+        if completed_ids is None:
             # Check if user has a certificate or 100% progress
-            if Enrollment.objects.filter(student=self.user, course=course, progress=100).exists():
-                completed_courses += 1
+            completed_ids = set(Enrollment.objects.filter(
+                student=self.user, course__in=courses, progress=100
+            ).values_list('course_id', flat=True))
+        completed_courses = sum(1 for course in courses if course.id in completed_ids)
         return int((completed_courses / total_courses) * 100)
 
     def __str__(self):
@@ -0,0 +1,198 @@
+"""
+Server-side quiz sessions.
+
+Opening a quiz starts (or resumes) the user's one open QuizSession: the
+questions drawn for it, a deadline when the quiz has a time limit, and the
+answers saved so far as a single JSON object. The page autosaves by sending
+every answer it holds, which `save_answers` writes with one UPDATE of that
+object once the keys are checked against the session's questions
+(`answerable_questions`); nothing is stored per keystroke. A dropped
+connection loses at most the last few seconds.
+
+A session is submitted once: whoever sets submitted_at first (the learner's
+submit or the sweep) grades it, the same way jobs are claimed in jobs/queue.py.
+`submit_expired` is the sweep. It claims open sessions whose deadline (plus
+GRACE) has passed, in batches, and grades each batch with one query for the
+questions, one bulk_create of attempts and one bulk_update of the sessions.
+A session whose saved answers can't be read is graded as unanswered and
+logged rather than holding up the rest of its batch.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from activity.ingest import record_event
+from activity.models import ActivityEvent
+
+from .banks import questions_in_order, sample_questions
+from .logic import grade_quiz, score_answers
+from .models import Question, QuizSession, UserQuizAttempt
+
+logger = logging.getLogger(__name__)
+
+# Slack for submits and autosaves sent right at the deadline
+GRACE = timedelta(seconds=30)
+
+# Upper bound on the answers one autosave can carry
+MAX_ANSWERS = 500
+
+
+def is_expired(session, now=None):
+    return session.deadline is not None and (now or timezone.now()) > session.deadline + GRACE
+
+
+def is_question_id(key):
+    """Whether `key` is a question id as sent by the page: ASCII digits only (str.isdigit() also takes '²')."""
+    return isinstance(key, str) and key.isascii() and key.isdigit()
+
+
+def parse_answers(answers):
+    """{question id: option} with int keys, from a saved or posted JSON object. Other keys are dropped."""
+    return {int(question_id): option for question_id, option in answers.items() if is_question_id(question_id)}
+
+
+def session_questions(session):
+    if session.question_ids:
+        return questions_in_order(session.quiz, session.question_ids)
+    return list(session.quiz.questions.all())
+
+
+def open_session(user, quiz):
+    """
+    The user's open session for `quiz`, started now if there is none. An
+    open session that ran out of time is submitted first. Returns
+    (session, expired_session_or_None); the expired session is only returned
+    once its attempt is saved.
+    """
+    expired = None
+    session = QuizSession.objects.filter(user=user, quiz=quiz, submitted_at__isnull=True).first()
+    if session is not None and is_expired(session):
+        if submit(session) is None:
+            # The sweep got there first and may still be grading it
+            session.refresh_from_db(fields=['attempt'])
+        expired = session if session.attempt_id else None
+        session = None
+    if session is None:
+        now = timezone.now()
+        deadline = now + timedelta(minutes=quiz.time_limit_minutes) if quiz.time_limit_minutes else None
+        question_ids = sample_questions(quiz) if quiz.questions_per_attempt else []
+        try:
+            with transaction.atomic():
+                session = QuizSession.objects.create(user=user, quiz=quiz, question_ids=question_ids, deadline=deadline)
+        except IntegrityError:
+            # Opened in another tab at the same moment
+            session = QuizSession.objects.get(user=user, quiz=quiz, submitted_at__isnull=True)
+        record_event(user.pk, ActivityEvent.QUIZ_STARTED, course_id=quiz.course_id, object_id=quiz.pk)
+    return session, expired
+
+
+def answerable_questions(session_id, user):
+    """Ids of the questions the user's open session asks, or None if it isn't open."""
+    session = (
+        QuizSession.objects.filter(pk=session_id, user=user, submitted_at__isnull=True)
+        .values('quiz_id', 'question_ids').first()
+    )
+    if session is None:
+        return None
+    if session['question_ids']:
+        return set(session['question_ids'])
+    return set(Question.objects.filter(quiz_id=session['quiz_id']).values_list('id', flat=True))
+
+
+def save_answers(session_id, user, answers):
+    """Overwrite the session's saved answers. Returns False once it's submitted or out of time."""
+    now = timezone.now()
+    return bool(
+        QuizSession.objects.filter(pk=session_id, user=user, submitted_at__isnull=True)
+        .exclude(deadline__lt=now - GRACE)
+        .update(answers=answers, saved_at=now)
+    )
+
+
+def submit(session, answers=None):
+    """
+    Grade the session, with `answers` from the submitted form taking
+    precedence over saved ones unless time is up. Returns (attempt, correct,
+    total), or None if the session had already been submitted.
+    """
+    now = timezone.now()
+    final = dict(session.answers)
+    if answers and not is_expired(session, now):
+        final.update({str(question_id): option for question_id, option in answers.items()})
+    with transaction.atomic():
+        if not QuizSession.objects.filter(pk=session.pk, submitted_at__isnull=True).update(submitted_at=now, answers=final):
+            return None
+        attempt, correct, total = grade_quiz(session.user, session.quiz, parse_answers(final), session.question_ids or None)
+        session.attempt, session.answers, session.submitted_at = attempt, final, now
+        QuizSession.objects.filter(pk=session.pk).update(attempt=attempt)
+    return attempt, correct, total
+
+
+def claim_expired(now, limit):
+    """Mark up to `limit` open sessions past their deadline as submitted and return their ids."""
+    due = QuizSession.objects.filter(submitted_at__isnull=True, deadline__lt=now - GRACE).order_by('deadline')
+    if connection.features.has_select_for_update_skip_locked:
+        ids = list(due.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+        QuizSession.objects.filter(id__in=ids).update(submitted_at=now)
+        return ids
+    ids = []
+    for pk in due.values_list('id', flat=True)[:limit]:
+        # Without row locks, a conditional UPDATE decides who gets each session
+        if QuizSession.objects.filter(pk=pk, submitted_at__isnull=True).update(submitted_at=now):
+            ids.append(pk)
+    return ids
+
+
+def grade_batch(sessions):
+    """Grade claimed sessions with a fixed number of queries. Returns the attempts."""
+    sampled = {question_id for session in sessions for question_id in session.question_ids}
+    whole = {session.quiz_id for session in sessions if not session.question_ids}
+    by_id, by_quiz = {}, defaultdict(list)
+    if sampled or whole:
+        rows = Question.objects.filter(pk__in=sampled) | Question.objects.filter(quiz__in=whole)
+        for question in rows.only('id', 'quiz_id', 'correct_option').order_by('id'):
+            by_id[question.id] = question
+            by_quiz[question.quiz_id].append(question)
+
+    attempts = []
+    for session in sessions:
+        quiz = session.quiz
+        if session.question_ids:
+            questions = [by_id[i] for i in session.question_ids if i in by_id and by_id[i].quiz_id == quiz.pk]
+        else:
+            questions = by_quiz[quiz.pk]
+        try:
+            answers = parse_answers(session.answers)
+        except (AttributeError, TypeError, ValueError):
+            logger.exception('Quiz session #%s has unreadable answers; grading it as unanswered', session.pk)
+            answers = {}
+        percentage, _, _ = score_answers(quiz, questions, answers)
+        attempts.append(UserQuizAttempt(
+            user_id=session.user_id, quiz=quiz, score=percentage, passed=percentage >= quiz.pass_score,
+            question_ids=session.question_ids,
+        ))
+    UserQuizAttempt.objects.bulk_create(attempts)
+    for session, attempt in zip(sessions, attempts):
+        session.attempt = attempt
+        record_event(
+            session.user_id, ActivityEvent.QUIZ_SUBMITTED, course_id=session.quiz.course_id, object_id=session.quiz_id,
+            score=attempt.score, passed=attempt.passed, timed_out=True,
+        )
+    QuizSession.objects.bulk_update(sessions, ['attempt'])
+    return attempts
+
+
+def submit_expired(now=None, batch_size=500):
+    """Submit and grade every open session that ran out of time. Returns how many."""
+    now = now or timezone.now()
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = claim_expired(now, batch_size)
+            if not ids:
+                return total
+            grade_batch(list(QuizSession.objects.filter(pk__in=ids).select_related('quiz')))
+        total += len(ids)
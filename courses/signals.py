@@ -0,0 +1,74 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import facets
+from .banks import invalidate_bank
+from .models import Course, Lesson, Module, Question, Quiz, Tag
+from .versions import invalidate_catalog, touch_course, touch_courses
+
+
+@receiver([post_save, post_delete], sender=Course)
+def course_changed(sender, instance, **kwargs):
+    invalidate_catalog()
+    facets.update_course(instance.pk)
+
+
+@receiver(m2m_changed, sender=Course.tags.through)
+def course_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Tags show on the catalog and course pages, so re-tagging moves their versions too
+    if action == 'pre_clear' and reverse:
+        # tag.courses.clear() names no courses afterwards; note them while they're linked
+        instance._cleared_course_ids = list(instance.courses.values_list('pk', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        touch_course(instance.pk)
+        facets.update_course(instance.pk)
+        return
+    course_ids = pk_set if action != 'post_clear' else getattr(instance, '_cleared_course_ids', ())
+    touch_courses(Course.objects.filter(pk__in=course_ids))
+    if pk_set:
+        for course_id in pk_set:
+            facets.update_course(course_id)
+    else:
+        facets.invalidate()
+
+
+@receiver([post_save, pre_delete], sender=Tag)
+def tag_touched(sender, instance, **kwargs):
+    # Before a delete, while its courses are still linked
+    touch_courses(Course.objects.filter(tags=instance))
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    # Renames change labels on every course carrying the tag; rebuild instead
+    facets.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Module)
+def module_changed(sender, instance, **kwargs):
+    touch_course(instance.course_id)
+    facets.update_course(instance.course_id)
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+def lesson_changed(sender, instance, **kwargs):
+    course_id = Module.objects.filter(pk=instance.module_id).values_list('course_id', flat=True).first()
+    if course_id:
+        touch_course(course_id)
+        facets.update_course(course_id)
+
+
+@receiver([post_save, post_delete], sender=Quiz)
+def quiz_changed(sender, instance, **kwargs):
+    # Quizzes are part of the exported slide deck (courses/slides.py)
+    touch_course(instance.course_id)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    invalidate_bank(instance.quiz_id)
+    course_id = Quiz.objects.filter(pk=instance.quiz_id).values_list('course_id', flat=True).first()
+    if course_id:
+        touch_course(course_id)
@@ -0,0 +1,158 @@
+"""
+Course slide decks.
+
+`build_deck` turns a course into a presentation with the helpers from
+generate_ppt.py: a title slide, then for each module a section header
+followed by one slide per lesson, then a section per quiz with a review
+slide for each question (the first MAX_REVIEW_QUESTIONS of a large bank).
+
+`export_course` builds a course's deck, saves it to the `slide_decks`
+storage and records it as the course's CourseDeck together with the
+`updated_at` it was built from. A deck is current while that still matches
+the course, which moves whenever its outline or quizzes change (see
+signals.py), so `stale_courses` is one query. Building and recording are
+separate steps (`write_deck`, `record_decks`) so that the
+export_course_decks pool workers only read, and the parent writes a batch
+of rows in one query.
+
+The template (SLIDE_DECK_TEMPLATE, or python-pptx's default) is read once
+per process and every deck is opened from those bytes.
+"""
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db.models import Count, F, Prefetch
+from pptx import Presentation
+
+from generate_ppt import SECTION_SLIDE_LAYOUT, add_slide, add_title_slide
+
+from .models import Course, CourseDeck, Module, Question, Quiz
+
+DECK_STORAGE = 'slide_decks'
+
+MAX_BULLETS = 6
+MAX_BULLET_CHARS = 200
+MAX_REVIEW_QUESTIONS = 25
+
+
+@lru_cache(maxsize=None)
+def _template_bytes(template):
+    if template:
+        with open(template, 'rb') as f:
+            return f.read()
+    buffer = BytesIO()
+    Presentation().save(buffer)
+    return buffer.getvalue()
+
+
+def new_presentation(template=None):
+    return Presentation(BytesIO(_template_bytes(template or settings.SLIDE_DECK_TEMPLATE)))
+
+
+def _clip(text, limit=MAX_BULLET_CHARS):
+    text = ' '.join(text.split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + '…'
+
+
+def _lesson_points(lesson):
+    paragraphs = [_clip(line) for line in lesson.content.splitlines() if line.strip()]
+    points = paragraphs[:MAX_BULLETS]
+    if len(paragraphs) > MAX_BULLETS:
+        points[-1] = '…'
+    if lesson.video_url:
+        points.append(f'Video: {lesson.video_url}')
+    return points or ['(No notes for this lesson)']
+
+
+def load_course(course_id):
+    """The course with everything its deck shows, in five queries."""
+    questions = Question.objects.order_by('id')[:MAX_REVIEW_QUESTIONS]
+    return (
+        Course.objects.select_related('instructor')
+        .prefetch_related(
+            Prefetch('modules', Module.objects.prefetch_related('lessons')),
+            Prefetch('quizzes', Quiz.objects.annotate(question_count=Count('questions')).order_by('id')
+                     .prefetch_related(Prefetch('questions', questions, to_attr='review_questions'))),
+        )
+        .get(pk=course_id)
+    )
+
+
+def build_deck(course, template=None):
+    prs = new_presentation(template)
+    add_title_slide(prs, course.title, f'{course.instructor.get_full_name() or course.instructor.username}\n'
+                                       f'{_clip(course.description, 300)}')
+
+    for number, module in enumerate(course.modules.all(), 1):
+        lessons = list(module.lessons.all())
+        add_title_slide(prs, f'Module {number}: {module.title}',
+                        f'{len(lessons)} lesson{"s" if len(lessons) != 1 else ""}', layout=SECTION_SLIDE_LAYOUT)
+        for lesson in lessons:
+            add_slide(prs, lesson.title, _lesson_points(lesson))
+
+    for quiz in course.quizzes.all():
+        questions = quiz.review_questions
+        shown = f'first {len(questions)} of ' if len(questions) < quiz.question_count else ''
+        add_title_slide(prs, f'Quiz: {quiz.title}',
+                        f'Review of the {shown}{quiz.question_count} questions. Pass mark {quiz.pass_score}%',
+                        layout=SECTION_SLIDE_LAYOUT)
+        for number, question in enumerate(questions, 1):
+            options = []
+            for letter in 'ABCD':
+                option = f'{letter}. {_clip(getattr(question, f"option_{letter.lower()}"))}'
+                options.append((option + ('  ✓' if letter == question.correct_option else ''), 1))
+            add_slide(prs, f'{quiz.title}: question {number}', [_clip(question.text)] + options)
+    return prs
+
+
+def deck_path(course_id):
+    return f'courses/{course_id}.pptx'
+
+
+def write_deck(course_id, template=None):
+    """Build one course's deck and store it. Returns the CourseDeck fields, unsaved."""
+    course = load_course(course_id)
+    prs = build_deck(course, template)
+    buffer = BytesIO()
+    prs.save(buffer)
+
+    storage = storages[DECK_STORAGE]
+    path = deck_path(course.pk)
+    # Storage.save picks a new name for an existing path; replace it instead
+    if storage.exists(path):
+        storage.delete(path)
+    storage.save(path, ContentFile(buffer.getvalue()))
+    return {'course_id': course.pk, 'path': path, 'course_updated_at': course.updated_at, 'slide_count': len(prs.slides)}
+
+
+def record_decks(written):
+    """Create or update the CourseDeck rows for `write_deck` results, in one query."""
+    return CourseDeck.objects.bulk_create(
+        [CourseDeck(**fields) for fields in written],
+        update_conflicts=True, unique_fields=['course'],
+        update_fields=['path', 'course_updated_at', 'slide_count', 'exported_at'],
+    )
+
+
+def export_course(course_id, template=None):
+    """Build, store and record one course's deck. Returns its CourseDeck."""
+    return record_decks([write_deck(course_id, template)])[0]
+
+
+def current_deck(course):
+    """The course's stored deck if it was built from the course as it is now, else None."""
+    deck = CourseDeck.objects.filter(course=course, course_updated_at=course.updated_at).first()
+    if deck is None or not storages[DECK_STORAGE].exists(deck.path):
+        return None
+    return deck
+
+
+def stale_courses(course_ids=None):
+    """Ids of the courses with no deck, or one built before their last change."""
+    courses = Course.objects.exclude(deck__course_updated_at=F('updated_at'))
+    if course_ids:
+        courses = courses.filter(pk__in=course_ids)
+    return list(courses.order_by('id').values_list('id', flat=True))
@@ -0,0 +1,192 @@
+"""
+Offline progress sync for mobile clients.
+
+Clients queue events while offline and send them in one batch, each with a
+client-generated idempotency key:
+
+    {"id": "...", "type": "lesson_completed", "lesson": 12, "at": "..."}
+    {"id": "...", "type": "quiz_submitted", "quiz": 3, "answers": {"41": "B"}, "sample": "...", "at": "..."}
+    {"id": "...", "type": "lesson_viewed", "lesson": 13, "at": "..."}
+
+`apply_events` drops keys repeated within the batch or applied by an earlier
+sync, then applies every kind of event with a fixed number of queries inside
+one transaction and recomputes Enrollment.progress once per affected course.
+Events for courses the user isn't enrolled in are rejected and not recorded,
+so they can be retried later. Submissions of timed quizzes are rejected as
+well: their deadline can't be checked offline, so they go through a
+QuizSession (courses/quiz_sessions.py) like on the site. A question bank
+submission needs the signed sample token from the API's draw, and is graded
+against the questions drawn, like one submitted online; without a valid
+token it is rejected.
+
+`changes_since` returns the server state that changed after a sync token:
+the client's view of its enrollments, completed lessons and quiz attempts.
+Rows can show up in two consecutive deltas; they are state, not events, so
+clients simply overwrite.
+"""
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from activity.ingest import record_event
+from activity.models import ActivityEvent
+
+from .banks import read_sample_token
+from .logic import score_answers
+from .models import Enrollment, Lesson, LessonCompletion, Question, Quiz, SyncEvent, UserQuizAttempt
+
+LESSON_COMPLETED = 'lesson_completed'
+QUIZ_SUBMITTED = 'quiz_submitted'
+LESSON_VIEWED = 'lesson_viewed'
+EVENT_TYPES = [LESSON_COMPLETED, QUIZ_SUBMITTED, LESSON_VIEWED]
+
+APPLIED = 'applied'
+DUPLICATE = 'duplicate'
+REJECTED = 'rejected'
+
+# Upper bound on events per request
+MAX_EVENTS = 500
+
+TOKEN_SALT = 'courses.sync'
+
+
+def make_token(moment):
+    return signing.dumps(moment.timestamp(), salt=TOKEN_SALT)
+
+
+def read_token(token):
+    """The moment a token was issued, or None for a first sync. Raises signing.BadSignature."""
+    if not token:
+        return None
+    return datetime.fromtimestamp(signing.loads(token, salt=TOKEN_SALT), tz=dt_timezone.utc)
+
+
+def apply_events(user, events):
+    """
+    Apply validated events (dicts as above, `at` a datetime, answer keys
+    ints). Returns {key: APPLIED | DUPLICATE | REJECTED}.
+    """
+    results = {}
+    fresh = {}
+    for event in events:
+        if event['id'] in fresh:
+            results[event['id']] = DUPLICATE
+        else:
+            fresh[event['id']] = event
+
+    with transaction.atomic():
+        # One sync per user at a time, so a key can't slip in twice
+        get_user_model().objects.select_for_update().filter(pk=user.pk).first()
+        for key in SyncEvent.objects.filter(user=user, key__in=list(fresh)).values_list('key', flat=True):
+            results[key] = DUPLICATE
+            del fresh[key]
+        if not fresh:
+            return results
+
+        lesson_ids = {event['lesson'] for event in fresh.values() if event['type'] != QUIZ_SUBMITTED}
+        lesson_courses = dict(Lesson.objects.filter(pk__in=lesson_ids).values_list('pk', 'module__course_id'))
+        quiz_ids = {event['quiz'] for event in fresh.values() if event['type'] == QUIZ_SUBMITTED}
+        quizzes = Quiz.objects.in_bulk(quiz_ids)
+        # The questions drawn for each bank submission, from its sample token
+        samples = {}
+        for key, event in fresh.items():
+            quiz = quizzes.get(event['quiz']) if event['type'] == QUIZ_SUBMITTED else None
+            if quiz is not None and quiz.questions_per_attempt:
+                try:
+                    samples[key] = read_sample_token(event.get('sample', ''), user, quiz)
+                except signing.BadSignature:
+                    pass
+        sampled = {question_id for question_ids in samples.values() for question_id in question_ids}
+        whole = [quiz.pk for quiz in quizzes.values() if not quiz.questions_per_attempt]
+        by_id, questions = {}, defaultdict(list)
+        rows = Question.objects.filter(pk__in=sampled) | Question.objects.filter(quiz__in=whole)
+        for question in rows.only('id', 'quiz_id', 'correct_option'):
+            by_id[question.id] = question
+            questions[question.quiz_id].append(question)
+        course_ids = set(lesson_courses.values()) | {quiz.course_id for quiz in quizzes.values()}
+        enrollments = {e.course_id: e for e in Enrollment.objects.filter(student=user, course__in=course_ids)}
+
+        completions, attempts, viewed, touched = [], [], {}, set()
+        for key, event in fresh.items():
+            if event['type'] == QUIZ_SUBMITTED:
+                quiz = quizzes.get(event['quiz'])
+                course_id = quiz.course_id if quiz and not quiz.time_limit_minutes else None
+                if quiz and quiz.questions_per_attempt and key not in samples:
+                    course_id = None
+            else:
+                course_id = lesson_courses.get(event['lesson'])
+            if course_id not in enrollments:
+                results[key] = REJECTED
+                continue
+            results[key] = APPLIED
+            touched.add(course_id)
+
+            if event['type'] == LESSON_COMPLETED:
+                completions.append(LessonCompletion(user=user, lesson_id=event['lesson'], completed_at=event['at']))
+                record_event(user.pk, ActivityEvent.LESSON_COMPLETED, course_id=course_id, object_id=event['lesson'],
+                             timestamp=event['at'], offline=True)
+            elif event['type'] == QUIZ_SUBMITTED:
+                question_ids = samples.get(key, [])
+                if question_ids:
+                    graded = [by_id[i] for i in question_ids if i in by_id and by_id[i].quiz_id == quiz.pk]
+                else:
+                    graded = questions[quiz.pk]
+                percentage, _, _ = score_answers(quiz, graded, event['answers'])
+                attempts.append(UserQuizAttempt(user=user, quiz=quiz, score=percentage, passed=percentage >= quiz.pass_score,
+                                                question_ids=question_ids))
+                record_event(user.pk, ActivityEvent.QUIZ_SUBMITTED, course_id=course_id, object_id=quiz.pk,
+                             timestamp=event['at'], score=percentage, passed=percentage >= quiz.pass_score, offline=True)
+            elif course_id not in viewed or event['at'] >= viewed[course_id]['at']:
+                viewed[course_id] = event
+
+        # A lesson completed twice (e.g. on two devices) keeps its first completion
+        LessonCompletion.objects.bulk_create(completions, ignore_conflicts=True)
+        UserQuizAttempt.objects.bulk_create(attempts)
+        SyncEvent.objects.bulk_create([SyncEvent(user=user, key=key) for key in fresh if results[key] == APPLIED])
+
+        progressed = {lesson_courses[completion.lesson_id] for completion in completions}
+        totals, done = {}, {}
+        if progressed:
+            totals = dict(
+                Lesson.objects.filter(module__course__in=progressed)
+                .values('module__course').annotate(n=Count('id')).values_list('module__course', 'n')
+            )
+            done = dict(
+                LessonCompletion.objects.filter(user=user, lesson__module__course__in=progressed)
+                .values('lesson__module__course').annotate(n=Count('id')).values_list('lesson__module__course', 'n')
+            )
+
+        now = timezone.now()
+        changed = []
+        for course_id in touched:
+            enrollment = enrollments[course_id]
+            if totals.get(course_id):
+                # Never lower progress recorded some other way
+                enrollment.progress = max(enrollment.progress, done.get(course_id, 0) * 100 // totals[course_id])
+                enrollment.completed = enrollment.progress >= 100
+            if course_id in viewed:
+                enrollment.last_lesson_id = viewed[course_id]['lesson']
+            enrollment.last_accessed = now
+            changed.append(enrollment)
+        Enrollment.objects.bulk_update(changed, ['progress', 'completed', 'last_lesson', 'last_accessed'])
+    return results
+
+
+def changes_since(user, since):
+    enrollments = Enrollment.objects.filter(student=user)
+    completions = LessonCompletion.objects.filter(user=user)
+    attempts = UserQuizAttempt.objects.filter(user=user)
+    if since is not None:
+        enrollments = enrollments.filter(last_accessed__gte=since)
+        completions = completions.filter(synced_at__gte=since)
+        attempts = attempts.filter(timestamp__gte=since)
+    return {
+        'enrollments': list(enrollments.values('course_id', 'progress', 'completed', 'last_lesson_id')),
+        'completed_lessons': list(completions.values_list('lesson_id', flat=True)),
+        'quiz_attempts': list(attempts.values('id', 'quiz_id', 'score', 'passed', 'timestamp')),
+    }
@@ -1,3 +1,710 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from pptx import Presentation
+
+from config import db_router
+from config.cache import make_key
+from community.models import Message
+from config.testing import QueryBudgetMixin
+from users.models import User
+from . import access, banks, facets, gradebook, quiz_sessions, slides
+from .models import Certificate, Course, Module, Lesson, Enrollment, Question, Quiz, QuizSession, Tag, UserQuizAttempt
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pw', role='instructor')
+        cls.student = User.objects.create_user('student', password='pw')
+        cls.courses = []
+        for c in range(5):
+            course = Course.objects.create(title=f'Course {c}', description='...', instructor=cls.instructor)
+            for m in range(4):
+                module = Module.objects.create(course=course, title=f'Module {m}', order=m)
+                for l in range(5):
+                    Lesson.objects.create(module=module, title=f'Lesson {l}', order=l)
+            cls.courses.append(course)
+        Enrollment.objects.create(student=cls.student, course=cls.courses[0])
+
+    def setUp(self):
+        self.client.force_login(self.student)
+        # A flush falling due (FLUSH_INTERVAL into the test run) isn't the page's doing
+        access.get_access_buffer().flush()
+
+    def test_course_list(self):
+        self.assertQueryBudget(reverse('course_list'))
+
+    def test_course_detail(self):
+        self.assertQueryBudget(reverse('course_detail', args=[self.courses[0].pk]))
+
+    def test_lesson_detail(self):
+        lesson = Lesson.objects.filter(module__course=self.courses[0]).last()
+        self.assertQueryBudget(reverse('lesson_detail', args=[self.courses[0].pk, lesson.pk]))
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        instructor = User.objects.create_user('instructor', password='pw', role='instructor')
+        cls.student = User.objects.create_user('student', password='pw')
+        cls.course = Course.objects.create(title='Course', description='...', instructor=instructor)
+        cls.module = Module.objects.create(course=cls.course, title='Module', order=1)
+        cls.lesson = Lesson.objects.create(module=cls.module, title='Lesson', order=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertTemplateNotUsed(second, 'base.html')
+        return first
+
+    def test_anonymous_catalog_is_publicly_cacheable(self):
+        response = self.revalidate(reverse('course_list'))
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        self.assertTrue(response.has_header('Last-Modified'))
+        since = self.client.get(reverse('course_list'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+    def test_outline_edit_changes_course_etag(self):
+        url = reverse('course_detail', args=[self.course.pk])
+        etag = self.revalidate(url)['ETag']
+        catalog_etag = self.client.get(reverse('course_list'))['ETag']
+        self.lesson.title = 'Renamed'
+        self.lesson.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertNotEqual(self.client.get(reverse('course_list'))['ETag'], catalog_etag)
+
+    def test_tag_changes_change_catalog_etag(self):
+        url = reverse('course_list')
+        tag = Tag.objects.create(name='Python', slug='python')
+        for change in (
+            lambda: self.course.tags.add(tag),
+            lambda: Tag.objects.filter(pk=tag.pk).first().save(update_fields=['name']),
+            lambda: tag.courses.clear(),
+            lambda: tag.courses.add(self.course),
+            lambda: tag.delete(),
+        ):
+            etag = self.revalidate(url)['ETag']
+            change()
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_authenticated_pages_are_private_and_per_user(self):
+        url = reverse('course_detail', args=[self.course.pk])
+        anonymous_etag = self.client.get(url)['ETag']
+        self.client.force_login(self.student)
+        response = self.revalidate(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertNotEqual(response['ETag'], anonymous_etag)
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_lesson_page(self):
+        response = self.revalidate(reverse('lesson_detail', args=[self.course.pk, self.lesson.pk]))
+        # Holds a CSRF form, so never shared
+        self.assertIn('private', response['Cache-Control'])
+        other = Course.objects.create(title='Other', description='...', instructor=self.course.instructor)
+        self.assertEqual(self.client.get(reverse('lesson_detail', args=[other.pk, self.lesson.pk])).status_code, 404)
+
+    def test_new_csrf_token_misses_the_cached_lesson_page(self):
+        url = reverse('lesson_detail', args=[self.course.pk, self.lesson.pk])
+        self.client.force_login(self.student)
+        etag = self.revalidate(url)['ETag']
+        # Logging in again rotates the CSRF secret
+        self.client.logout()
+        self.client.force_login(self.student)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+
+class AccessTrackingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        instructor = User.objects.create_user('instructor', password='pw', role='instructor')
+        cls.student = User.objects.create_user('student', password='pw')
+        cls.courses = [
+            Course.objects.create(title=f'Course {n}', description='...', instructor=instructor) for n in range(3)
+        ]
+        cls.start = timezone.now() - timedelta(hours=1)
+        for course in cls.courses:
+            Enrollment.objects.create(student=cls.student, course=course)
+        # Course 2 is the most recent, then 1, then 0
+        for n, course in enumerate(cls.courses):
+            Enrollment.objects.filter(course=course).update(last_accessed=cls.start + timedelta(minutes=n))
+
+    def setUp(self):
+        cache.clear()
+        self.buffer = access.AccessBuffer(flush_interval=3600, threshold=60)
+        patcher = mock.patch.object(access, '_buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stored(self):
+        return dict(Enrollment.objects.values_list('course_id', 'last_accessed'))
+
+    def test_touches_are_coalesced_into_one_bulk_update(self):
+        later = self.start + timedelta(minutes=10)
+        for seconds in range(5):
+            self.buffer.record(self.student.pk, self.courses[0].pk, later + timedelta(seconds=seconds))
+        self.buffer.record(self.student.pk, self.courses[1].pk, later)
+        self.assertEqual(self.stored()[self.courses[0].pk], self.start)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.stored()[self.courses[0].pk], later + timedelta(seconds=4))
+
+    def test_recent_top_course_is_not_rewritten(self):
+        top = self.courses[2]
+        soon = self.start + timedelta(minutes=2, seconds=30)
+        self.buffer.record(self.student.pk, top.pk, soon)
+        self.assertEqual(self.buffer.flush(), 0)
+        # Once another course overtakes it, the touch is written to keep the order
+        self.buffer.record(self.student.pk, self.courses[0].pk, soon)
+        self.buffer.record(self.student.pk, top.pk, soon + timedelta(seconds=5))
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.stored()[top.pk], soon + timedelta(seconds=5))
+
+    @override_settings(ACCESS_TRACKING={'ENABLED': True, 'FLUSH_INTERVAL': 3600, 'THRESHOLD': 60})
+    def test_dashboard_order_includes_unflushed_lesson_views(self):
+        module = Module.objects.create(course=self.courses[0], title='Module', order=1)
+        lesson = Lesson.objects.create(module=module, title='Lesson', order=1)
+        self.client.force_login(self.student)
+        self.client.get(reverse('lesson_detail', args=[self.courses[0].pk, lesson.pk]))
+        self.assertEqual(self.stored()[self.courses[0].pk], self.start)
+
+        enrollments = self.client.get(reverse('dashboard')).context['enrollments']
+        self.assertEqual([e.course for e in enrollments], [self.courses[0], self.courses[2], self.courses[1]])
+        self.buffer.flush()
+        self.assertGreater(self.stored()[self.courses[0].pk], self.start + timedelta(minutes=2))
+
+
+class QuestionBankTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        instructor = User.objects.create_user('instructor', password='pw', role='instructor')
+        cls.student = User.objects.create_user('student', password='pw')
+        course = Course.objects.create(title='Course', description='...', instructor=instructor)
+        cls.quiz = Quiz.objects.create(course=course, title='Bank', questions_per_attempt=10, stratify_by='difficulty')
+        # 60 easy, 30 medium, 10 hard
+        Question.objects.bulk_create([
+            Question(quiz=cls.quiz, text=f'Q{n}', option_a='a', option_b='b', option_c='c', option_d='d',
+                     correct_option='A', difficulty='easy' if n < 60 else 'medium' if n < 90 else 'hard')
+            for n in range(100)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_allocation_is_proportional(self):
+        self.assertEqual(banks.allocate({'a': 60, 'b': 30, 'c': 10}, 10), {'a': 6, 'b': 3, 'c': 1})
+        self.assertEqual(sum(banks.allocate({'a': 5, 'b': 5, 'c': 5}, 4).values()), 4)
+        self.assertEqual(banks.allocate({'a': 2, 'b': 1}, 10), {'a': 2, 'b': 1})
+
+    def test_samples_are_stratified_and_served_from_cache(self):
+        banks.sample_questions(self.quiz)
+        with self.assertNumQueries(0):
+            sample = banks.sample_questions(self.quiz)
+        self.assertEqual(len(set(sample)), 10)
+        difficulties = list(Question.objects.filter(pk__in=sample).values_list('difficulty', flat=True))
+        self.assertEqual(sorted(difficulties), ['easy'] * 6 + ['hard'] + ['medium'] * 3)
+
+    def test_editing_a_question_refreshes_the_bank(self):
+        banks.sample_questions(self.quiz)
+        Question.objects.filter(quiz=self.quiz, difficulty='hard').first().delete()
+        self.assertEqual(len(banks.bank_strata(self.quiz)['hard']), 9)
+
+    def test_attempt_is_graded_on_its_own_sample(self):
+        self.client.force_login(self.student)
+        url = reverse('take_quiz', args=[self.quiz.pk])
+        page = self.client.get(url).context
+        asked = page['questions']
+        self.assertEqual(len(asked), 10)
+        # Reloading keeps the same draw
+        self.assertEqual(list(self.client.get(url).context['questions']), asked)
+
+        answers = {f'question_{question.pk}': 'A' for question in asked[:7]}
+        answers['session'] = page['session'].pk
+        # An answer to a question outside the sample doesn't count
+        outside = Question.objects.exclude(pk__in=[q.pk for q in asked]).first()
+        answers[f'question_{outside.pk}'] = 'A'
+        response = self.client.post(url, answers)
+        self.assertEqual((response.context['score'], response.context['total']), (7, 10))
+        self.assertEqual(UserQuizAttempt.objects.get().question_ids, [question.pk for question in asked])
+        # Submitting the same session again shows its result without grading it twice
+        self.assertEqual(self.client.post(url, answers).context['score'], 7)
+        self.assertEqual(UserQuizAttempt.objects.count(), 1)
+        self.assertNotEqual(self.client.get(url).context['session'], page['session'])
+
+
+class QuizSessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        instructor = User.objects.create_user('instructor', password='pw', role='instructor')
+        cls.students = [User.objects.create_user(f'student{n}', password='pw') for n in range(3)]
+        course = Course.objects.create(title='Course', description='...', instructor=instructor)
+        cls.quiz = Quiz.objects.create(course=course, title='Exam', pass_score=50, time_limit_minutes=30)
+        cls.questions = [
+            Question.objects.create(quiz=cls.quiz, text=f'Q{n}', option_a='a', option_b='b', option_c='c',
+                                    option_d='d', correct_option='A')
+            for n in range(4)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.students[0])
+        self.url = reverse('take_quiz', args=[self.quiz.pk])
+
+    def start(self):
+        session = self.client.get(self.url).context['session']
+        return session, reverse('autosave_quiz', args=[session.pk])
+
+    def autosave(self, url, answers):
+        return self.client.post(url, {'answers': answers}, content_type='application/json')
+
+    def test_autosave_is_one_update_and_survives_a_reload(self):
+        session, autosave_url = self.start()
+        # session + user, the attempt's question ids, then the UPDATE
+        with self.assertNumQueries(5):
+            response = self.autosave(autosave_url, {str(self.questions[0].pk): 'A', str(self.questions[1].pk): 'C'})
+        self.assertEqual(response.status_code, 200)
+        questions = self.client.get(self.url).context['questions']
+        self.assertEqual([question.saved for question in questions], ['A', 'C', None, None])
+        self.assertEqual(self.autosave(autosave_url, {'x': 'A'}).status_code, 400)
+        # Unicode digits pass str.isdigit() but not int(); questions from elsewhere are refused too
+        self.assertEqual(self.autosave(autosave_url, {'²': 'A'}).status_code, 400)
+        self.assertEqual(self.autosave(autosave_url, {'999999': 'A'}).status_code, 400)
+        session.refresh_from_db()
+        self.assertEqual(session.answers, {str(self.questions[0].pk): 'A', str(self.questions[1].pk): 'C'})
+
+    def test_session_claimed_by_the_sweep_before_its_attempt_is_saved(self):
+        session, _ = self.start()
+        # The sweep has claimed the session but not yet written the attempt
+        QuizSession.objects.filter(pk=session.pk).update(
+            deadline=timezone.now() - timedelta(hours=1), submitted_at=timezone.now(),
+            answers={str(self.questions[0].pk): 'A'},
+        )
+        response = self.client.post(self.url, {'session': session.pk, f'question_{self.questions[1].pk}': 'A'})
+        self.assertEqual((response.context['percentage'], response.context['passed']), (25, False))
+
+        session, _ = self.start()
+        QuizSession.objects.filter(pk=session.pk).update(deadline=timezone.now() - timedelta(hours=1))
+
+        def swept(session, answers=None):
+            # Claimed by the sweep a moment earlier, which hasn't saved the attempt yet
+            QuizSession.objects.filter(pk=session.pk).update(submitted_at=timezone.now())
+
+        with mock.patch.object(quiz_sessions, 'submit', side_effect=swept):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.context['session'].pk, session.pk)
+
+    def test_sweep_survives_unreadable_answers(self):
+        sessions = []
+        for student in self.students[:2]:
+            self.client.force_login(student)
+            sessions.append(self.start()[0])
+        # Saved before keys were checked
+        QuizSession.objects.filter(pk=sessions[0].pk).update(answers={'²': 'A', str(self.questions[0].pk): 'A'})
+        QuizSession.objects.filter(pk=sessions[1].pk).update(answers=['A'])
+        QuizSession.objects.update(deadline=timezone.now() - timedelta(minutes=5))
+        with self.assertLogs('courses.quiz_sessions', 'ERROR'):
+            self.assertEqual(quiz_sessions.submit_expired(), 2)
+        self.assertEqual(
+            sorted(UserQuizAttempt.objects.values_list('user__username', 'score')),
+            [('student0', 25), ('student1', 0)],
+        )
+        self.assertFalse(QuizSession.objects.filter(attempt__isnull=True).exists())
+
+    def test_submit_merges_form_over_saved_answers(self):
+        session, autosave_url = self.start()
+        self.autosave(autosave_url, {str(self.questions[0].pk): 'A', str(self.questions[1].pk): 'B'})
+        response = self.client.post(self.url, {'session': session.pk, f'question_{self.questions[1].pk}': 'A'})
+        self.assertEqual((response.context['score'], response.context['total']), (2, 4))
+        self.assertEqual(self.autosave(autosave_url, {}).status_code, 409)
+
+    def test_sweep_grades_expired_sessions_in_a_batch(self):
+        for student in self.students:
+            self.client.force_login(student)
+            _, autosave_url = self.start()
+            self.autosave(autosave_url, {str(question.pk): 'A' for question in self.questions[:3]})
+        QuizSession.objects.update(deadline=timezone.now() - timedelta(minutes=5))
+        # A late autosave is refused, and the late submit only counts what was saved in time
+        self.assertEqual(self.autosave(autosave_url, {str(self.questions[3].pk): 'A'}).status_code, 409)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(quiz_sessions.submit_expired(batch_size=2), 3)
+        # One read of the questions and one insert of attempts per batch
+        statements = [query['sql'] for query in queries.captured_queries]
+        self.assertEqual(sum(sql.startswith('INSERT INTO "courses_userquizattempt"') for sql in statements), 2)
+        self.assertEqual(sum('FROM "courses_question"' in sql for sql in statements), 2)
+        self.assertEqual(sorted(UserQuizAttempt.objects.values_list('score', flat=True)), [75, 75, 75])
+        self.assertFalse(QuizSession.objects.filter(attempt__isnull=True).exists())
+        self.assertEqual(quiz_sessions.submit_expired(), 0)
+
+        # The learner's own late submit finds it already graded
+        session = QuizSession.objects.get(user=self.students[2])
+        response = self.client.post(self.url, {'session': session.pk, f'question_{self.questions[3].pk}': 'A'})
+        self.assertEqual(response.context['percentage'], 75)
+        self.assertEqual(UserQuizAttempt.objects.count(), 3)
+
+
+class FacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ada = User.objects.create_user('ada', password='pw', role='instructor')
+        cls.bob = User.objects.create_user('bob', password='pw', role='instructor')
+        cls.python = Tag.objects.create(name='Python', slug='python')
+        spec = [
+            ('Django', 'Development', 0, cls.ada, 12),
+            ('React', 'Development', 49, cls.bob, 3),
+            ('Pandas', 'Data Science', 0, cls.ada, 40),
+            ('Statistics', 'Data Science', 29, cls.bob, 5),
+        ]
+        cls.courses = {}
+        for title, category, price, instructor, lessons in spec:
+            course = Course.objects.create(title=title, description='...', category=category, price=price, instructor=instructor)
+            module = Module.objects.create(course=course, title='Module', order=1)
+            Lesson.objects.bulk_create([Lesson(module=module, title=f'L{n}', order=n) for n in range(lessons)])
+            cls.courses[title] = course
+        cls.courses['Django'].tags.add(cls.python)
+        cls.courses['Pandas'].tags.add(cls.python)
+
+    def setUp(self):
+        cache.clear()
+
+    def filter(self, **selected):
+        ids, facet_values = facets.filter_courses(facets.get_index(), {k: set(v) for k, v in selected.items()})
+        counts = {facet: {value: count for value, _, count, _ in values} for facet, _, values in facet_values}
+        return {Course.objects.get(pk=pk).title for pk in ids}, counts
+
+    def test_intersections_and_counts(self):
+        titles, counts = self.filter(category=['Development'], price=['free'])
+        self.assertEqual(titles, {'Django'})
+        # Each facet's counts apply the other facets' choices, not its own
+        self.assertEqual(counts['category'], {'Development': 1, 'Data Science': 1})
+        self.assertEqual(counts['price'], {'free': 1, 'paid': 1})
+        self.assertEqual(counts['length'], {'medium': 1})
+        self.assertEqual(self.filter(tag=['python'], length=['long', 'short'])[0], {'Pandas'})
+        self.assertEqual(self.filter(instructor=[str(self.bob.pk)], category=['Development', 'Data Science'])[0],
+                         {'React', 'Statistics'})
+
+    def test_filtering_runs_from_the_cache(self):
+        facets.get_index()
+        with self.assertNumQueries(0):
+            facets.filter_courses(facets.get_index(), {'price': {'paid'}})
+
+    def test_course_changes_update_the_index_in_place(self):
+        facets.get_index()
+        with mock.patch.object(facets, 'build_index', side_effect=AssertionError('rebuilt')):
+            react = self.courses['React']
+            react.price = 0
+            react.save()
+            react.tags.add(self.python)
+            Lesson.objects.create(module=react.modules.get(), title='Extra', order=99)
+            titles, counts = self.filter(price=['free'], tag=['python'])
+        self.assertEqual(titles, {'Django', 'React', 'Pandas'})
+        self.assertEqual(counts['length'], {'short': 1, 'medium': 1, 'long': 1})
+
+        self.courses['Statistics'].delete()
+        self.assertEqual(self.filter(category=['Data Science'])[0], {'Pandas'})
+
+    def test_colliding_updates_are_not_lost(self):
+        index = facets.get_index()
+        # Another writer is half way through update_course: bumped and holding the lock
+        generation = facets._bump_generation()
+        cache.add(make_key('facets', 'lock'), 1)
+        react = self.courses['React']
+        react.price = 0
+        react.save()
+        # ...and then stores the index as it read it, before this change
+        index['generation'] = generation
+        cache.set(make_key('facets', 'index'), index, None)
+        cache.delete(make_key('facets', 'lock'))
+        self.assertEqual(self.filter(price=['free'])[0], {'Django', 'React', 'Pandas'})
+
+    def test_change_during_a_cold_build_is_not_lost(self):
+        build_index = facets.build_index
+
+        def build_then_change():
+            index = build_index()
+            if not hasattr(self, 'changed'):
+                self.changed = True
+                Course.objects.filter(pk=self.courses['React'].pk).update(price=0)
+                facets.update_course(self.courses['React'].pk)
+            return index
+
+        with mock.patch.object(facets, 'build_index', build_then_change):
+            # The first build is served as it was read
+            self.assertEqual(self.filter(price=['free'])[0], {'Django', 'Pandas'})
+            self.assertEqual(self.filter(price=['free'])[0], {'Django', 'React', 'Pandas'})
+
+    def test_catalog_page_filters(self):
+        response = self.client.get(reverse('course_list'), {'category': 'Data Science', 'price': 'paid'})
+        self.assertEqual([course.title for course in response.context['courses']], ['Statistics'])
+        self.assertContains(response, 'Clear filters')
+
+    def test_course_ids_reads_every_set_bit(self):
+        self.assertEqual(facets.course_ids((1 << 3) | (1 << 64) | (1 << 200000)), [3, 64, 200000])
+        self.assertEqual(facets.course_ids(0), [])
+
+
+class SlideDeckTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pw', role='instructor')
+        cls.course = Course.objects.create(title='Intro to Django', description='...', instructor=cls.instructor)
+        for order, lessons in [(1, ['Setup', 'Models']), (2, ['Views'])]:
+            module = Module.objects.create(course=cls.course, title=f'Part {order}', order=order)
+            for n, title in enumerate(lessons):
+                Lesson.objects.create(module=module, title=title, order=n, content='First point\n\nSecond point')
+        cls.quiz = Quiz.objects.create(course=cls.course, title='Check')
+        for n in range(2):
+            Question.objects.create(quiz=cls.quiz, text=f'Q{n}', option_a='a', option_b='b', option_c='c',
+                                    option_d='d', correct_option='B')
+
+    def setUp(self):
+        self.files = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.files)
+        storages = {
+            **settings.STORAGES,
+            'slide_decks': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': self.files}},
+        }
+        override = override_settings(STORAGES=storages)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_deck_outline(self):
+        with self.assertNumQueries(5):
+            course = slides.load_course(self.course.pk)
+        prs = slides.build_deck(course)
+        self.assertEqual([slide.shapes.title.text for slide in prs.slides], [
+            'Intro to Django', 'Module 1: Part 1', 'Setup', 'Models', 'Module 2: Part 2', 'Views',
+            'Quiz: Check', 'Check: question 1', 'Check: question 2',
+        ])
+        points = [p.text for p in prs.slides[8].placeholders[1].text_frame.paragraphs]
+        self.assertEqual(points, ['Q1', 'A. a', 'B. b  ✓', 'C. c', 'D. d'])
+
+    def test_export_skips_unchanged_courses(self):
+        out = StringIO()
+        call_command('export_course_decks', workers=1, stdout=out)
+        self.assertIn('Exported 1 deck(s), 9 slides', out.getvalue())
+        self.assertEqual(slides.stale_courses(), [])
+        call_command('export_course_decks', workers=1, stdout=out)
+        self.assertIn('All decks are up to date.', out.getvalue())
+
+        # Quiz edits change the deck too
+        Question.objects.filter(quiz=self.quiz).first().delete()
+        self.assertEqual(slides.stale_courses(), [self.course.pk])
+
+    def test_download(self):
+        self.client.force_login(self.instructor)
+        response = self.client.get(reverse('course_slides', args=[self.course.pk]))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="intro-to-django.pptx"')
+        self.assertEqual(len(Presentation(BytesIO(b''.join(response.streaming_content))).slides), 9)
+        # Served from storage the second time
+        with mock.patch.object(slides, 'export_course', side_effect=AssertionError('rebuilt')):
+            self.assertEqual(self.client.get(reverse('course_slides', args=[self.course.pk])).status_code, 200)
+
+        User.objects.create_user('student', password='pw')
+        self.client.login(username='student', password='pw')
+        self.assertRedirects(self.client.get(reverse('course_slides', args=[self.course.pk])), reverse('dashboard'),
+                             fetch_redirect_response=False)
+
+
+class GradebookTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('instructor', password='pw', role='instructor')
+        cls.course = Course.objects.create(title='Algebra', description='...', instructor=cls.instructor)
+        other = Course.objects.create(title='Other', description='...', instructor=cls.instructor)
+        cls.basics = Quiz.objects.create(course=cls.course, title='Basics')
+        cls.final = Quiz.objects.create(course=cls.course, title='Final')
+        elsewhere = Quiz.objects.create(course=other, title='Elsewhere')
+        ada, bob, dan, cy = (User.objects.create_user(name, email=f'{name}@example.com', password='pw')
+                             for name in ['ada', 'bob', 'dan', 'cy'])
+        Enrollment.objects.create(student=ada, course=cls.course, progress=100, completed=True)
+        Enrollment.objects.create(student=cy, course=cls.course, progress=0)
+        Enrollment.objects.create(student=bob, course=cls.course, progress=40)
+        UserQuizAttempt.objects.bulk_create([
+            UserQuizAttempt(user=ada, quiz=cls.basics, score=40, passed=False),
+            UserQuizAttempt(user=ada, quiz=cls.basics, score=90, passed=True),
+            UserQuizAttempt(user=ada, quiz=cls.final, score=75, passed=True),
+            UserQuizAttempt(user=ada, quiz=elsewhere, score=100, passed=True),
+            UserQuizAttempt(user=bob, quiz=cls.basics, score=60, passed=False),
+            # Not enrolled (any more): skipped
+            UserQuizAttempt(user=dan, quiz=cls.basics, score=10, passed=False),
+        ])
+        Certificate.objects.create(user=ada, course=cls.course)
+
+    def test_two_queries_for_every_row(self):
+        quizzes = gradebook.course_quizzes(self.course)
+        self.assertEqual(gradebook.header(quizzes), [
+            'Student', 'Email', 'Progress (%)', 'Completed',
+            'Basics: best score', 'Basics: passed', 'Final: best score', 'Final: passed', 'Certificate issued',
+        ])
+        with self.assertNumQueries(2):
+            rows = list(gradebook.gradebook_rows(self.course, quizzes))
+        today = timezone.localdate().isoformat()
+        self.assertEqual(rows, [
+            ['ada', 'ada@example.com', 100, 'Yes', 90, 'Yes', 75, 'Yes', today],
+            ['bob', 'bob@example.com', 40, 'No', 60, 'No', None, None, None],
+            ['cy', 'cy@example.com', 0, 'No', None, None, None, None, None],
+        ])
+
+    def test_csv_export(self):
+        self.client.force_login(self.instructor)
+        response = self.client.get(reverse('export_gradebook', args=[self.course.pk, 'csv']))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="algebra-gradebook.csv"')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[2], 'bob,bob@example.com,40,No,60,No,,,')
+
+    async def test_export_streams_under_asgi(self):
+        await self.async_client.aforce_login(self.instructor)
+        response = await self.async_client.get(reverse('export_gradebook', args=[self.course.pk, 'csv']))
+        # An async iterator, not a sync one ASGI would read to the end first
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual(lines[2], 'bob,bob@example.com,40,No,60,No,,,')
+
+    def test_xlsx_export(self):
+        self.client.force_login(self.instructor)
+        response = self.client.get(reverse('export_gradebook', args=[self.course.pk, 'xlsx']))
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as workbook:
+            sheet = ElementTree.fromstring(workbook.read('xl/worksheets/sheet1.xml'))
+        ns = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        bob = sheet.findall('.//s:row', ns)[2]
+        self.assertEqual([''.join(cell.itertext()) for cell in bob.findall('s:c', ns)],
+                         ['bob', 'bob@example.com', '40', 'No', '60', 'No', '', '', ''])
+
+    def test_page_is_for_the_instructor(self):
+        self.client.force_login(self.instructor)
+        response = self.client.get(reverse('course_gradebook', args=[self.course.pk]))
+        self.assertEqual([row[0] for row in response.context['rows']], ['ada', 'bob', 'cy'])
+        self.assertEqual(self.client.get(reverse('export_gradebook', args=[self.course.pk, 'pdf'])).status_code, 404)
+
+        self.client.login(username='bob', password='pw')
+        self.assertRedirects(self.client.get(reverse('course_gradebook', args=[self.course.pk])), reverse('dashboard'),
+                             fetch_redirect_response=False)
+
+
+class GenerateDatasetTests(TestCase):
+    SIZES = ['--users', '6', '--instructors', '2', '--courses', '3', '--modules', '2', '--lessons', '2',
+             '--quizzes', '1', '--questions', '3', '--enrollments', '10', '--attempts', '5',
+             '--channels', '2', '--messages', '20', '--days', '10', '--batch-size', '4']
+
+    def generate(self, *args):
+        call_command('generate_dataset', *self.SIZES, *args, stdout=StringIO())
+
+    def snapshot(self):
+        return {
+            'users': sorted(User.objects.values_list('username', 'xp')),
+            'courses': sorted(Course.objects.values_list('title', 'price')),
+            'lessons': Lesson.objects.count(),
+            'questions': Question.objects.count(),
+            'enrollments': Enrollment.objects.count(),
+            'attempts': UserQuizAttempt.objects.count(),
+            'messages': sorted(Message.objects.values_list('content', flat=True)),
+        }
+
+    def test_sizes_and_history(self):
+        self.generate()
+        self.assertEqual(User.objects.filter(username__startswith='gen_student').count(), 6)
+        self.assertEqual(Lesson.objects.count(), 3 * 2 * 2)
+        self.assertEqual(Question.objects.count(), 3 * 3)
+        self.assertEqual(Enrollment.objects.count(), 10)
+        self.assertEqual(Message.objects.count(), 20)
+        # Backdated over --days, with message ids growing with time
+        oldest = timezone.now() - timedelta(days=10, minutes=1)
+        self.assertFalse(Enrollment.objects.filter(date_enrolled__lt=oldest).exists())
+        timestamps = list(Message.objects.order_by('id').values_list('timestamp', flat=True))
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertLess(timestamps[0], timezone.now() - timedelta(days=9))
+
+    def test_same_seed_same_data(self):
+        self.generate()
+        first = self.snapshot()
+        self.generate('--flush')
+        self.assertEqual(self.snapshot(), first)
+
+    def test_refuses_to_generate_twice(self):
+        self.generate()
+        out = StringIO()
+        call_command('generate_dataset', *self.SIZES, stdout=out)
+        self.assertIn('rerun with --flush', out.getvalue())
+        self.assertEqual(Message.objects.count(), 20)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'], REPLICA_STICKY_SECONDS=5, REPLICA_MAX_LAG=2)
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = db_router.ReplicaRouter()
+        patcher = mock.patch.object(db_router, 'replica_lag', return_value=0.0)
+        self.lag = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, method='get', cookies=None, write=False):
+        """Run a request through the middleware, returning (db used for reads, response)."""
+        seen = {}
+
+        def view(request):
+            if write:
+                self.router.db_for_write(Enrollment)
+            seen['db'] = self.router.db_for_read(Course)
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies or {})
+        response = db_router.ReplicaPinningMiddleware(view)(request)
+        return seen['db'], response
+
+    def test_reads_use_replica(self):
+        db, response = self.request()
+        self.assertEqual(db, 'replica_0')
+        self.assertNotIn(db_router.PIN_COOKIE, response.cookies)
+
+    def test_write_pins_request_and_following_requests(self):
+        db, response = self.request(write=True)
+        self.assertEqual(db, 'default')
+        cookie = response.cookies[db_router.PIN_COOKIE]
+        db, _ = self.request(cookies={db_router.PIN_COOKIE: cookie.value})
+        self.assertEqual(db, 'default')
+
+    def test_expired_pin_returns_to_replica(self):
+        db, _ = self.request(cookies={db_router.PIN_COOKIE: '1000'})
+        self.assertEqual(db, 'replica_0')
+
+    def test_unsafe_methods_read_primary(self):
+        db, _ = self.request(method='post')
+        self.assertEqual(db, 'default')
+
+    def test_lagging_or_unreachable_replica_falls_back(self):
+        for lag in (30.0, None):
+            self.lag.return_value = lag
+            with self.subTest(lag=lag):
+                self.assertEqual(self.request()[0], 'default')
+
+    def test_use_primary(self):
+        with db_router.use_primary():
+            self.assertEqual(self.router.db_for_read(Course), 'default')
@@ -8,9 +8,13 @@ urlpatterns = [
     path('create/', views.create_course, name='create_course'),
     path('edit/<int:pk>/', views.update_course, name='update_course'),
     path('manage/<int:pk>/', views.manage_course_content, name='manage_course_content'),
+    path('<int:pk>/slides/', views.course_slides, name='course_slides'),
+    path('<int:pk>/gradebook/', views.course_gradebook, name='course_gradebook'),
+    path('<int:pk>/gradebook/<str:fmt>/', views.export_gradebook, name='export_gradebook'),
     path('course/<int:course_pk>/add_module/', views.add_module, name='add_module'),
     path('module/<int:module_pk>/add_lesson/', views.add_lesson, name='add_lesson'),
     path('quiz/<int:quiz_id>/', views.take_quiz, name='take_quiz'),
+    path('quiz/session/<int:pk>/autosave/', views.autosave_quiz, name='autosave_quiz'),
     path('course/<int:course_pk>/add_quiz/', views.add_quiz, name='add_quiz'),
     path('quiz/<int:quiz_pk>/add_question/', views.add_question, name='add_question'),
     path('quiz/<int:quiz_pk>/add_question/', views.add_question, name='add_question'),
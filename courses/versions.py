@@ -0,0 +1,58 @@
+"""
+Cheap version lookups for conditional GET on the catalog and course pages
+(see config/conditional.py).
+
+A course's version is its `updated_at`, which also moves whenever its outline
+or tags change (modules, lessons and tags touch their courses, see
+signals.py). The catalog
+version is the newest `updated_at` plus the course count, kept in the cache
+until a course changes.
+"""
+from django.db.models import Count, Exists, Max, OuterRef
+from django.utils import timezone
+
+from config.cache import cache_delete, cache_get, cache_set
+from .models import Course, Enrollment
+
+
+def touch_course(course_id):
+    Course.objects.filter(pk=course_id).update(updated_at=timezone.now())
+    invalidate_catalog()
+
+
+def touch_courses(courses):
+    """touch_course() for every course in a queryset, e.g. all carrying a renamed tag."""
+    courses.update(updated_at=timezone.now())
+    invalidate_catalog()
+
+
+def invalidate_catalog():
+    cache_delete('courses', 'catalog')
+
+
+def catalog_version(request):
+    version = cache_get('courses', 'catalog')
+    if version is None:
+        latest = Course.objects.aggregate(updated=Max('updated_at'), count=Count('id'))
+        if latest['updated'] is None:
+            return None
+        version = (latest['updated'], latest['count'])
+        cache_set('courses', 'catalog', value=version, timeout=None)
+    return version
+
+
+def course_version(request, pk):
+    """(updated_at, enrolled) for the course page; enrollment changes what it shows."""
+    course = Course.objects.filter(pk=pk)
+    if request.user.is_authenticated:
+        enrolled = Exists(Enrollment.objects.filter(course=OuterRef('pk'), student=request.user))
+        row = course.annotate(enrolled=enrolled).values_list('updated_at', 'enrolled').first()
+    else:
+        row = course.values_list('updated_at').first()
+        row = row and (row[0], False)
+    return row
+
+
+def lesson_version(request, course_pk, lesson_pk):
+    updated = Course.objects.filter(pk=course_pk).values_list('updated_at', flat=True).first()
+    return updated and (updated, lesson_pk)
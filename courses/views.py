@@ -1,9 +1,25 @@
+import json
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import Course, Module, Lesson, Enrollment, Quiz, Question, UserQuizAttempt, Certificate
+from django.views.decorators.http import require_POST
+from .models import Course, Module, Lesson, Enrollment, Quiz, QuizSession, Question, UserQuizAttempt, Certificate
+from . import facets, gradebook, quiz_sessions
+from .logic import score_answers
 from .forms import CourseForm, ModuleForm, LessonForm, QuizForm, QuestionForm
 from django.db.models import Count
+from django.core.files.storage import storages
+from django.core.paginator import Paginator
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.utils.text import slugify
+from config.conditional import conditional_page
+from config.streaming import streaming_content
+from config.xlsx import CONTENT_TYPE as XLSX_CONTENT_TYPE, stream_xlsx
+from .versions import catalog_version, course_version, lesson_version
+from .access import tracks_access
+
+# An autosave carries every answer of the attempt, a few bytes each
+AUTOSAVE_MAX_BYTES = 32 * 1024
 
 # ... (Existing views)
 
@@ -76,23 +92,27 @@ def take_quiz(request, quiz_id):
     # (Simplified: assumes public for now or relies on dashboard link visibility)
     
     if request.method == 'POST':
-        score = 0
-        total = quiz.questions.count()
-        
-        for question in quiz.questions.all():
-            selected = request.POST.get(f'question_{question.id}')
-            if selected == question.correct_option:
-                score += 1
-                
-        percentage = int((score / total) * 100) if total > 0 else 0
-        passed = percentage >= quiz.pass_score
-        
-        UserQuizAttempt.objects.create(
-            user=request.user,
-            quiz=quiz,
-            score=percentage,
-            passed=passed
+        session_pk = request.POST.get('session', '')
+        session = get_object_or_404(
+            QuizSession.objects.select_related('quiz'), pk=int(session_pk) if session_pk.isdigit() else 0,
+            user=request.user, quiz=quiz,
         )
+        answers = {
+            int(key[len('question_'):]): value
+            for key, value in request.POST.items()
+            if key.startswith('question_') and quiz_sessions.is_question_id(key[len('question_'):])
+        }
+        graded = quiz_sessions.submit(session, answers)
+        if graded is None:
+            # Already in: submitted twice, or by the sweep after the deadline
+            session.refresh_from_db()
+            percentage, score, total = score_answers(quiz, quiz_sessions.session_questions(session), quiz_sessions.parse_answers(session.answers))
+            # The sweep may not have saved its attempt yet; it grades the same answers
+            passed = session.attempt.passed if session.attempt else percentage >= quiz.pass_score
+            percentage = session.attempt.score if session.attempt else percentage
+        else:
+            attempt, score, total = graded
+            percentage, passed = attempt.score, attempt.passed
         
         context = {
             'quiz': quiz,
@@ -103,7 +123,36 @@ def take_quiz(request, quiz_id):
         }
         return render(request, 'courses/quiz_result.html', context)
         
-    return render(request, 'courses/quiz_take.html', {'quiz': quiz})
+    session, expired = quiz_sessions.open_session(request.user, quiz)
+    if expired is not None:
+        messages.info(request, f"Time ran out on your last attempt; it was submitted with a score of {expired.attempt.score}%.")
+    questions = quiz_sessions.session_questions(session)
+    for question in questions:
+        question.saved = session.answers.get(str(question.pk))
+    return render(request, 'courses/quiz_take.html', {'quiz': quiz, 'questions': questions, 'session': session})
+
+
+@login_required
+@require_POST
+def autosave_quiz(request, pk):
+    if len(request.body) > AUTOSAVE_MAX_BYTES:
+        return JsonResponse({'error': 'Too many answers'}, status=413)
+    try:
+        answers = json.loads(request.body)['answers']
+        valid = (
+            isinstance(answers, dict) and len(answers) <= quiz_sessions.MAX_ANSWERS
+            and all(quiz_sessions.is_question_id(key) and value in ('A', 'B', 'C', 'D') for key, value in answers.items())
+        )
+    except (ValueError, KeyError, TypeError, AttributeError):
+        valid = False
+    if not valid:
+        return JsonResponse({'error': 'Expected {"answers": {"<question id>": "A"-"D"}}'}, status=400)
+    answerable = quiz_sessions.answerable_questions(pk, request.user)
+    if answerable is not None and not {int(key) for key in answers} <= answerable:
+        return JsonResponse({'error': 'Answers must be for the questions of this attempt.'}, status=400)
+    if answerable is None or not quiz_sessions.save_answers(pk, request.user, answers):
+        return JsonResponse({'error': 'This attempt has already been submitted.'}, status=409)
+    return JsonResponse({'status': 'ok'})
 
 
 # ... (Existing views: course_list, course_detail, lesson_detail)
@@ -120,6 +169,7 @@ def create_course(request):
             course = form.save(commit=False)
             course.instructor = request.user
             course.save()
+            form.save_m2m()
             messages.success(request, f"Course '{course.title}' created! Add modules now.")
             return redirect('manage_course_content', pk=course.pk)
     else:
@@ -127,6 +177,20 @@ def create_course(request):
     
     return render(request, 'courses/course_form.html', {'form': form, 'title': 'Create New Course'})
 
+@login_required
+def course_slides(request, pk):
+    course = get_object_or_404(Course, pk=pk)
+    if request.user != course.instructor and request.user.role != 'admin' and not request.user.is_superuser:
+        return redirect('dashboard')
+    # python-pptx is only loaded by the views that need it
+    from . import slides
+
+    deck = slides.current_deck(course) or slides.export_course(course.pk)
+    return FileResponse(
+        storages[slides.DECK_STORAGE].open(deck.path, 'rb'),
+        as_attachment=True, filename=f"{slugify(course.title) or 'course'}.pptx",
+    )
+
 @login_required
 def update_course(request, pk):
     course = get_object_or_404(Course, pk=pk)
@@ -153,6 +217,42 @@ def manage_course_content(request, pk):
     
     return render(request, 'courses/manage_content.html', {'course': course})
 
+GRADEBOOK_PAGE_SIZE = 50
+
+@login_required
+def course_gradebook(request, pk):
+    course = get_object_or_404(Course, pk=pk)
+    if request.user != course.instructor and request.user.role != 'admin' and not request.user.is_superuser:
+        return redirect('dashboard')
+
+    quizzes = gradebook.course_quizzes(course)
+    page = Paginator(gradebook.student_ids(course), GRADEBOOK_PAGE_SIZE).get_page(request.GET.get('page'))
+    return render(request, 'courses/gradebook.html', {
+        'course': course,
+        'header': gradebook.header(quizzes),
+        'rows': list(gradebook.gradebook_rows(course, quizzes, page.object_list)),
+        'page': page,
+    })
+
+@login_required
+def export_gradebook(request, pk, fmt):
+    if fmt not in ('csv', 'xlsx'):
+        raise Http404
+    course = get_object_or_404(Course, pk=pk)
+    if request.user != course.instructor and request.user.role != 'admin' and not request.user.is_superuser:
+        return redirect('dashboard')
+
+    quizzes = gradebook.course_quizzes(course)
+    rows = gradebook.gradebook_rows(course, quizzes)
+    filename = f"{slugify(course.title) or 'course'}-gradebook.{fmt}"
+    if fmt == 'xlsx':
+        chunks, content_type = stream_xlsx(gradebook.header(quizzes), rows, 'Gradebook'), XLSX_CONTENT_TYPE
+    else:
+        chunks, content_type = gradebook.stream_csv(gradebook.header(quizzes), rows), 'text/csv'
+    response = StreamingHttpResponse(streaming_content(request, chunks), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 @login_required
 def add_module(request, course_pk):
     course = get_object_or_404(Course, pk=course_pk)
@@ -226,23 +326,36 @@ def edit_lesson(request, pk):
     return render(request, 'courses/simple_form.html', {'form': form, 'title': f'Edit Lesson: {lesson.title}'})
 
 
+@conditional_page(catalog_version)
 def course_list(request):
     courses = Course.objects.all().select_related('instructor').annotate(modules_count=Count('modules'))
-    return render(request, 'courses/course_list.html', {'courses': courses})
+    selected = facets.parse_selection(request.GET)
+    course_ids, facet_values = facets.filter_courses(facets.get_index(), selected)
+    if selected:
+        courses = courses.filter(pk__in=course_ids)
+    return render(request, 'courses/course_list.html', {
+        'courses': courses,
+        'facets': facet_values,
+        'filtered': bool(selected),
+    })
 
+@conditional_page(course_version)
 def course_detail(request, pk):
-    course = get_object_or_404(Course, pk=pk)
-    is_enrolled = False
-    if request.user.is_authenticated:
-        is_enrolled = Enrollment.objects.filter(student=request.user, course=course).exists()
+    # Outline (modules -> lessons) in two queries instead of one per module
+    course = get_object_or_404(Course.objects.select_related('instructor').prefetch_related('modules__lessons'), pk=pk)
+    # Enrollment is part of the page version, looked up by conditional_page
+    is_enrolled = bool(request.page_version and request.page_version[1])
     return render(request, 'courses/course_detail.html', {'course': course, 'is_enrolled': is_enrolled})
 
+@tracks_access
+@conditional_page(lesson_version, public=False)
 def lesson_detail(request, course_pk, lesson_pk):
-    course = get_object_or_404(Course, pk=course_pk)
-    lesson = get_object_or_404(Lesson, pk=lesson_pk)
-    # Ensure lesson belongs to course
-    # (Simplified for now, in production check relation)
-    
+    course = get_object_or_404(Course.objects.prefetch_related('modules__lessons'), pk=course_pk)
+    # Taken from the prefetched outline, which also ensures the lesson belongs to this course
+    lesson = next((l for module in course.modules.all() for l in module.lessons.all() if l.pk == lesson_pk), None)
+    if lesson is None:
+        raise Http404("Lesson not found in this course.")
+
     return render(request, 'courses/lesson_detail.html', {
         'course': course, 
         'lesson': lesson
@@ -0,0 +1,38 @@
+import csv
+import io
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.storage import storages
+from django.utils import timezone
+
+from jobs.queue import FILE_STORAGE, job
+
+User = get_user_model()
+
+
+@job
+def export_users_csv():
+    """Write every user to a CSV file in job storage; the owner downloads it from the job page."""
+    with tempfile.TemporaryFile() as raw:
+        text = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        writer = csv.writer(text)
+        writer.writerow(['Username', 'Email', 'Role', 'Date Joined', 'Active'])
+        rows = 0
+        users = User.objects.order_by('pk').values_list('username', 'email', 'role', 'date_joined', 'is_active')
+        for user in users.iterator(chunk_size=2000):
+            writer.writerow(user)
+            rows += 1
+        text.flush()
+        text.detach()
+        raw.seek(0)
+        name = storages[FILE_STORAGE].save(f'exports/users_{timezone.now():%Y%m%d_%H%M%S}.csv', File(raw))
+    return {'file': name, 'filename': 'users_export.csv', 'rows': rows}
+
+
+@job(max_attempts=5)
+def delete_user(user_id):
+    """Delete a user and everything that cascades from them (enrollments, attempts, messages...)."""
+    deleted, per_model = User.objects.filter(pk=user_id, is_superuser=False).delete()
+    return {'deleted': deleted}
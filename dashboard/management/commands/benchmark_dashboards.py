@@ -0,0 +1,90 @@
+import asyncio
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from courses.models import Course, Enrollment
+from .benchmark_views import percentile
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Compares the dashboards with sequential vs concurrent queries, under WSGI and ASGI, '
+            'with a simulated network round-trip added to every query')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latency', type=float, default=20, help='Simulated round-trip per query (ms)')
+        parser.add_argument('--requests', type=int, default=20, help='Requests per view and mode')
+
+    def handle(self, *args, **options):
+        delay = options['latency'] / 1000
+
+        def slow_execute(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            if slow_execute not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow_execute)
+
+        # Pool threads open their own connections; catch those as they're created
+        connection_created.connect(add_latency)
+        for alias in connections:
+            add_latency(None, connections[alias])
+
+        views = self.views()
+        modes = [
+            ('WSGI, sequential', False, 0),
+            ('WSGI, concurrent', False, None),
+            ('ASGI, concurrent', True, None),
+        ]
+        self.stdout.write(f"{'view':<24}" + ''.join(f'{mode:>20}' for mode, _, _ in modes) + '   (p50 / p95 ms)')
+        for name, user, url in views:
+            line = f'{name:<24}'
+            for _, use_asgi, workers in modes:
+                overrides = {} if workers is None else {'PARALLEL_QUERY_WORKERS': workers}
+                with override_settings(**overrides):
+                    timings = self.run(user, url, options['requests'], use_asgi)
+                line += f'{statistics.median(timings):>12.1f} / {percentile(timings, 95):<5.0f}'
+            self.stdout.write(line)
+        connection_created.disconnect(add_latency)
+
+    def views(self):
+        student = Enrollment.objects.filter(student__role='student').values_list('student', flat=True).first()
+        instructor = Course.objects.values_list('instructor', flat=True).first()
+        admin = User.objects.filter(role='admin').first() or User.objects.filter(is_superuser=True).first()
+        if student is None or instructor is None:
+            raise CommandError('No enrollments found. Run generate_dataset first.')
+        views = [
+            ('dashboard', User.objects.get(pk=student), reverse('dashboard')),
+            ('instructor_dashboard', User.objects.get(pk=instructor), reverse('instructor_dashboard')),
+        ]
+        if admin:
+            views.append(('admin_dashboard', admin, reverse('admin_dashboard')))
+        return views
+
+    def run(self, user, url, count, use_asgi):
+        client = AsyncClient() if use_asgi else Client()
+        client.force_login(user)
+
+        def get():
+            if use_asgi:
+                return asyncio.run(client.get(url))
+            return client.get(url)
+
+        get()  # warm up
+        timings = []
+        for _ in range(count):
+            start = time.perf_counter()
+            response = get()
+            timings.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}')
+        return timings
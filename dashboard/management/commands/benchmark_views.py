@@ -0,0 +1,114 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from community.models import Channel
+from courses.models import Enrollment, Lesson
+
+User = get_user_model()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = 'Drives the main views through the test client and reports latency percentiles and queries per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--only', nargs='*', help='Endpoint names to run')
+        parser.add_argument('--json', dest='json_path', help='Write results to this file')
+        parser.add_argument('--compare', help='Baseline JSON from an earlier run (e.g. another commit)')
+
+    def handle(self, *args, **options):
+        endpoints = self.endpoints()
+        if options['only']:
+            endpoints = [e for e in endpoints if e[0] in options['only']]
+
+        results = {}
+        for name, user, url in endpoints:
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            for _ in range(options['warmup']):
+                client.get(url)
+            timings, queries = [], []
+            for _ in range(options['requests']):
+                start = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+                # The instrumentation middleware's count follows a view's queries
+                # onto gather_queries pool threads, which CaptureQueriesContext misses
+                queries.append(response.wsgi_request.query_recorder.count)
+            if response.status_code >= 400:
+                raise CommandError(f'{name} ({url}) returned {response.status_code}')
+            results[name] = {
+                'url': url,
+                'p50_ms': round(statistics.median(timings), 2),
+                'p95_ms': round(percentile(timings, 95), 2),
+                'p99_ms': round(percentile(timings, 99), 2),
+                'queries': round(statistics.mean(queries), 1),
+            }
+
+        baseline = {}
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+        self.report(results, baseline)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Saved to {options['json_path']}")
+
+    def endpoints(self):
+        """Representative (name, user, url) triples picked from the current database."""
+        enrollment = (Enrollment.objects.select_related('student', 'course')
+                      .filter(student__role='student').order_by('id').first())
+        if enrollment is None:
+            raise CommandError('No enrollments found. Run generate_dataset first.')
+        student, course = enrollment.student, enrollment.course
+        instructor = course.instructor
+        admin = User.objects.filter(role='admin').first() or User.objects.filter(is_superuser=True).first()
+        lesson = Lesson.objects.filter(module__course=course).order_by('module__order', 'order').first()
+        channel = (Channel.objects.filter(messages__isnull=False).order_by('id').first()
+                   or Channel.objects.order_by('id').first())
+
+        endpoints = [
+            ('home', None, reverse('home')),
+            ('course_list', None, reverse('course_list')),
+            ('course_detail', student, reverse('course_detail', args=[course.pk])),
+            ('dashboard', student, reverse('dashboard')),
+            ('instructor_dashboard', instructor, reverse('instructor_dashboard')),
+        ]
+        if lesson:
+            endpoints.append(('lesson_detail', student, reverse('lesson_detail', args=[course.pk, lesson.pk])))
+        if admin:
+            endpoints.append(('admin_dashboard', admin, reverse('admin_dashboard')))
+        if channel:
+            endpoints += [
+                ('community', student, reverse('community_channel', args=[channel.slug])),
+                ('get_messages', student, reverse('get_messages', args=[channel.slug])),
+                ('get_history', student, reverse('get_history', args=[channel.slug])),
+                ('community_search', student, reverse('community_search') + '?q=django+cache'),
+            ]
+        return endpoints
+
+    def report(self, results, baseline):
+        self.stdout.write(f"{'endpoint':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}")
+        for name, row in results.items():
+            line = f"{name:<22}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['queries']:>9}"
+            base = baseline.get(name)
+            if base:
+                change = (row['p50_ms'] - base['p50_ms']) / base['p50_ms'] * 100 if base['p50_ms'] else 0
+                line += f"   p50 {change:+.0f}%  queries {row['queries'] - base['queries']:+g}"
+            self.stdout.write(line)
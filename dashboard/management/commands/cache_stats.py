@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from config.cache import cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Shows cache hit/miss counters per namespace'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Clear the counters after reporting')
+
+    def handle(self, *args, **options):
+        report = cache_stats()
+        if not report:
+            self.stdout.write('No cache activity recorded yet.')
+        for namespace, row in report.items():
+            self.stdout.write(
+                f"{namespace:<20} hits={row['hits']:<8} misses={row['misses']:<8} "
+                f"refreshes={row['refreshes']:<6} hit rate={row['hit_rate']:.1%}"
+            )
+        if options['reset']:
+            reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from config.queryplans import CRITICAL_QUERIES, check_plans
+
+
+class Command(BaseCommand):
+    help = 'EXPLAINs the registered hot-path querysets and reports full scans or sorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help=f"Subset of: {', '.join(CRITICAL_QUERIES)}")
+        parser.add_argument('--plans', action='store_true', help='Print every plan, not only failing ones')
+
+    def handle(self, *args, **options):
+        failing = 0
+        for name, (plan, problems) in check_plans(options['names']).items():
+            if problems:
+                failing += 1
+                self.stdout.write(self.style.ERROR(f"{name}: {', '.join(problems)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: ok'))
+            if problems or options['plans']:
+                self.stdout.write('    ' + plan.replace('\n', '\n    '))
+        if failing:
+            raise CommandError(f'{failing} queries without a usable index')
@@ -0,0 +1,54 @@
+import json
+import statistics
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from config.startup import measure_startup
+
+
+class Command(BaseCommand):
+    help = 'Measures a cold start (settings, app loading, first request) in fresh interpreters and ranks imports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/', help='URL of the first request')
+        parser.add_argument('--runs', type=int, default=5, help='Cold starts to take the median of')
+        parser.add_argument('--top', type=int, default=15, help='Modules and packages to list')
+        parser.add_argument('--lean', choices=['on', 'off'], help='Override LEAN_STARTUP')
+        parser.add_argument('--json', dest='json_path', help='Write the report to this file')
+        parser.add_argument('--check', action='store_true', help=f'Fail above STARTUP_BUDGET_MS ({settings.STARTUP_BUDGET_MS})')
+
+    def handle(self, *args, **options):
+        lean = None if options['lean'] is None else options['lean'] == 'on'
+        # -X importtime slows imports down, so it gets a run of its own
+        reports = [measure_startup(options['path'], lean=lean, importtime=False) for _ in range(options['runs'])]
+        phases = {name: statistics.median(r['phases'][name] for r in reports) for name in reports[0]['phases']}
+        ready = {label: statistics.median(r['ready'][label] for r in reports) for label in reports[0]['ready']}
+        imports = measure_startup(options['path'], lean=lean)['imports']
+
+        self.stdout.write(f"First request {options['path']}: {reports[0]['status']} (median of {options['runs']} cold starts)")
+        for name, ms in phases.items():
+            self.stdout.write(f'  {name:<14} {ms:8.1f} ms')
+
+        self.stdout.write('\nAppConfig.ready()')
+        for label, ms in sorted(ready.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'  {label:<20} {ms:8.1f} ms')
+
+        packages = defaultdict(float)
+        for module, self_ms, _ in imports:
+            packages[module.split('.')[0]] += self_ms
+        self.stdout.write(f'\nImport time by top-level package ({sum(packages.values()):.1f} ms in total)')
+        for package, ms in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'  {package:<30} {ms:8.1f} ms')
+
+        self.stdout.write('\nSlowest modules (self / cumulative)')
+        for module, self_ms, cumulative_ms in sorted(imports, key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'  {module:<50} {self_ms:8.1f} {cumulative_ms:8.1f} ms')
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({'phases': phases, 'ready': ready, 'imports': imports}, f, indent=2)
+
+        if options['check'] and phases['total'] > settings.STARTUP_BUDGET_MS:
+            raise CommandError(f"Cold start took {phases['total']:.0f} ms, budget is {settings.STARTUP_BUDGET_MS} ms")
@@ -1,3 +1,272 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+from datetime import date
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from config.cache import cache_get, cache_set, cached_query, make_key
+from config.instrumentation import QueryInstrumentationMiddleware
+from config.parallel import gather_queries
+from config.queryplans import check_plans, explain, plan_problems
+from config.startup import measure_startup
+from config.testing import QueryBudgetMixin
+from courses.models import Course, Enrollment, Certificate, LearningPath, PathCourse, UserLearningPath
+from users.models import User
+
+from .management.commands.benchmark_views import percentile
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        instructor = User.objects.create_user('instructor', password='pw', role='instructor')
+        cls.student = User.objects.create_user('student', password='pw')
+        courses = [
+            Course.objects.create(title=f'Course {i}', description='...', instructor=instructor)
+            for i in range(10)
+        ]
+        for i, course in enumerate(courses[:6]):
+            Enrollment.objects.create(student=cls.student, course=course, progress=100 if i % 2 else 40)
+        Certificate.objects.create(user=cls.student, course=courses[1])
+        for p in range(3):
+            path = LearningPath.objects.create(title=f'Path {p}', description='...')
+            for order, course in enumerate(courses[p:p + 4]):
+                PathCourse.objects.create(path=path, course=course, order=order)
+            UserLearningPath.objects.create(user=cls.student, path=path)
+
+    def test_student_dashboard(self):
+        self.client.force_login(self.student)
+        self.assertQueryBudget(reverse('dashboard'))
+
+
+class CacheHelperTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_keys_are_namespaced_and_versioned(self):
+        self.assertEqual(make_key('courses', 'catalog', 7), 'courses:v1:catalog:7')
+        with override_settings(CACHE_KEY_VERSIONS={'courses': 3}):
+            self.assertEqual(make_key('courses', 'catalog', 7), 'courses:v3:catalog:7')
+
+    def test_a_version_bump_retires_old_values(self):
+        cache_set('courses', 'catalog', value='old shape')
+        self.assertEqual(cache_get('courses', 'catalog'), 'old shape')
+        with override_settings(CACHE_KEY_VERSIONS={'courses': 2}):
+            self.assertIsNone(cache_get('courses', 'catalog'))
+
+    def test_cached_query(self):
+        calls = []
+
+        @cached_query('courses', key=lambda n: n)
+        def square(n):
+            calls.append(n)
+            return n * n
+
+        self.assertEqual([square(3), square(3), square(4)], [9, 9, 16])
+        self.assertEqual(calls, [3, 4])
+        square.invalidate(3)
+        square(3)
+        with override_settings(CACHE_KEY_VERSIONS={'courses': 2}):
+            square(4)
+        self.assertEqual(calls, [3, 4, 3, 4])
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+        release = threading.Event()
+
+        @cached_query('courses', key=lambda n: n)
+        def slow_square(n):
+            calls.append(n)
+            release.wait(5)
+            return n * n
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(slow_square(3))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+
+        # A slow key doesn't hold up any other key while it's computed
+        @cached_query('courses', key=lambda n: f'other-{n}')
+        def fast_square(n):
+            return n * n
+
+        fast = threading.Thread(target=lambda: results.append(fast_square(5)))
+        fast.start()
+        fast.join(1)
+        self.assertEqual(results, [25])
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual((results, calls), ([25, 9, 9, 9, 9], [3]))
+
+
+class CheckinTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', password='pw')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def check_in(self, day):
+        with mock.patch('dashboard.views.timezone.localdate', return_value=day):
+            response = self.client.get(reverse('daily_checkin'), follow=True)
+        return [str(message) for message in response.context['messages']]
+
+    def test_once_per_calendar_day(self):
+        self.assertIn('Daily check-in complete! +10 XP. You are now Level 1!', self.check_in(date(2026, 3, 1)))
+        # Kept on the user row, not in a cache another worker doesn't share or that evicts
+        cache.clear()
+        self.assertIn("You've already checked in today. Come back tomorrow!", self.check_in(date(2026, 3, 1)))
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.xp, self.user.last_checkin), (10, date(2026, 3, 1)))
+
+        self.check_in(date(2026, 3, 2))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.xp, 20)
+
+
+@override_settings(DEBUG=True, PARALLEL_QUERY_WORKERS=2)
+class InstrumentationTests(TransactionTestCase):
+    async def test_async_requests_count_queries_on_every_thread(self):
+        async def view(request):
+            await User.objects.acount()
+            # Out of a transaction, so these run on the pool's own connections
+            await gather_queries(users=lambda: User.objects.count(), courses=lambda: list(Course.objects.all()))
+            return HttpResponse()
+
+        response = await QueryInstrumentationMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(response['X-Query-Count'], '3')
+
+    def test_sync_requests(self):
+        def view(request):
+            User.objects.count()
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        response = QueryInstrumentationMiddleware(view)(request)
+        self.assertEqual(response['X-Query-Count'], '1')
+        # Nothing is recorded once the request is over
+        User.objects.count()
+        self.assertEqual(request.query_recorder.count, 1)
+
+
+class GatherQueriesTests(TransactionTestCase):
+    def broken(self):
+        return list(User.objects.raw('SELECT * FROM no_such_table'))
+
+    @override_settings(PARALLEL_QUERY_WORKERS=2)
+    async def test_results_by_name(self):
+        await User.objects.acreate(username='ada')
+        results = await gather_queries(
+            users=lambda: User.objects.count(),
+            names=lambda: list(User.objects.values_list('username', flat=True)),
+        )
+        self.assertEqual(results, {'users': 1, 'names': ['ada']})
+
+    @override_settings(PARALLEL_QUERY_WORKERS=2)
+    async def test_pool_errors_reach_the_view(self):
+        with self.assertRaises(DatabaseError):
+            await gather_queries(users=lambda: User.objects.count(), broken=self.broken)
+        # The pool threads and their connections are still usable afterwards
+        self.assertEqual(await gather_queries(a=lambda: User.objects.count(), b=lambda: User.objects.count()), {'a': 0, 'b': 0})
+
+    @override_settings(PARALLEL_QUERY_WORKERS=0)
+    async def test_errors_in_order_stop_the_rest(self):
+        ran = []
+        with self.assertRaises(DatabaseError):
+            await gather_queries(broken=self.broken, after=lambda: ran.append('after'))
+        self.assertEqual(ran, [])
+
+
+@skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'Plan checks need SQLite or PostgreSQL')
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_dataset', users=300, instructors=20, courses=40, enrollments=1500,
+            attempts=1000, messages=3000, stdout=StringIO(),
+        )
+
+    def test_critical_queries_use_indexes(self):
+        results = check_plans()
+        self.assertTrue(results)
+        for name, (plan, problems) in results.items():
+            with self.subTest(name):
+                self.assertEqual(problems, [], f'{name}:\n{plan}')
+
+    def test_detects_unindexed_order(self):
+        self.assertTrue(plan_problems(explain(Course.objects.order_by('title'))))
+
+
+class BenchmarkViewsTests(TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, p) for p in (50, 95, 99, 100)], [50, 95, 99, 100])
+        self.assertEqual(percentile([7], 99), 7)
+
+    def test_needs_data(self):
+        with self.assertRaisesMessage(CommandError, 'Run generate_dataset first'):
+            call_command('benchmark_views', stdout=StringIO())
+
+    def test_run_save_and_compare(self):
+        call_command('generate_dataset', '--users', '3', '--instructors', '1', '--courses', '2', '--enrollments', '3',
+                     '--attempts', '0', '--messages', '5', stdout=StringIO())
+        run = ['--requests', '2', '--warmup', '0', '--only', 'course_list', 'dashboard', 'get_history']
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = f'{directory}/baseline.json'
+            call_command('benchmark_views', *run, '--json', baseline, stdout=StringIO())
+            with open(baseline) as f:
+                saved = json.load(f)
+            self.assertEqual(set(saved), {'course_list', 'dashboard', 'get_history'})
+            self.assertEqual(set(saved['dashboard']), {'url', 'p50_ms', 'p95_ms', 'p99_ms', 'queries'})
+            self.assertGreater(saved['dashboard']['queries'], 0)
+
+            out = StringIO()
+            call_command('benchmark_views', *run, '--compare', baseline, stdout=out)
+        # One delta per endpoint against the baseline
+        self.assertEqual(out.getvalue().count('%  queries '), 3)
+
+
+class BenchmarkPoolQueriesTests(TransactionTestCase):
+    def benchmark(self, directory, workers):
+        path = f'{directory}/{workers}.json'
+        with override_settings(PARALLEL_QUERY_WORKERS=workers):
+            call_command('benchmark_views', '--requests', '1', '--warmup', '1', '--only', 'dashboard',
+                         '--json', path, stdout=StringIO())
+        with open(path) as f:
+            return json.load(f)['dashboard']['queries']
+
+    def test_counts_queries_run_on_pool_threads(self):
+        # Outside a test transaction, so the dashboard's queries really go to the pool
+        call_command('generate_dataset', '--users', '3', '--instructors', '1', '--courses', '2', '--enrollments', '3',
+                     '--attempts', '0', '--messages', '0', stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(self.benchmark(directory, 2), self.benchmark(directory, 0))
+
+
+class StartupTests(SimpleTestCase):
+    def test_lean_cold_start_within_budget(self):
+        # Best of three, to ride out a busy machine
+        report = min((measure_startup('/', lean=True, importtime=False) for _ in range(3)),
+                     key=lambda r: r['phases']['total'])
+        self.assertEqual(report['status'], '200 OK')
+        self.assertLessEqual(report['phases']['total'], settings.STARTUP_BUDGET_MS, report['phases'])
+
+    def test_lean_startup_defers_heavy_imports(self):
+        modules = {name for name, _, _ in measure_startup('/', lean=True)['imports']}
+        for deferred in ['cloudinary', 'rest_framework.compat', 'rest_framework.views', 'api.views', 'courses.admin']:
+            self.assertNotIn(deferred, modules)
+
+    def test_lazy_includes_still_reverse(self):
+        self.assertEqual(reverse('admin:index'), '/admin/')
+        self.assertEqual(reverse('api:course-list', kwargs={'version': 'v1'}), '/api/v1/courses/')
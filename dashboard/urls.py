@@ -17,7 +17,10 @@ urlpatterns = [
     
     # Community
     path('community/', community_views.community_home, name='community'),
+    path('community/search/', community_views.search, name='community_search'),
     path('community/<slug:channel_slug>/', community_views.community_home, name='community_channel'),
     path('community/<slug:channel_slug>/send/', community_views.send_message, name='send_message'),
     path('community/<slug:channel_slug>/messages/', community_views.get_messages, name='get_messages'),
+    path('community/<slug:channel_slug>/history/', community_views.get_history, name='get_history'),
+    path('community/<slug:channel_slug>/stream/', community_views.stream_messages, name='stream_messages'),
 ]
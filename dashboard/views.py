@@ -1,99 +1,125 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
-import csv
 from django.contrib.auth.decorators import login_required
-from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.contrib.auth import get_user_model
+from courses.access import apply_pending_access
 from courses.models import Course, Enrollment, Certificate, LearningPath, UserLearningPath
-from django.db.models import Count, Q
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from config.parallel import gather_queries
+from .jobs import delete_user as delete_user_job, export_users_csv as export_users_job
 
 User = get_user_model()
 
+CHECKIN_XP = 10
+
 @login_required
-def dashboard(request):
+async def dashboard(request):
     """
     Redirects based on role, or shows Student Dashboard.
+    The independent queries below run concurrently (see config/parallel.py).
     """
-    if request.user.role == 'admin' or request.user.is_superuser:
+    # Reuse the user for templates, which read request.user synchronously
+    request.user = user = await request.auser()
+    if user.role == 'admin' or user.is_superuser:
         return redirect('admin_dashboard')
-    elif request.user.role == 'instructor':
+    elif user.role == 'instructor':
         return redirect('instructor_dashboard')
     
     # Student Dashboard Logic
     # 1. Active Enrollments (sorted by most recently accessed)
     # Optimization: Select related course and instructor to prevent N+1 queries in loop
-    enrollments = Enrollment.objects.filter(student=request.user).select_related('course', 'course__instructor').order_by('-last_accessed')
+    enrollments = Enrollment.objects.filter(student=user).select_related('course', 'course__instructor').order_by('-last_accessed')
     
     # 2. Certificates
-    certificates = Certificate.objects.filter(user=request.user)
+    certificates = Certificate.objects.filter(user=user)
     
     # 3. Suggested Courses (exclude enrolled courses)
     enrolled_course_ids = enrollments.values_list('course_id', flat=True)
     suggested_courses = Course.objects.exclude(id__in=enrolled_course_ids).order_by('-created_at')[:3]
     
     # 4. Active Paths
-    active_paths = UserLearningPath.objects.filter(user=request.user).select_related('path')
+    active_paths = UserLearningPath.objects.filter(user=user).select_related('path').prefetch_related('path__courses')
+
+    results = await gather_queries(
+        # Lesson views not yet flushed to last_accessed still count for the order
+        enrollments=lambda: apply_pending_access(user.pk, list(enrollments)),
+        certificates=lambda: list(certificates),
+        suggested_courses=lambda: list(suggested_courses),
+        active_paths=lambda: list(active_paths),
+    )
+    completed_course_ids = {e.course_id for e in results['enrollments'] if e.progress == 100}
+    for user_path in results['active_paths']:
+        user_path.completed_course_ids = completed_course_ids
 
     context = {
-        'enrollments': enrollments,
-        'enrolled_count': enrollments.filter(progress__lt=100).count(),
-        'completed_count': enrollments.filter(progress=100).count(),
-        'certificates': certificates,
-        'cert_count': certificates.count(),
-        'suggested_courses': suggested_courses,
-        'active_paths': active_paths,
+        **results,
+        'enrolled_count': sum(1 for e in results['enrollments'] if e.progress < 100),
+        'completed_count': sum(1 for e in results['enrollments'] if e.progress == 100),
+        'cert_count': len(results['certificates']),
     }
-    return render(request, 'dashboard/dashboard.html', context)
+    return await sync_to_async(render)(request, 'dashboard/dashboard.html', context)
 
 @login_required
-def admin_dashboard(request):
+async def admin_dashboard(request):
     """
     Full control dashboard for Admins.
     """
-    if not (request.user.role == 'admin' or request.user.is_superuser):
+    # Reuse the user for templates, which read request.user synchronously
+    request.user = user = await request.auser()
+    if not (user.role == 'admin' or user.is_superuser):
         messages.error(request, "Access Denied: Admin Level Clearance Required.")
         return redirect('dashboard')
         
-    user_stats = User.objects.aggregate(
-        total=Count('id'),
-        students=Count('id', filter=Q(role='student')),
-        instructors=Count('id', filter=Q(role='instructor'))
+    results = await gather_queries(
+        user_stats=lambda: User.objects.aggregate(
+            total=Count('id'),
+            students=Count('id', filter=Q(role='student')),
+            instructors=Count('id', filter=Q(role='instructor'))
+        ),
+        total_courses=Course.objects.count,
+        total_enrollments=Enrollment.objects.count,
+        courses=lambda: list(Course.objects.all().select_related('instructor').annotate(modules_count=Count('modules')).order_by('-created_at')[:5]),
+        users=lambda: list(User.objects.all().order_by('-date_joined')[:10]),
     )
+    user_stats = results.pop('user_stats')
 
     context = {
         'total_users': user_stats['total'],
         'total_students': user_stats['students'],
         'total_instructors': user_stats['instructors'],
-        'total_courses': Course.objects.count(),
-        'total_enrollments': Enrollment.objects.count(),
-        'courses': Course.objects.all().select_related('instructor').annotate(modules_count=Count('modules')).order_by('-created_at')[:5],
-        'users': User.objects.all().order_by('-date_joined')[:10],
+        **results,
     }
-    return render(request, 'dashboard/admin_dashboard.html', context)
+    return await sync_to_async(render)(request, 'dashboard/admin_dashboard.html', context)
 
 @login_required
-def instructor_dashboard(request):
+async def instructor_dashboard(request):
     """
     Course management for Instructors.
     """
-    if request.user.role not in ['instructor', 'admin'] and not request.user.is_superuser:
+    # Reuse the user for templates, which read request.user synchronously
+    request.user = user = await request.auser()
+    if user.role not in ['instructor', 'admin'] and not user.is_superuser:
         return redirect('dashboard')
 
-    my_courses = Course.objects.filter(instructor=request.user).annotate(
+    my_courses = Course.objects.filter(instructor=user).annotate(
         modules_count=Count('modules', distinct=True),
         students_count=Count('enrollments', distinct=True)
     )
     
     # Simple analytics
-    total_students = Enrollment.objects.filter(course__in=my_courses).count()
+    results = await gather_queries(
+        courses=lambda: list(my_courses),
+        total_students=Enrollment.objects.filter(course__instructor=user).count,
+    )
     
     context = {
-        'courses': my_courses,
-        'total_students': total_students,
-        'course_count': my_courses.count(),
+        'courses': results['courses'],
+        'total_students': results['total_students'],
+        'course_count': len(results['courses']),
     }
-    return render(request, 'dashboard/instructor_dashboard.html', context)
+    return await sync_to_async(render)(request, 'dashboard/instructor_dashboard.html', context)
 
 @login_required
 def manage_users(request):
@@ -112,9 +138,11 @@ def delete_user(request, user_id):
     if user.is_superuser:
          messages.error(request, "Cannot delete Superuser.")
     else:
-        username = user.username
-        user.delete()
-        messages.success(request, f"User {username} deleted successfully.")
+        # Cascading deletes can be large: lock the account now, delete in the background
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        delete_user_job.enqueue(args=[user.pk], owner=request.user)
+        messages.success(request, f"User {user.username} deactivated and scheduled for deletion.")
         
     return redirect('manage_users')
 
@@ -123,17 +151,9 @@ def export_users_csv(request):
     if not (request.user.role == 'admin' or request.user.is_superuser):
         return redirect('dashboard')
     
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="users_export.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Username', 'Email', 'Role', 'Date Joined', 'Active'])
-    
-    users = User.objects.all().values_list('username', 'email', 'role', 'date_joined', 'is_active')
-    for user in users:
-        writer.writerow(user)
-        
-    return response
+    # Built by a worker; the job page polls until the file is ready to download
+    export = export_users_job.enqueue(owner=request.user)
+    return redirect('job_detail', pk=export.pk)
 
 @login_required
 def notifications(request):
@@ -145,9 +165,17 @@ def achievements(request):
 
 @login_required
 def daily_checkin(request):
-    request.user.xp += 10
-    request.user.save()
-    messages.success(request, f"Daily check-in complete! +10 XP. You are now Level {request.user.level}!")
+    # Once per calendar day: only the day's first check-in matches the conditional UPDATE
+    today = timezone.localdate()
+    claimed = (
+        User.objects.filter(Q(last_checkin__isnull=True) | Q(last_checkin__lt=today), pk=request.user.pk)
+        .update(xp=F('xp') + CHECKIN_XP, last_checkin=today)
+    )
+    if not claimed:
+        messages.error(request, "You've already checked in today. Come back tomorrow!")
+        return redirect('dashboard')
+    request.user.refresh_from_db(fields=['xp'])
+    messages.success(request, f"Daily check-in complete! +{CHECKIN_XP} XP. You are now Level {request.user.level}!")
     return redirect('dashboard')
 
 @login_required
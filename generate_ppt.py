@@ -2,38 +2,44 @@ from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.dml.color import RGBColor
 
+# Slide layouts of the default template (and of templates derived from it)
+TITLE_SLIDE_LAYOUT = 0
+BULLET_SLIDE_LAYOUT = 1
+SECTION_SLIDE_LAYOUT = 2
+
+
+def add_title_slide(prs, title_text, subtitle_text, layout=TITLE_SLIDE_LAYOUT):
+    slide = prs.slides.add_slide(prs.slide_layouts[layout])
+    slide.shapes.title.text = title_text
+    slide.placeholders[1].text = subtitle_text
+    return slide
+
+
+def add_slide(prs, title_text, content_points, layout=BULLET_SLIDE_LAYOUT):
+    """A bulleted slide. A point is a string, or (text, level) for a sub-point."""
+    slide = prs.slides.add_slide(prs.slide_layouts[layout])
+    slide.shapes.title.text = title_text
+
+    tf = slide.placeholders[1].text_frame
+    tf.clear()  # Leaves one empty paragraph, used for the first point
+
+    for i, point in enumerate(content_points):
+        text, level = point if isinstance(point, tuple) else (point, 0)
+        p = tf.paragraphs[0] if i == 0 else tf.add_paragraph()
+        p.text = text
+        p.level = level
+    return slide
+
+
 def create_presentation():
     prs = Presentation()
 
-    # Define Slide Layouts
-    TITLE_SLIDE_LAYOUT = prs.slide_layouts[0]
-    BULLET_SLIDE_LAYOUT = prs.slide_layouts[1]
-
     # --- Slide 1: Title ---
-    slide = prs.slides.add_slide(TITLE_SLIDE_LAYOUT)
-    title = slide.shapes.title
-    subtitle = slide.placeholders[1]
-    title.text = "SAM-LMS: Master the Future"
-    subtitle.text = "Strategic Advanced Method E-Learning\nFinal Year Project Presentation"
-
-    # Helper function to add slides
-    def add_slide(title_text, content_points):
-        slide = prs.slides.add_slide(BULLET_SLIDE_LAYOUT)
-        title = slide.shapes.title
-        title.text = title_text
-        
-        tf = slide.placeholders[1].text_frame
-        tf.clear()  # Clear default paragraph
-        
-        for point in content_points:
-            p = tf.add_paragraph()
-            p.text = point
-            p.level = 0
-            if isinstance(point, tuple): # Handle sub-points if needed in future
-                 pass 
+    add_title_slide(prs, "SAM-LMS: Master the Future",
+                    "Strategic Advanced Method E-Learning\nFinal Year Project Presentation")
 
     # --- Slide 2: Introduction ---
-    add_slide("1. Introduction", [
+    add_slide(prs, "1. Introduction", [
         "Project Name: SAM-LMS (Strategic Advanced Method E-Learning)",
         "Tagline: More than just videos. A structured career roadmap.",
         "Problem: Traditional LMS platforms are static, boring, and lack motivation.",
@@ -42,7 +48,7 @@ def create_presentation():
     ])
 
     # --- Slide 3: Architecture ---
-    add_slide("2. Unseen Architecture (How it Works)", [
+    add_slide(prs, "2. Unseen Architecture (How it Works)", [
         "Fully distributed cloud architecture (Not just Localhost).",
         "Frontend: HTML5, Bootstrap 5, Vanilla JS (Fast & Responsive).",
         "Backend: Python 3.12 + Django 5.0 (Secure & Scalable).",
@@ -52,7 +58,7 @@ def create_presentation():
     ])
 
     # --- Slide 4: Key Feature - Learning Paths ---
-    add_slide("3. Learning Paths (Career Tracks)", [
+    add_slide(prs, "3. Learning Paths (Career Tracks)", [
         "We don't just dump courses on the user.",
         "Curated Paths: Beginner -> Intermediate -> Expert.",
         "Example: 'Full Stack Architect' or 'Data Scientist'.",
@@ -61,7 +67,7 @@ def create_presentation():
     ])
 
     # --- Slide 5: Key Feature - Gamification ---
-    add_slide("4. Gamification & Motivation", [
+    add_slide(prs, "4. Gamification & Motivation", [
         "Problem: High student dropout rates.",
         "Solution: 'Video Game' style progression system.",
         "XP System: Daily Check-ins award +10 XP.",
@@ -70,7 +76,7 @@ def create_presentation():
     ])
 
     # --- Slide 6: Key Feature - Community ---
-    add_slide("5. The Community", [
+    add_slide(prs, "5. The Community", [
         "Learning is social.",
         "Integrated Discord-like chat system inside the dashboard.",
         "Real-time updates using efficient polling.",
@@ -79,7 +85,7 @@ def create_presentation():
     ])
 
     # --- Slide 7: Security & Roles ---
-    add_slide("6. Security Measures", [
+    add_slide(prs, "6. Security Measures", [
         "CSRF Protection: Prevents cross-site attacks.",
         "RBAC (Role-Based Access Control):",
         " - Student: Read content, Write chat/notes.",
@@ -89,7 +95,7 @@ def create_presentation():
     ])
 
     # --- Slide 8: Deployment Strategy ---
-    add_slide("7. Deployment (Production Ready)", [
+    add_slide(prs, "7. Deployment (Production Ready)", [
         "Hosted on Vercel (Serverless Architecture).",
         "Database on Neon (Serverless Postgres).",
         "Media on Cloudinary.",
@@ -99,7 +105,7 @@ def create_presentation():
     ])
 
     # --- Slide 9: Dashboard Walkthrough ---
-    add_slide("8. The Dashboard", [
+    add_slide(prs, "8. The Dashboard", [
         "Active Paths: Shows major career goals at a glance.",
         "Smart Recommendations: Suggests courses based on history.",
         "Stats Card: Visual feedback (Active, Completed, Certs).",
@@ -107,7 +113,7 @@ def create_presentation():
     ])
 
     # --- Slide 10: Future & Conclusion ---
-    add_slide("9. Future & Conclusion", [
+    add_slide(prs, "9. Future & Conclusion", [
         "Future Enhancements:",
         " - AI Tutor (OpenAI API integration).",
         " - Mobile App (React Native via Django REST API).",
@@ -0,0 +1,95 @@
+import contextvars
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from config.db_router import use_primary
+from jobs.queue import claim, execute, requeue_stale
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs (see jobs/queue.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Jobs run concurrently per process')
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes (for CPU-bound jobs)')
+        parser.add_argument('--burst', action='store_true', help='Exit once no due jobs are left')
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            return self.work(options['threads'], options['burst'])
+        # Children must not share the parent's database sockets
+        connections.close_all()
+        children = [
+            multiprocessing.Process(target=self.work, args=(options['threads'], options['burst']), daemon=True)
+            for _ in range(options['processes'])
+        ]
+        for child in children:
+            child.start()
+
+        def forward(signum, frame):
+            for child in children:
+                if child.is_alive():
+                    os.kill(child.pid, signum)
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for child in children:
+            child.join()
+
+    def work(self, threads, burst):
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        poll = settings.JOBS['POLL_INTERVAL']
+        stale_after = settings.JOBS['STALE_AFTER']
+        stopping = threading.Event()
+        # Finish the jobs in hand, claim nothing new
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+        self.stdout.write(f'Worker {worker} started with {threads} threads')
+
+        running = set()
+        last_sweep = 0.0
+        # Claims must see the primary's queue, not a lagging replica
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='job') as pool, use_primary():
+            while not stopping.is_set():
+                close_old_connections()
+                if time.monotonic() - last_sweep > stale_after / 2:
+                    if requeued := requeue_stale(stale_after):
+                        self.stdout.write(f'Requeued {requeued} stale jobs')
+                    last_sweep = time.monotonic()
+
+                running = {future for future in running if not future.done()}
+                free = threads - len(running)
+                claimed = claim(worker, free) if free else []
+                for queued in claimed:
+                    # Pool threads start with an empty context: carry use_primary() (and
+                    # anything else in contextvars) over, so jobs read their own writes
+                    running.add(pool.submit(contextvars.copy_context().run, self.run_job, queued))
+                if claimed:
+                    continue
+                if burst and not running:
+                    break
+                if running and not free:
+                    wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+                else:
+                    stopping.wait(poll)
+            wait(running)
+        close_old_connections()
+
+    def run_job(self, queued):
+        close_old_connections()
+        start = time.perf_counter()
+        try:
+            ok = execute(queued)
+        finally:
+            close_old_connections()
+        outcome = self.style.SUCCESS('done') if ok else self.style.ERROR('failed')
+        self.stdout.write(f'{queued.name} #{queued.pk} {outcome} in {time.perf_counter() - start:.2f}s')
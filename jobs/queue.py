@@ -0,0 +1,127 @@
+"""
+DB-backed job queue: no broker, just the `jobs_job` table.
+
+    @job(max_attempts=5, backoff=60)
+    def export_users(...): ...
+
+    export_users.delay(...)                        # -> Job row, picked up by run_worker
+    export_users.enqueue(args=[...], owner=user)   # owner may poll /jobs/<id>/
+
+Workers claim queued rows with SELECT ... FOR UPDATE SKIP LOCKED where the
+database supports it (PostgreSQL), so concurrent workers never block on or
+double-run a job. SQLite has no row locks; there each candidate is claimed
+with a conditional UPDATE (status still 'queued'), which only one worker can
+win. Failed jobs are retried with exponential backoff until max_attempts.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+
+# Storage alias for files jobs hand back to users (result = {'file': <name>, ...})
+FILE_STORAGE = 'job_files'
+
+
+def job(func=None, *, max_attempts=3, backoff=30):
+    """Register `func` as a job; retries wait backoff, 2*backoff, 4*backoff... seconds."""
+    def decorator(func):
+        func.job_name = f'{func.__module__}.{func.__qualname__}'
+        func.max_attempts = max_attempts
+        func.backoff = backoff
+        func.delay = lambda *args, **kwargs: enqueue(func, args=args, kwargs=kwargs)
+        func.enqueue = lambda **options: enqueue(func, **options)
+        REGISTRY[func.job_name] = func
+        return func
+    return decorator(func) if func else decorator
+
+
+def resolve(name):
+    # Importing the module runs its @job decorators
+    return REGISTRY.get(name) or import_string(name)
+
+
+def enqueue(func, args=(), kwargs=None, owner=None, run_at=None):
+    queued = Job.objects.create(
+        name=func.job_name, args=list(args), kwargs=kwargs or {}, owner=owner,
+        max_attempts=func.max_attempts, run_at=run_at or timezone.now(),
+    )
+    if settings.JOBS['EAGER']:
+        # No worker (tests, local dev): run in-process once the enqueuing transaction commits
+        transaction.on_commit(lambda: run_now(queued.pk))
+    return queued
+
+
+def claim(worker, limit=1):
+    """Mark up to `limit` due jobs as running for `worker` and return them."""
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('run_at', 'id')
+    start = {'status': Job.RUNNING, 'worker': worker, 'started_at': now, 'attempts': F('attempts') + 1}
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(due.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            Job.objects.filter(id__in=ids).update(**start)
+    else:
+        ids = []
+        for pk in due.values_list('id', flat=True)[:limit * 2]:
+            if Job.objects.filter(pk=pk, status=Job.QUEUED).update(**start):
+                ids.append(pk)
+                if len(ids) == limit:
+                    break
+    return list(Job.objects.filter(id__in=ids).order_by('run_at', 'id'))
+
+
+def execute(queued):
+    """Run a claimed job and record its outcome; returns True on success."""
+    try:
+        func = resolve(queued.name)
+    except ImportError:
+        Job.objects.filter(pk=queued.pk).update(
+            status=Job.FAILED, error=traceback.format_exc(), finished_at=timezone.now(), worker='',
+        )
+        return False
+    try:
+        result = func(*queued.args, **queued.kwargs)
+    except Exception:
+        logger.warning('Job %s #%s failed (attempt %s/%s)', queued.name, queued.pk, queued.attempts, queued.max_attempts)
+        update = {'error': traceback.format_exc(), 'worker': ''}
+        if queued.attempts < queued.max_attempts:
+            # Exponential backoff with a little jitter so retries don't land together
+            delay = func.backoff * 2 ** (queued.attempts - 1) * random.uniform(1, 1.2)
+            update.update(status=Job.QUEUED, run_at=timezone.now() + timedelta(seconds=delay))
+        else:
+            update.update(status=Job.FAILED, finished_at=timezone.now())
+        Job.objects.filter(pk=queued.pk).update(**update)
+        return False
+    Job.objects.filter(pk=queued.pk).update(status=Job.SUCCEEDED, result=result, error='', finished_at=timezone.now())
+    return True
+
+
+def run_now(pk, worker='eager'):
+    """Claim and run one specific job in this process."""
+    start = {'status': Job.RUNNING, 'worker': worker, 'started_at': timezone.now(), 'attempts': F('attempts') + 1}
+    if Job.objects.filter(pk=pk, status=Job.QUEUED).update(**start):
+        return execute(Job.objects.get(pk=pk))
+    return None
+
+
+def requeue_stale(older_than):
+    """Give back jobs whose worker died mid-run (running for longer than `older_than` seconds)."""
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, started_at__lt=now - timedelta(seconds=older_than))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, error='Worker stopped responding', finished_at=now, worker='',
+    )
+    requeued = stale.update(status=Job.QUEUED, run_at=now, worker='')
+    return requeued + failed
@@ -0,0 +1,131 @@
+import shutil
+import signal
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from config import db_router
+from users.models import User
+from .models import Job
+from .queue import claim, execute, job, requeue_stale
+
+@job(max_attempts=2, backoff=10)
+def add(a, b):
+    return a + b
+
+
+@job(max_attempts=2, backoff=10)
+def broken():
+    raise ValueError('boom')
+
+
+@job()
+def reads_primary():
+    state = db_router._state.get()
+    return state is not None and state.pinned
+
+
+class QueueTests(TestCase):
+    def test_claim_and_run(self):
+        queued = add.delay(2, 3)
+        [claimed] = claim('w1', limit=5)
+        self.assertEqual(claimed.pk, queued.pk)
+        self.assertEqual(claimed.status, Job.RUNNING)
+        self.assertEqual(claim('w2', limit=5), [])
+        self.assertTrue(execute(claimed))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.result, queued.attempts), (Job.SUCCEEDED, 5, 1))
+
+    def test_retries_with_backoff_then_fails(self):
+        queued = broken.delay()
+        execute(claim('w1')[0])
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.QUEUED)
+        self.assertGreaterEqual(queued.run_at, timezone.now() + timedelta(seconds=9))
+        self.assertIn('ValueError: boom', queued.error)
+        # Not due yet
+        self.assertEqual(claim('w1'), [])
+
+        Job.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        execute(claim('w1')[0])
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.FAILED, 2))
+
+    def test_requeue_stale(self):
+        queued = add.delay(1, 1)
+        claim('w1')
+        Job.objects.filter(pk=queued.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale(600), 1)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.QUEUED)
+
+    @override_settings(JOBS={'EAGER': True, 'POLL_INTERVAL': 1.0, 'STALE_AFTER': 600})
+    def test_eager_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            queued = add.delay(4, 4)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.result), (Job.SUCCEEDED, 8))
+
+
+class WorkerTests(TransactionTestCase):
+    def setUp(self):
+        # run_worker installs its own shutdown handlers
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self.addCleanup(signal.signal, signum, signal.getsignal(signum))
+
+    def test_jobs_run_in_the_workers_context(self):
+        queued = reads_primary.delay()
+        call_command('run_worker', '--burst', '--threads', '2', stdout=StringIO())
+        queued.refresh_from_db()
+        # use_primary() reaches the pool thread that ran the job
+        self.assertEqual((queued.status, queued.result), (Job.SUCCEEDED, True))
+
+
+@override_settings(JOBS={'EAGER': True, 'POLL_INTERVAL': 1.0, 'STALE_AFTER': 600})
+class JobViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='pw', role='admin')
+        cls.student = User.objects.create_user('student', password='pw')
+
+    def setUp(self):
+        self.files = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.files)
+        storages = {
+            **settings.STORAGES,
+            'job_files': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': self.files}},
+        }
+        override = override_settings(STORAGES=storages)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_export_runs_as_job(self):
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(reverse('export_users_csv'))
+        export = Job.objects.get()
+        self.assertRedirects(response, reverse('job_detail', args=[export.pk]))
+        self.assertContains(self.client.get(response.url), reverse('job_download', args=[export.pk]))
+
+        status = self.client.get(reverse('job_status', args=[export.pk])).json()
+        self.assertEqual(status['status'], Job.SUCCEEDED)
+        self.assertTrue(status['has_file'])
+        download = self.client.get(reverse('job_download', args=[export.pk]))
+        content = b''.join(download.streaming_content).decode()
+        self.assertIn('student', content)
+
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('job_status', args=[export.pk])).status_code, 404)
+
+    def test_delete_user_runs_as_job(self):
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('delete_user', args=[self.student.pk]))
+        self.assertFalse(User.objects.filter(pk=self.student.pk).exists())
+        self.assertEqual(Job.objects.get().status, Job.SUCCEEDED)
@@ -0,0 +1,54 @@
+from django.contrib.auth.decorators import login_required
+from django.core.files.storage import storages
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404, render
+
+from .models import Job
+from .queue import FILE_STORAGE
+
+
+def _visible_job(request, pk):
+    job = get_object_or_404(Job, pk=pk)
+    user = request.user
+    if job.owner_id != user.pk and user.role != 'admin' and not user.is_superuser:
+        raise Http404
+    return job
+
+
+def job_payload(job):
+    return {
+        'id': job.pk,
+        'name': job.name.rsplit('.', 1)[-1],
+        'status': job.status,
+        'done': job.done,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': job.result,
+        # Tracebacks stay in the admin; the last line is enough for the UI
+        'error': job.error.strip().splitlines()[-1] if job.status == Job.FAILED and job.error else None,
+        'has_file': bool(job.status == Job.SUCCEEDED and isinstance(job.result, dict) and job.result.get('file')),
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+@login_required
+def job_status(request, pk):
+    return JsonResponse(job_payload(_visible_job(request, pk)))
+
+
+@login_required
+def job_detail(request, pk):
+    job = _visible_job(request, pk)
+    return render(request, 'jobs/job_detail.html', {'job': job, 'payload': job_payload(job)})
+
+
+@login_required
+def job_download(request, pk):
+    job = _visible_job(request, pk)
+    if not job_payload(job)['has_file']:
+        raise Http404
+    return FileResponse(
+        storages[FILE_STORAGE].open(job.result['file'], 'rb'),
+        as_attachment=True, filename=job.result.get('filename') or job.result['file'].rsplit('/', 1)[-1],
+    )
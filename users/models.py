@@ -9,6 +9,15 @@ class User(AbstractUser):
     )
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='student')
     xp = models.PositiveIntegerField(default=0)
+    # Day of the last daily check-in (dashboard.views.daily_checkin)
+    last_checkin = models.DateField(null=True, blank=True)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Newest users first (admin dashboard, manage users), optionally by role
+            models.Index(fields=['-date_joined'], name='users_user_joined_idx'),
+            models.Index(fields=['role', '-date_joined'], name='users_user_role_joined_idx'),
+        ]
 
     @property
     def level(self):